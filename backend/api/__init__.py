@@ -1,7 +1,7 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from config import settings
-from .routes import health_router, crawl_router, chat_router, database_router
+from .routes import health_router, crawl_router, chat_router, database_router, metrics_router
 
 
 def create_app() -> FastAPI:
@@ -26,5 +26,8 @@ def create_app() -> FastAPI:
     app.include_router(crawl_router)
     app.include_router(chat_router)
     app.include_router(database_router, prefix="/db", tags=["database"])
+    
+    if settings.metrics_enabled:
+        app.include_router(metrics_router)
 
     return app
\ No newline at end of file
@@ -1,5 +1,5 @@
 from .requests import CrawlRequest, ChatRequest
-from .responses import CrawlResponse, ChatResponse, CrawlStatusResponse, DbStatusResponse
+from .responses import CrawlResponse, ChatResponse, CrawlStatusResponse, CrawlProgress, DbStatusResponse
 
 __all__ = [
     'CrawlRequest',
@@ -7,5 +7,6 @@ __all__ = [
     'CrawlResponse',
     'ChatResponse',
     'CrawlStatusResponse',
+    'CrawlProgress',
     'DbStatusResponse'
 ]
\ No newline at end of file
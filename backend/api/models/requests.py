@@ -1,3 +1,5 @@
+from datetime import datetime
+from typing import List, Optional
 from pydantic import BaseModel, HttpUrl
 
 
@@ -7,4 +9,9 @@ class CrawlRequest(BaseModel):
 
 
 class ChatRequest(BaseModel):
-    question: str
\ No newline at end of file
+    question: str
+    # Optional search scope: site ids (see GET /crawl/sites) and a window on
+    # when pages were last written; naive datetimes are Korean time
+    scope: Optional[List[str]] = None
+    updated_after: Optional[datetime] = None
+    updated_before: Optional[datetime] = None
@@ -10,12 +10,32 @@ class CrawlResponse(BaseModel):
 class ChatResponse(BaseModel):
     answer: str
     sources: List[str]
+    degraded: bool = False  # 과부하로 답변 생성 없이 출처만 반환
+
+
+class CrawlProgress(BaseModel):
+    pages_discovered: int = 0
+    pages_visited: int = 0
+    pages_failed: int = 0
+    embed_queued: int = 0
+    embed_succeeded: int = 0
+    embed_skipped_unchanged: int = 0
+    embed_skipped_insufficient: int = 0
+    embed_skipped_duplicate: int = 0
+    embed_failed: int = 0
+    embed_remaining: int = 0
+    chunks_written: int = 0
+    pages_per_sec: float = 0.0
+    embeds_per_sec: float = 0.0
+    eta_seconds: Optional[float] = None
+    elapsed_seconds: Optional[float] = None
 
 
 class CrawlStatusResponse(BaseModel):
     task_id: str
     status: str
     message: str
+    progress: Optional[CrawlProgress] = None
 
 
 class RecentUpdate(BaseModel):
@@ -2,5 +2,6 @@ from .health import router as health_router
 from .crawl import router as crawl_router
 from .chat import router as chat_router
 from .database import router as database_router
+from .metrics import router as metrics_router
 
-__all__ = ['health_router', 'crawl_router', 'chat_router', 'database_router']
\ No newline at end of file
+__all__ = ['health_router', 'crawl_router', 'chat_router', 'database_router', 'metrics_router']
\ No newline at end of file
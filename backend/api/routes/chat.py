@@ -1,13 +1,67 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from api.models import ChatRequest, ChatResponse
-from services.rag import RAGService
+from config import settings
+from services.admission import AdmissionRejected, chat_admission
+from services.metrics import record_admission
+from services.search_scope import SearchScope
+import asyncio
+import json
+import threading
+import time
 import structlog
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 logger = structlog.get_logger()
 
-# Initialize services
-rag_service = RAGService()
+_rag_service = None
+_rag_service_lock = threading.Lock()
+
+
+def get_rag_service():
+    """
+    Shared RAGService, built on first use (or by the startup warm-up) so the
+    API starts without loading langchain, the Qdrant client and the embedder
+    """
+    global _rag_service
+    if _rag_service is None:
+        with _rag_service_lock:
+            if _rag_service is None:
+                from services.rag import RAGService
+                _rag_service = RAGService()
+    return _rag_service
+
+
+async def load_rag_service():
+    """get_rag_service without blocking the event loop while it is being built"""
+    if _rag_service is not None:
+        return _rag_service
+    return await asyncio.to_thread(get_rag_service)
+
+DEGRADED_ANSWER = "현재 요청이 많아 답변을 생성하지 못했습니다. 아래 관련 문서를 참고하시거나 잠시 후 다시 질문해 주세요."
+
+
+def _too_busy(rejected: AdmissionRejected) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="Too many requests, please retry later",
+        headers={"Retry-After": str(rejected.retry_after)}
+    )
+
+
+def _scope(request: ChatRequest) -> SearchScope:
+    return SearchScope.create(request.scope, request.updated_after, request.updated_before)
+
+
+async def _degraded_sources(question: str, scope: SearchScope, rejected: AdmissionRejected):
+    """Retrieved sources without generation, or 429 when even that is over capacity"""
+    if not settings.chat_degraded_enabled:
+        raise _too_busy(rejected)
+    try:
+        async with chat_admission.degraded_slot():
+            return await get_rag_service().get_sources(question, scope)
+    except AdmissionRejected as e:
+        raise _too_busy(e)
 
 
 @router.post("", response_model=ChatResponse)
@@ -16,8 +70,20 @@ async def chat(request: ChatRequest):
     Answer user questions using RAG
     """
     try:
-        # Get answer from RAG service
-        answer, sources = await rag_service.get_answer(request.question)
+        scope = _scope(request)
+        rag_service = await load_rag_service()
+        if rag_service.is_inflight(request.question, scope):
+            # Joining an identical in-flight question costs no extra capacity
+            record_admission("coalesced")
+            answer, sources = await rag_service.get_answer(request.question, scope)
+        else:
+            try:
+                async with chat_admission.slot():
+                    answer, sources = await rag_service.get_answer(request.question, scope)
+            except AdmissionRejected as rejected:
+                logger.warning("Chat request shed", reason=rejected.reason, retry_after=rejected.retry_after)
+                sources = await _degraded_sources(request.question, scope, rejected)
+                return ChatResponse(answer=DEGRADED_ANSWER, sources=sources, degraded=True)
         
         logger.info(
             "Chat response generated",
@@ -27,6 +93,67 @@ async def chat(request: ChatRequest):
         
         return ChatResponse(answer=answer, sources=sources)
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("Failed to generate answer", error=str(e))
-        raise HTTPException(status_code=500, detail="Failed to generate answer")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Failed to generate answer")
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Answer user questions using RAG, streamed as server-sent events:
+    `sources` once, `delta` per answer piece, then `done` (or `error`).
+    Under overload the answer is degraded (sources only) or refused with 429.
+    """
+    holds_slot = False
+    degraded_sources = None
+    scope = _scope(request)
+    rag_service = await load_rag_service()
+    if rag_service.is_inflight(request.question, scope):
+        record_admission("coalesced")
+    else:
+        try:
+            await chat_admission.acquire()
+            holds_slot = True
+        except AdmissionRejected as rejected:
+            logger.warning("Chat request shed", reason=rejected.reason, retry_after=rejected.retry_after)
+            degraded_sources = await _degraded_sources(request.question, scope, rejected)
+    
+    async def events():
+        start = time.monotonic()
+        try:
+            # Primed below, so this finally runs even if the client never reads
+            yield ""
+            if degraded_sources is not None:
+                yield _sse("sources", {"sources": degraded_sources})
+                yield _sse("delta", {"text": DEGRADED_ANSWER})
+                yield _sse("done", {"degraded": True})
+                return
+            
+            async for event, data in rag_service.stream_answer(request.question, scope):
+                if event == "sources":
+                    yield _sse("sources", {"sources": data})
+                else:
+                    yield _sse("delta", {"text": data})
+            yield _sse("done", {})
+        except Exception as e:
+            logger.error("Failed to stream answer", error=str(e))
+            yield _sse("error", {"detail": "Failed to generate answer"})
+        finally:
+            if holds_slot:
+                chat_admission.release(time.monotonic() - start)
+    
+    stream = events()
+    await stream.__anext__()
+    
+    return StreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,7 +1,9 @@
 from fastapi import APIRouter, HTTPException
-from api.models import CrawlRequest, CrawlResponse, CrawlStatusResponse
-from tasks.crawler import crawl_website, auto_crawl_websites
+from api.models import CrawlRequest, CrawlResponse, CrawlStatusResponse, CrawlProgress
+from celery_app import celery_app
 from config import settings
+from services.generations import load_report
+from services.progress import get_progress, queue_crawl
 import uuid
 import json
 from pathlib import Path
@@ -20,11 +22,16 @@ async def trigger_crawl(request: CrawlRequest):
         task_id = str(uuid.uuid4())
         
         # Trigger async crawl task
-        crawl_website.delay(
-            task_id=task_id,
-            root_url=str(request.root_url),
-            max_depth=request.max_depth
+        # Sent by name: the API does not import the crawl/ingestion stack
+        celery_app.send_task(
+            "crawl_website",
+            kwargs={
+                "task_id": task_id,
+                "root_url": str(request.root_url),
+                "max_depth": request.max_depth
+            }
         )
+        queue_crawl(task_id)
         
         logger.info(
             "Crawl task triggered",
@@ -40,16 +47,43 @@ async def trigger_crawl(request: CrawlRequest):
         raise HTTPException(status_code=500, detail="Failed to trigger crawl task")
 
 
-@router.get("/{task_id}/status")
+STATUS_MESSAGES = {
+    "queued": "Waiting for a crawler worker",
+    "crawling": "Crawling pages",
+    "embedding": "Crawl finished, processing pages for embedding",
+    "completed": "Crawl and embedding completed",
+    "failed": "Crawl failed",
+    "skipped": "Skipped, this site is already being crawled",
+}
+
+
+@router.get("/{task_id}/status", response_model=CrawlStatusResponse)
 async def get_crawl_status(task_id: str):
     """
-    Get the status of a crawling task
+    Get the status and progress of a crawling task
     """
-    # TODO: Implement task status tracking
+    try:
+        data = get_progress(task_id)
+    except Exception as e:
+        logger.error("Failed to read crawl progress", task_id=task_id, error=str(e))
+        raise HTTPException(status_code=500, detail="Failed to read crawl status")
+    
+    if data is None:
+        return CrawlStatusResponse(
+            task_id=task_id,
+            status="not_found",
+            message="No progress recorded for this task (unknown, not started yet, or expired)"
+        )
+    
+    message = STATUS_MESSAGES.get(data["status"], data["status"])
+    if data.get("error"):
+        message = f"{message}: {data['error']}"
+    
     return CrawlStatusResponse(
         task_id=task_id,
-        status="in_progress",
-        message="Task status tracking will be implemented"
+        status=data["status"],
+        message=message,
+        progress=CrawlProgress(**data)
     )
 
 
@@ -150,7 +184,8 @@ async def trigger_auto_crawl():
         if not enabled_sites:
             raise HTTPException(status_code=400, detail="No enabled sites found for auto-crawl")
         
-        task = auto_crawl_websites.delay()
+        task = celery_app.send_task("auto_crawl_websites")
+        queue_crawl(task.id)
         
         logger.info("Manual auto-crawl triggered", task_id=task.id, enabled_sites=enabled_sites)
         
@@ -163,4 +198,34 @@ async def trigger_auto_crawl():
     
     except Exception as e:
         logger.error("Failed to trigger auto-crawl", error=str(e))
-        raise HTTPException(status_code=500, detail="Failed to trigger auto-crawl")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Failed to trigger auto-crawl")
+
+@router.post("/sweep", response_model=dict)
+async def trigger_sweep(dry_run: bool = True):
+    """
+    Remove pages the last SWEEP_KEEP_GENERATIONS crawls of their site did
+    not reach; with dry_run (the default) only report them
+    """
+    try:
+        task = celery_app.send_task("sweep_stale_pages", kwargs={"dry_run": dry_run})
+        logger.info("Sweep triggered", task_id=task.id, dry_run=dry_run)
+        return {"task_id": task.id, "status": "triggered", "dry_run": dry_run}
+    except Exception as e:
+        logger.error("Failed to trigger sweep", error=str(e))
+        raise HTTPException(status_code=500, detail="Failed to trigger sweep")
+
+
+@router.get("/sweep", response_model=dict)
+async def get_sweep_report():
+    """
+    Report of the last sweep: stale pages per site (sample URLs) and how many were removed
+    """
+    try:
+        report = load_report()
+    except Exception as e:
+        logger.error("Failed to read sweep report", error=str(e))
+        raise HTTPException(status_code=500, detail="Failed to read sweep report")
+    
+    if report is None:
+        raise HTTPException(status_code=404, detail="No sweep has run yet")
+    return report
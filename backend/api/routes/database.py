@@ -1,13 +1,16 @@
 from fastapi import APIRouter, HTTPException
-from qdrant_client import QdrantClient
 from datetime import datetime
 import pytz
+from celery_app import celery_app
 from config import settings
 import structlog
 
 logger = structlog.get_logger()
 router = APIRouter()
 
+# /db 목록에 필요한 payload 필드만 조회 (청크 텍스트 제외)
+LISTING_PAYLOAD_FIELDS = ["url", "updated_at", "chunk_index", "total_chunks"]
+
 # 한국 시간대 설정
 KST = pytz.timezone('Asia/Seoul')
 
@@ -21,10 +24,8 @@ async def get_db_status():
     """Get database status and recent crawling info"""
     try:
         # Qdrant 컬렉션 정보 가져오기
-        qdrant_client = QdrantClient(
-            url=settings.qdrant_host,
-            api_key=settings.qdrant_api_key
-        )
+        from services.vector_store import get_qdrant_client
+        qdrant_client = get_qdrant_client()
         
         logger.info(f"Connecting to Qdrant at {settings.qdrant_host}:{settings.qdrant_port}")
         
@@ -73,7 +74,7 @@ async def get_db_status():
                     collection_name=settings.qdrant_collection_name,
                     limit=100,
                     offset=next_offset,
-                    with_payload=True,
+                    with_payload=LISTING_PAYLOAD_FIELDS,
                     with_vectors=False
                 )
                 points, next_offset = scroll_result
@@ -146,6 +147,30 @@ async def get_db_status():
         }
 
 
+@router.post("/backfill-payload")
+async def trigger_payload_backfill():
+    """Add site/updated_ts payload to points written before scoped search (runs on a worker)"""
+    try:
+        task = celery_app.send_task("backfill_search_payload")
+        logger.info("Search payload backfill triggered", task_id=task.id)
+        return {"status": "triggered", "task_id": task.id}
+    except Exception as e:
+        logger.error("Failed to trigger payload backfill", error=str(e))
+        raise HTTPException(status_code=500, detail="Failed to trigger payload backfill")
+
+
+@router.post("/backfill-sparse")
+async def trigger_sparse_backfill():
+    """Add BM25 sparse vectors to a collection or points written before hybrid search (runs on a worker)"""
+    try:
+        task = celery_app.send_task("backfill_sparse_vectors")
+        logger.info("Sparse vector backfill triggered", task_id=task.id)
+        return {"status": "triggered", "task_id": task.id}
+    except Exception as e:
+        logger.error("Failed to trigger sparse vector backfill", error=str(e))
+        raise HTTPException(status_code=500, detail="Failed to trigger sparse vector backfill")
+
+
 @router.get("/search-url")
 async def search_url(url: str):
     """Search if a URL exists in the database using efficient filtering"""
@@ -159,11 +184,10 @@ async def search_url(url: str):
         # URL 정규화 (trailing slash 제거 등)
         normalized_url = url.rstrip('/')
         
-        # Qdrant 클라이언트 생성
-        qdrant_client = QdrantClient(
-            url=settings.qdrant_host,
-            api_key=settings.qdrant_api_key
-        )
+        # Qdrant 클라이언트 생성 (qdrant_client는 첫 요청에서 로드)
+        from services.vector_store import get_qdrant_client
+        from qdrant_client.models import Filter, FieldCondition, MatchText
+        qdrant_client = get_qdrant_client()
         
         logger.info(f"🔍 Searching for URL: {normalized_url}")
         
@@ -175,18 +199,11 @@ async def search_url(url: str):
             # URL로 시작하는 모든 문서를 효율적으로 검색
             scroll_result = qdrant_client.scroll(
                 collection_name=settings.qdrant_collection_name,
-                scroll_filter={
-                    "must": [
-                        {
-                            "key": "url",
-                            "match": {
-                                "text": normalized_url
-                            }
-                        }
-                    ]
-                },
+                scroll_filter=Filter(
+                    must=[FieldCondition(key="url", match=MatchText(text=normalized_url))]
+                ),
                 limit=100,  # 충분한 수의 결과를 가져옴
-                with_payload=True,
+                with_payload=LISTING_PAYLOAD_FIELDS,
                 with_vectors=False
             )
             
@@ -225,7 +242,7 @@ async def search_url(url: str):
                     collection_name=settings.qdrant_collection_name,
                     limit=100,
                     offset=next_offset,
-                    with_payload=True,
+                    with_payload=LISTING_PAYLOAD_FIELDS,
                     with_vectors=False
                 )
                 
@@ -0,0 +1,10 @@
+from fastapi import APIRouter, Response
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics of the API process"""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
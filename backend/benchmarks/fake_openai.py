@@ -0,0 +1,316 @@
+"""
+Deterministic local stand-in for the OpenAI embeddings and chat endpoints,
+plus the files and Batch API endpoints used by bulk embedding.
+"""
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hashlib
+import json
+import math
+import threading
+import time
+import uuid
+
+EMBEDDING_DIM = 1536
+
+
+def embedding_response(request: dict) -> dict:
+    """Body of an embeddings response for one request"""
+    inputs = request.get("input")
+    # A single string or a single token list is one input
+    if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+        inputs = [inputs]
+
+    data = [
+        {"object": "embedding", "index": i, "embedding": fake_embedding(text)}
+        for i, text in enumerate(inputs)
+    ]
+    tokens = sum(len(t.split()) if isinstance(t, str) else len(t) for t in inputs)
+    return {
+        "object": "list",
+        "data": data,
+        "model": request.get("model", "fake-embedding"),
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+    }
+
+
+def fake_embedding(text, dim: int = EMBEDDING_DIM) -> list:
+    """
+    Feature-hashed bag of words, L2-normalized. Texts sharing words get similar
+    vectors, so retrieval over fake embeddings still behaves like retrieval.
+    Token-id inputs (lists of ints, as sent by langchain) are hashed per token.
+    """
+    tokens = text.split() if isinstance(text, str) else [str(t) for t in text]
+    vector = [0.0] * dim
+    for token in tokens:
+        h = int.from_bytes(hashlib.md5(token.encode("utf-8")).digest()[:8], "big")
+        vector[h % dim] += 1.0 if (h >> 63) else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "FakeOpenAI/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, data: dict, status: int = 200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _not_found(self):
+        self._send_json({"error": {"message": f"unknown path {self.path}"}}, status=404)
+
+    def do_POST(self):
+        path = self.path.split("?")[0].rstrip("/")
+        if path.endswith("/embeddings"):
+            self._embeddings(self._read_json())
+        elif path.endswith("/chat/completions"):
+            self._chat(self._read_json())
+        elif path.endswith("/files"):
+            self._upload_file()
+        elif path.endswith("/batches"):
+            self._create_batch(self._read_json())
+        elif "/batches/" in path and path.endswith("/cancel"):
+            self._cancel_batch(path.split("/")[-2])
+        else:
+            self._not_found()
+
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        if "/files/" in path and path.endswith("/content"):
+            self._file_content(path.split("/")[-2])
+        elif "/batches/" in path:
+            self._retrieve_batch(path.split("/")[-1])
+        else:
+            self._not_found()
+
+    def do_DELETE(self):
+        path = self.path.split("?")[0].rstrip("/")
+        if "/files/" in path:
+            file_id = path.split("/")[-1]
+            with self.server.lock:
+                self.server.files.pop(file_id, None)
+            self._send_json({"id": file_id, "object": "file", "deleted": True})
+        else:
+            self._not_found()
+
+    def _embeddings(self, request: dict):
+        time.sleep(self.server.embedding_latency)
+        self._send_json(embedding_response(request))
+
+    # Files and Batch API (bulk embedding)
+
+    def _upload_file(self):
+        """multipart/form-data upload with `file` and `purpose` fields"""
+        length = int(self.headers.get("Content-Length") or 0)
+        header = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode("utf-8")
+        message = BytesParser(policy=HTTP).parsebytes(header + self.rfile.read(length))
+
+        content, filename, purpose = b"", "upload", ""
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            if name == "file":
+                content = part.get_payload(decode=True) or b""
+                filename = part.get_filename() or filename
+            elif name == "purpose":
+                purpose = part.get_content().strip()
+
+        file = self.server.add_file(content, filename, purpose)
+        self._send_json(file)
+
+    def _file_content(self, file_id: str):
+        with self.server.lock:
+            stored = self.server.files.get(file_id)
+        if stored is None:
+            self._not_found()
+            return
+        content = stored["content"]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _create_batch(self, request: dict):
+        batch = {
+            "id": f"batch_{uuid.uuid4().hex[:24]}",
+            "object": "batch",
+            "endpoint": request["endpoint"],
+            "input_file_id": request["input_file_id"],
+            "completion_window": request.get("completion_window", "24h"),
+            "status": "validating",
+            "created_at": int(time.time()),
+            "metadata": request.get("metadata"),
+            "output_file_id": None,
+            "error_file_id": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0}
+        }
+        with self.server.lock:
+            self.server.batches[batch["id"]] = batch
+        self._send_json(batch)
+
+    def _retrieve_batch(self, batch_id: str):
+        with self.server.lock:
+            batch = self.server.batches.get(batch_id)
+            if batch is None:
+                self._not_found()
+                return
+            if batch["status"] in ("validating", "in_progress"):
+                if time.time() - batch["created_at"] >= self.server.batch_latency:
+                    self.server.complete_batch(batch)
+                else:
+                    batch["status"] = "in_progress"
+            body = dict(batch)
+        self._send_json(body)
+
+    def _cancel_batch(self, batch_id: str):
+        with self.server.lock:
+            batch = self.server.batches.get(batch_id)
+            if batch is not None and batch["status"] in ("validating", "in_progress"):
+                batch["status"] = "cancelled"
+            body = dict(batch) if batch else None
+        if body is None:
+            self._not_found()
+        else:
+            self._send_json(body)
+
+    def _chat(self, request: dict):
+        messages = request.get("messages", [])
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in messages)
+        answer = "테스트 답변입니다. 컨텍스트를 바탕으로 안내드립니다."
+
+        if request.get("stream"):
+            self._stream_chat(request, answer)
+            return
+        
+        time.sleep(self.server.llm_latency)
+        self._send_json({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake-llm"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(answer.split()),
+                "total_tokens": prompt_tokens + len(answer.split())
+            }
+        })
+
+
+    def _stream_chat(self, request: dict, answer: str):
+        """Server-sent chat.completion.chunk events, latency spread across the words"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+
+        words = answer.split(" ")
+        pieces = [{"role": "assistant", "content": ""}] + [
+            {"content": word if i == 0 else f" {word}"} for i, word in enumerate(words)
+        ]
+        for i, delta in enumerate(pieces):
+            if i:
+                time.sleep(self.server.llm_latency / len(words))
+            chunk = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "fake-llm"),
+                "choices": [{
+                    "index": 0,
+                    "delta": delta,
+                    "finish_reason": "stop" if i == len(pieces) - 1 else None
+                }]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+class _Server(ThreadingHTTPServer):
+    """HTTP server holding the uploaded files and batches"""
+
+    daemon_threads = True
+
+    def __init__(self, address, batch_failures: int = 0):
+        super().__init__(address, _Handler)
+        self.lock = threading.Lock()
+        self.files = {}
+        self.batches = {}
+        self.batch_failures = batch_failures
+
+    def add_file(self, content: bytes, filename: str, purpose: str) -> dict:
+        file = {
+            "id": f"file-{uuid.uuid4().hex[:24]}",
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed"
+        }
+        self.files[file["id"]] = dict(file, content=content)
+        return file
+
+    def complete_batch(self, batch: dict):
+        """Run every request of the batch; the first `batch_failures` requests fail (caller holds the lock)"""
+        lines = self.files[batch["input_file_id"]]["content"].decode("utf-8").splitlines()
+        output = []
+        failed = 0
+        for line in filter(None, lines):
+            request = json.loads(line)
+            if failed < self.batch_failures:
+                failed += 1
+                response = {"status_code": 500, "request_id": uuid.uuid4().hex, "body": {"error": {"message": "fake failure"}}}
+            else:
+                response = {"status_code": 200, "request_id": uuid.uuid4().hex, "body": embedding_response(request["body"])}
+            output.append(json.dumps({"id": f"batch_req_{uuid.uuid4().hex[:16]}", "custom_id": request["custom_id"], "response": response, "error": None}))
+
+        file = self.add_file(("\n".join(output) + "\n").encode("utf-8"), "batch_output.jsonl", "batch_output")
+        batch.update(
+            status="completed",
+            output_file_id=file["id"],
+            completed_at=int(time.time()),
+            request_counts={"total": len(output), "completed": len(output) - failed, "failed": failed}
+        )
+
+
+class FakeOpenAIServer:
+    """Run the stand-in on localhost in a background thread"""
+
+    def __init__(self, port: int = 0, embedding_latency_ms: float = 0, llm_latency_ms: float = 0,
+                 batch_latency_ms: float = 0, batch_failures: int = 0):
+        self.httpd = _Server(("127.0.0.1", port), batch_failures=batch_failures)
+        self.httpd.embedding_latency = embedding_latency_ms / 1000
+        self.httpd.llm_latency = llm_latency_ms / 1000
+        self.httpd.batch_latency = batch_latency_ms / 1000
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
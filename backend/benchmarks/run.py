@@ -0,0 +1,471 @@
+"""
+Offline end-to-end benchmark.
+
+Serves a synthetic school site from local fixtures, answers embedding/chat
+calls with a deterministic fake OpenAI server and stores vectors in an
+in-process Qdrant, then measures API cold start, crawl, extraction,
+ingestion, upsert, stored payload size and /chat latency (unscoped and
+scoped to one site). Results are written as JSON; with --baseline the run fails
+(exit code 1) when a metric regresses by more than --tolerance.
+
+    cd backend
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --baseline bench.json --tolerance 0.2
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.site import SiteServer, generate_site
+from benchmarks.startup import measure_startup
+
+# (section, metric): higher is better / lower is better
+HIGHER_IS_BETTER = [
+    ("crawl", "pages_per_sec"),
+    ("extraction", "pages_per_sec"),
+    ("ingestion", "pages_per_sec"),
+    ("ingestion", "chunks_per_sec"),
+    ("ingestion_batch", "pages_per_sec"),
+    ("bulk_ingestion", "pages_per_sec"),
+    ("upsert", "points_per_sec"),
+    ("write_buffer", "points_per_sec"),
+    ("chat", "requests_per_sec"),
+    ("chat_scoped", "requests_per_sec"),
+]
+LOWER_IS_BETTER = [
+    ("startup", "import_seconds"),
+    ("startup", "rss_mb"),
+    ("chat", "p50_ms"),
+    ("chat", "p95_ms"),
+    ("chat", "p99_ms"),
+    ("chat_scoped", "p95_ms"),
+    ("payload", "bytes_per_point"),
+]
+
+
+def configure_environment(openai_base_url: str):
+    """Point the backend at the local stand-ins (must run before importing config)"""
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    os.environ["OPENAI_BASE_URL"] = openai_base_url
+    os.environ["QDRANT_HOST"] = os.environ.get("BENCH_QDRANT_HOST", ":memory:")
+    os.environ["QDRANT_COLLECTION_NAME"] = "benchmark_documents"
+    os.environ["AUTO_CRAWL_ENABLED"] = "false"
+
+    # Logs go to stderr: stdout carries only the JSON report (pipe it to jq)
+    import structlog
+    structlog.configure(
+        wrapper_class=structlog.make_filtering_bound_logger(logging.ERROR),
+        logger_factory=structlog.PrintLoggerFactory(sys.stderr)
+    )
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def redis_available() -> bool:
+    try:
+        from services.redis_client import get_redis_client
+        return bool(get_redis_client().ping())
+    except Exception:
+        return False
+
+
+def bench_crawl(base_url: str, max_depth: int) -> dict:
+    """Playwright crawl of the fixture site (skipped if Chromium is not installed)"""
+    try:
+        from tasks.browser_pool import run_in_worker_loop, get_browser_pool
+        from tasks.crawler import crawl_async
+
+        start = time.perf_counter()
+        urls = run_in_worker_loop(crawl_async(f"{base_url}/index.html", max_depth))
+        elapsed = time.perf_counter() - start
+        run_in_worker_loop(get_browser_pool().close())
+    except Exception as e:
+        return {"skipped": f"{type(e).__name__}: {e}"[:300]}
+    if not urls:
+        # crawl_async logs and swallows page errors, e.g. a missing Chromium build
+        return {"skipped": "no pages crawled (is Chromium installed?)"}
+
+    return {
+        "pages": len(urls),
+        "seconds": round(elapsed, 3),
+        "pages_per_sec": round(len(urls) / elapsed, 2) if elapsed else 0.0
+    }
+
+
+def bench_extraction(site_root: Path, paths) -> dict:
+    from services.extraction import measure_throughput
+
+    pages = [(site_root / path.lstrip("/")).read_text(encoding="utf-8") for path in paths]
+    return measure_throughput(pages)
+
+
+def bench_ingestion(urls) -> dict:
+    from tasks.embeddings import _process_url_for_embedding_smart
+
+    statuses = {}
+    chunks = 0
+    start = time.perf_counter()
+    for url in urls:
+        result = _process_url_for_embedding_smart(url)
+        key = result.get("reason", result.get("status"))
+        statuses[key] = statuses.get(key, 0) + 1
+        chunks += result.get("chunks_processed", 0)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "pages": len(urls),
+        "chunks": chunks,
+        "seconds": round(elapsed, 3),
+        "pages_per_sec": round(len(urls) / elapsed, 2) if elapsed else 0.0,
+        "chunks_per_sec": round(chunks / elapsed, 2) if elapsed else 0.0,
+        "outcomes": statuses
+    }
+
+
+def bench_ingestion_batch(urls, batch_size: int) -> dict:
+    """Batched ingestion task (concurrent fetch, shared embedding requests, grouped upserts)"""
+    from config import settings
+    from services.vector_store import forget_sparse_support, get_qdrant_client
+    from tasks.embeddings import process_urls_for_embedding_batch
+
+    # Start from an empty collection so pages are not skipped as unchanged
+    client = get_qdrant_client()
+    if client.collection_exists(settings.qdrant_collection_name):
+        client.delete_collection(settings.qdrant_collection_name)
+    forget_sparse_support(settings.qdrant_collection_name)
+
+    statuses = {}
+    chunks = 0
+    start = time.perf_counter()
+    for offset in range(0, len(urls), batch_size):
+        summary = process_urls_for_embedding_batch.apply(args=[urls[offset:offset + batch_size]]).get()
+        for result in summary["results"]:
+            key = result.get("reason", result.get("status"))
+            statuses[key] = statuses.get(key, 0) + 1
+            chunks += result.get("chunks_processed", 0)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "pages": len(urls),
+        "batch_size": batch_size,
+        "chunks": chunks,
+        "seconds": round(elapsed, 3),
+        "pages_per_sec": round(len(urls) / elapsed, 2) if elapsed else 0.0,
+        "chunks_per_sec": round(chunks / elapsed, 2) if elapsed else 0.0,
+        "outcomes": statuses
+    }
+
+
+def bench_bulk_ingestion(urls) -> dict:
+    """Batch API ingestion against the fake server: submit, poll until done, ingest"""
+    if not redis_available():
+        return {"skipped": "Redis is needed for bulk job state"}
+
+    from config import settings
+    from services.vector_store import forget_sparse_support, get_qdrant_client
+    from tasks.bulk_embeddings import check_bulk_job, submit_pages
+    from tasks.embeddings import fetch_and_prepare_pages
+
+    client = get_qdrant_client()
+    if client.collection_exists(settings.qdrant_collection_name):
+        client.delete_collection(settings.qdrant_collection_name)
+    forget_sparse_support(settings.qdrant_collection_name)
+
+    start = time.perf_counter()
+    _, prepared = fetch_and_prepare_pages(urls)
+    batch_id = submit_pages(prepared)
+    result = check_bulk_job(batch_id)
+    while result["status"] not in ("completed", "unknown_job"):
+        time.sleep(0.05)
+        result = check_bulk_job(batch_id)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "pages": len(urls),
+        "pages_written": result.get("pages_written", 0),
+        "seconds": round(elapsed, 3),
+        "pages_per_sec": round(len(urls) / elapsed, 2) if elapsed else 0.0
+    }
+
+
+def bench_upsert(points: int, batch_size: int) -> dict:
+    from qdrant_client.models import Distance, PointStruct, VectorParams
+    from services.vector_store import get_qdrant_client
+
+    client = get_qdrant_client()
+    collection = "benchmark_upsert"
+    if client.collection_exists(collection):
+        client.delete_collection(collection)
+    client.create_collection(collection, vectors_config=VectorParams(size=1536, distance=Distance.COSINE))
+
+    rng = random.Random(7)
+    batches = []
+    for offset in range(0, points, batch_size):
+        batches.append([
+            PointStruct(
+                id=i,
+                vector=[rng.random() for _ in range(1536)],
+                payload={"url": f"https://bench/{i % 50}", "chunk_index": i}
+            )
+            for i in range(offset, min(offset + batch_size, points))
+        ])
+
+    start = time.perf_counter()
+    for batch in batches:
+        client.upsert(collection_name=collection, points=batch)
+    elapsed = time.perf_counter() - start
+    client.delete_collection(collection)
+
+    return {
+        "points": points,
+        "batch_size": batch_size,
+        "seconds": round(elapsed, 3),
+        "points_per_sec": round(points / elapsed, 1) if elapsed else 0.0
+    }
+
+
+def bench_write_buffer(pages: int, points_per_page: int) -> dict:
+    """Per-task writes (delete + upsert per page) sent directly vs through the write buffer"""
+    from qdrant_client.models import Distance, FilterSelector, PointStruct, VectorParams
+    from config import settings
+    from services.vector_store import get_qdrant_client, urls_filter
+    from services.write_buffer import QdrantWriteBuffer
+
+    client = get_qdrant_client()
+    collection = "benchmark_write_buffer"
+    rng = random.Random(11)
+    writes = [
+        (f"https://bench/{page}", [
+            PointStruct(
+                id=page * points_per_page + i,
+                vector=[rng.random() for _ in range(1536)],
+                payload={"url": f"https://bench/{page}", "chunk_index": i}
+            )
+            for i in range(points_per_page)
+        ])
+        for page in range(pages)
+    ]
+
+    def reset():
+        if client.collection_exists(collection):
+            client.delete_collection(collection)
+        client.create_collection(collection, vectors_config=VectorParams(size=1536, distance=Distance.COSINE))
+
+    reset()
+    start = time.perf_counter()
+    for url, points in writes:
+        client.delete(collection_name=collection, points_selector=FilterSelector(filter=urls_filter([url])))
+        client.upsert(collection_name=collection, points=points)
+    direct = time.perf_counter() - start
+
+    reset()
+    # The in-process Qdrant is not thread-safe; a server gets parallel requests
+    buffer = QdrantWriteBuffer(
+        collection,
+        max_points=settings.qdrant_write_buffer_max_points,
+        max_seconds=settings.qdrant_write_buffer_max_seconds,
+        parallelism=1 if settings.qdrant_host == ":memory:" else settings.qdrant_write_parallelism,
+        journal=redis_available()
+    )
+    buffer.start()
+    start = time.perf_counter()
+    for url, points in writes:
+        buffer.delete_urls([url])
+        buffer.upsert(points)
+    buffer.close()
+    buffered = time.perf_counter() - start
+    stored = client.count(collection).count
+    client.delete_collection(collection)
+
+    total = pages * points_per_page
+    return {
+        "points": total,
+        "points_per_page": points_per_page,
+        "journal": buffer.journal,
+        "stored": stored,
+        "direct_points_per_sec": round(total / direct, 1) if direct else 0.0,
+        "points_per_sec": round(total / buffered, 1) if buffered else 0.0
+    }
+
+
+def bench_payload() -> dict:
+    """Average stored payload size per point: what /db scrolls transfer and Qdrant keeps in memory"""
+    from config import settings
+    from services.vector_store import get_qdrant_client
+
+    client = get_qdrant_client()
+    points = 0
+    total_bytes = 0
+    offset = None
+    while True:
+        batch, offset = client.scroll(settings.qdrant_collection_name, limit=256, offset=offset, with_payload=True)
+        points += len(batch)
+        total_bytes += sum(len(json.dumps(p.payload, ensure_ascii=False).encode("utf-8")) for p in batch)
+        if offset is None:
+            break
+
+    return {
+        "text_store": settings.chunk_text_store or "payload",
+        "points": points,
+        "bytes_per_point": round(total_bytes / points, 1) if points else 0.0
+    }
+
+
+async def bench_chat(questions, total_requests: int, concurrency: int, scope=None) -> dict:
+    import httpx
+    from api import create_app
+
+    app = create_app()
+    latencies = []
+    errors = 0
+    degraded = 0
+    no_sources = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60) as client:
+        async def one(i: int):
+            nonlocal errors, degraded, no_sources
+            body = {"question": questions[i % len(questions)]}
+            if scope:
+                body["scope"] = scope
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/chat", json=body)
+                latencies.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 200:
+                    errors += 1
+                    return
+                data = response.json()
+                if data.get("degraded"):
+                    degraded += 1
+                if not data.get("sources"):
+                    no_sources += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total_requests)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "requests": total_requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "degraded": degraded,
+        "no_sources": no_sources,
+        "requests_per_sec": round(total_requests / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(statistics.mean(latencies), 2) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2)
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """List metrics that regressed by more than `tolerance` (a fraction) against the baseline"""
+    regressions = []
+
+    def value(data, section, metric):
+        v = data.get(section, {}).get(metric)
+        return v if isinstance(v, (int, float)) and v > 0 else None
+
+    for section, metric in HIGHER_IS_BETTER + LOWER_IS_BETTER:
+        new, old = value(results, section, metric), value(baseline, section, metric)
+        if new is None or old is None:
+            continue
+        higher_is_better = (section, metric) in HIGHER_IS_BETTER
+        change = (old - new) / old if higher_is_better else (new - old) / old
+        if change > tolerance:
+            regressions.append({
+                "metric": f"{section}.{metric}",
+                "baseline": old,
+                "current": new,
+                "change": round(change, 3)
+            })
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark")
+    parser.add_argument("--notices", type=int, default=60, help="number of notice pages in the synthetic site")
+    parser.add_argument("--max-depth", type=int, default=2)
+    parser.add_argument("--ingest-batch", type=int, default=20, help="URLs per batched ingestion task")
+    parser.add_argument("--upsert-points", type=int, default=2000)
+    parser.add_argument("--upsert-batch", type=int, default=100)
+    parser.add_argument("--write-pages", type=int, default=200, help="pages written in the write buffer benchmark")
+    parser.add_argument("--write-points-per-page", type=int, default=8)
+    parser.add_argument("--chat-requests", type=int, default=200)
+    parser.add_argument("--chat-concurrency", type=int, default=20)
+    parser.add_argument("--embedding-latency-ms", type=float, default=5, help="simulated embedding API latency")
+    parser.add_argument("--llm-latency-ms", type=float, default=50, help="simulated LLM latency")
+    parser.add_argument("--skip-crawl", action="store_true")
+    parser.add_argument("--output", help="write results JSON to this file")
+    parser.add_argument("--baseline", help="results JSON of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            FakeOpenAIServer(embedding_latency_ms=args.embedding_latency_ms, llm_latency_ms=args.llm_latency_ms) as fake_openai:
+        configure_environment(fake_openai.base_url)
+        site_root = Path(tmp) / "site"
+        paths = generate_site(site_root, notices=args.notices)
+
+        with SiteServer(site_root) as site:
+            urls = [f"{site.base_url}{path}" for path in paths]
+            results = {
+                "meta": {
+                    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "python": sys.version.split()[0],
+                    "pages": len(paths),
+                    "redis_available": redis_available(),
+                    "args": vars(args)
+                }
+            }
+
+            results["startup"] = measure_startup()
+            results["crawl"] = {"skipped": "--skip-crawl"} if args.skip_crawl else bench_crawl(site.base_url, args.max_depth)
+            results["extraction"] = bench_extraction(site_root, paths)
+            results["ingestion"] = bench_ingestion(urls)
+            results["ingestion_batch"] = bench_ingestion_batch(urls, args.ingest_batch)
+            results["bulk_ingestion"] = bench_bulk_ingestion(urls)
+            results["upsert"] = bench_upsert(args.upsert_points, args.upsert_batch)
+            results["write_buffer"] = bench_write_buffer(args.write_pages, args.write_points_per_page)
+            results["payload"] = bench_payload()
+
+            questions = [f"CSE{1000 + i * 37} 수강신청 일정 안내" for i in range(20)]
+            results["chat"] = asyncio.run(bench_chat(questions, args.chat_requests, args.chat_concurrency))
+            # Pages of the synthetic site are not in crawl_sites.json, so their site id is the host
+            site_id = urlparse(site.base_url).netloc
+            results["chat_scoped"] = asyncio.run(
+                bench_chat(questions, args.chat_requests, args.chat_concurrency, scope=[site_id])
+            )
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            results["regressions"] = compare(results, json.load(f), args.tolerance)
+        exit_code = 1 if results["regressions"] else 0
+
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    print(output)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
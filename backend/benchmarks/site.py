@@ -0,0 +1,117 @@
+"""Synthetic school website served from local HTML fixtures"""
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import List, Tuple
+import random
+import threading
+
+VOCABULARY = [
+    "학사", "공지", "수강신청", "장학금", "졸업", "논문", "세미나", "연구실", "교수", "학부",
+    "대학원", "전공", "필수", "선택", "과목", "학점", "시험", "일정", "변경", "안내",
+    "신청", "마감", "기간", "제출", "서류", "면접", "모집", "인턴십", "취업", "상담",
+    "컴퓨터공학", "인공지능", "데이터", "보안", "네트워크", "소프트웨어", "알고리즘", "운영체제",
+]
+BUILDINGS = ["신공학관", "아산공학관", "종합과학관", "학관", "포스코관"]
+
+NAV = """<header><div class="logo">이화여자대학교 컴퓨터공학과</div></header>
+<nav><ul>
+<li><a href="/index.html">홈</a></li><li><a href="/intro.html">학과소개</a></li>
+<li><a href="/board/list-1.html">공지사항</a></li><li><a href="/people.html">구성원</a></li>
+</ul></nav>"""
+FOOTER = """<footer><p>서울특별시 서대문구 이화여대길 52 신공학관</p>
+<p>TEL 02-3277-0000 | FAX 02-3277-0001</p><p>Copyright Ewha Womans University</p></footer>"""
+CONTACT = """<div class="side-contact"><p>학과 사무실</p><p>운영시간 09:00 - 17:00</p></div>"""
+
+
+def _page(title: str, body: str) -> str:
+    return f"""<!DOCTYPE html><html lang="ko"><head><meta charset="utf-8"><title>{title}</title>
+<link rel="stylesheet" href="/static/style.css"><script src="/static/app.js"></script></head>
+<body>{NAV}{CONTACT}<div id="container"><div class="content"><h1>{title}</h1>{body}</div></div>{FOOTER}</body></html>"""
+
+
+def _sentence(rng: random.Random) -> str:
+    words = rng.choices(VOCABULARY, k=rng.randint(8, 16))
+    return " ".join(words) + "."
+
+
+def _notice(rng: random.Random, notice_id: int) -> Tuple[str, str]:
+    course = f"CSE{rng.randint(1000, 4999)}"
+    date = f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    title = f"[공지] {course} {rng.choice(VOCABULARY)} {rng.choice(VOCABULARY)} 안내 ({notice_id})"
+    paragraphs = "".join(f"<p>{_sentence(rng)}</p>" for _ in range(rng.randint(6, 14)))
+    body = (
+        f"<div class='meta'>작성일 {date} | 장소 {rng.choice(BUILDINGS)} {rng.randint(100, 999)}호</div>"
+        f"{paragraphs}<p>문의: {course} 담당 조교</p>"
+    )
+    return title, body
+
+
+def generate_site(root: Path, notices: int = 60, per_page: int = 10, seed: int = 42) -> List[str]:
+    """
+    Write a deterministic school site (home, intro, people, paginated notice
+    board, notice pages and their print views) and return its page paths.
+    """
+    rng = random.Random(seed)
+    root.mkdir(parents=True, exist_ok=True)
+    (root / "board").mkdir(exist_ok=True)
+    (root / "static").mkdir(exist_ok=True)
+    (root / "static" / "style.css").write_text("body{font-family:sans-serif}", encoding="utf-8")
+    (root / "static" / "app.js").write_text("window.app=1;", encoding="utf-8")
+
+    paths = []
+
+    def write(path: str, html: str):
+        (root / path.lstrip("/")).write_text(html, encoding="utf-8")
+        paths.append(path)
+
+    home_links = "".join(f"<li><a href='/board/view-{i}.html'>최근 공지 {i}</a></li>" for i in range(5))
+    write("/index.html", _page("컴퓨터공학과", f"<p>{_sentence(rng)}</p><ul>{home_links}</ul>"))
+    write("/intro.html", _page("학과소개", "".join(f"<p>{_sentence(rng)}</p>" for _ in range(20))))
+    write("/people.html", _page("구성원", "".join(
+        f"<p>교수 {i}: {rng.choice(VOCABULARY)} 연구실, {rng.choice(BUILDINGS)} {rng.randint(100, 999)}호</p>"
+        for i in range(30)
+    )))
+
+    pages = (notices + per_page - 1) // per_page
+    for page in range(1, pages + 1):
+        items = []
+        for notice_id in range((page - 1) * per_page, min(page * per_page, notices)):
+            items.append(f"<li><a href='/board/view-{notice_id}.html'>공지 {notice_id}</a></li>")
+        pager = "".join(f"<a href='/board/list-{p}.html'>{p}</a> " for p in range(1, pages + 1))
+        write(f"/board/list-{page}.html", _page("공지사항", f"<ul>{''.join(items)}</ul><div>{pager}</div>"))
+
+    for notice_id in range(notices):
+        title, body = _notice(rng, notice_id)
+        print_link = f"<a href='/board/print-{notice_id}.html'>인쇄</a>"
+        write(f"/board/view-{notice_id}.html", _page(title, body + print_link))
+        # Print view: same notice, different layout
+        write(f"/board/print-{notice_id}.html", f"<html><body><h1>{title}</h1>{body}</body></html>")
+
+    return paths
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class SiteServer:
+    """Serve a fixture directory on localhost in a background thread"""
+
+    def __init__(self, root: Path, port: int = 0):
+        handler = partial(_QuietHandler, directory=str(root))
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
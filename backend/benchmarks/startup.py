@@ -0,0 +1,114 @@
+"""
+API cold-start budget: import time and resident memory of a fresh process
+importing the FastAPI app, and heavy modules that must not be imported at
+startup (they belong to the worker, or load lazily on first use). Exits
+with code 1 when the budget is exceeded, so it can gate CI.
+
+    cd backend
+    python -m benchmarks.startup --max-seconds 2 --max-rss-mb 120
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Loaded lazily by the API (RAG service, /db handlers) or only by Celery workers
+FORBIDDEN_MODULES = [
+    "playwright",
+    "tasks.crawler",
+    "tasks.embeddings",
+    "tasks.bulk_embeddings",
+    "services.rag",
+    "langchain",
+    "langchain_openai",
+    "langchain_text_splitters",
+    "qdrant_client",
+    "onnxruntime",
+]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+app = main.app
+elapsed = time.perf_counter() - start
+rss_kb = 0
+with open("/proc/self/status") as f:
+    for line in f:
+        if line.startswith("VmRSS:"):
+            rss_kb = int(line.split()[1])
+print(json.dumps({
+    "import_seconds": elapsed,
+    "rss_mb": rss_kb / 1024,
+    "loaded": [m for m in FORBIDDEN if m in sys.modules]
+}))
+"""
+
+
+# Budgets of the CI check (tests/test_startup.py) and the CLI defaults
+MAX_IMPORT_SECONDS = 2.0
+MAX_RSS_MB = 120
+
+
+def probe_once() -> dict:
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "startup-probe")
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    code = f"FORBIDDEN = {FORBIDDEN_MODULES!r}\n{PROBE}"
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure_startup(runs: int = 3) -> dict:
+    """Median import time and RSS over `runs` fresh processes"""
+    try:
+        probes = [probe_once() for _ in range(runs)]
+    except (subprocess.CalledProcessError, OSError, ValueError) as e:
+        return {"skipped": f"{type(e).__name__}: {getattr(e, 'stderr', '') or e}"[-300:]}
+
+    return {
+        "runs": runs,
+        "import_seconds": round(statistics.median(p["import_seconds"] for p in probes), 3),
+        "rss_mb": round(statistics.median(p["rss_mb"] for p in probes), 1),
+        "forbidden_loaded": sorted({m for p in probes for m in p["loaded"]})
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="API cold-start budget check")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--max-seconds", type=float, default=MAX_IMPORT_SECONDS, help="budget for importing the app")
+    parser.add_argument("--max-rss-mb", type=float, default=MAX_RSS_MB, help="budget for resident memory after import")
+    args = parser.parse_args(argv)
+
+    result = measure_startup(args.runs)
+    violations = []
+    if "skipped" in result:
+        violations.append(f"probe failed: {result['skipped']}")
+    else:
+        if result["import_seconds"] > args.max_seconds:
+            violations.append(f"import took {result['import_seconds']}s (budget {args.max_seconds}s)")
+        if result["rss_mb"] > args.max_rss_mb:
+            violations.append(f"RSS {result['rss_mb']} MB (budget {args.max_rss_mb} MB)")
+        if result["forbidden_loaded"]:
+            violations.append(f"imported at startup: {', '.join(result['forbidden_loaded'])}")
+
+    result["violations"] = violations
+    print(json.dumps(result, indent=2))
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,5 @@
 from celery import Celery
+from celery.signals import task_retry, worker_init
 from config import settings
 
 # Create Celery instance
@@ -6,7 +7,7 @@ celery_app = Celery(
     "rag_chatbot",
     broker=settings.celery_broker_url,
     backend=settings.celery_result_backend,
-    include=["tasks.crawler", "tasks.embeddings"]
+    include=["tasks.crawler", "tasks.embeddings", "tasks.bulk_embeddings", "tasks.sweep", "tasks.sparse_migration"]
 )
 
 # Configure Celery
@@ -21,4 +22,18 @@ celery_app.conf.update(
     task_soft_time_limit=25 * 60,  # 25 minutes
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=1000,
-)
\ No newline at end of file
+)
+
+
+@task_retry.connect
+def count_task_retry(sender=None, **kwargs):
+    from services.metrics import record_retry
+    record_retry(sender.name if sender else "unknown")
+
+
+@worker_init.connect
+def start_metrics_exporter(**kwargs):
+    """Expose worker metrics (Prometheus text format) on WORKER_METRICS_PORT"""
+    if settings.metrics_enabled:
+        from services.metrics import start_worker_exporter
+        start_worker_exporter(settings.worker_metrics_port)
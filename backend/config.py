@@ -1,33 +1,63 @@
 import os
 import json
 from pathlib import Path
+from urllib.parse import urlparse
 from pydantic_settings import BaseSettings
 from pydantic import Field
-from typing import List, Optional
+from typing import Dict, List, Optional, Set, Tuple
 
 
-def load_crawl_sites() -> List[str]:
-    """Load crawl sites from JSON configuration file"""
+CRAWL_SITES_PATH = Path(__file__).parent / "crawl_sites.json"
+
+# (file mtime, site entries, first site per host); the file is parsed again only when it changes
+_crawl_sites_cache: Tuple[Optional[int], List[dict], Dict[str, dict]] = (None, [], {})
+
+
+def _crawl_sites() -> Tuple[List[dict], Dict[str, dict]]:
+    global _crawl_sites_cache
     try:
-        config_path = Path(__file__).parent / "crawl_sites.json"
-        with open(config_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # Extract enabled URLs only
-        enabled_urls = [
-            site["url"] for site in data["sites"] 
-            if site.get("enabled", True)
-        ]
-        return enabled_urls
+        mtime = CRAWL_SITES_PATH.stat().st_mtime_ns
+        if _crawl_sites_cache[0] != mtime:
+            with open(CRAWL_SITES_PATH, 'r', encoding='utf-8') as f:
+                sites = json.load(f).get("sites", [])
+            by_host = {}
+            for site in sites:
+                by_host.setdefault(urlparse(site.get("url", "")).netloc, site)
+            _crawl_sites_cache = (mtime, sites, by_host)
     except Exception as e:
-        # JSON 파일 읽기 실패 시 빈 리스트 반환
+        # JSON 파일 읽기 실패 시 빈 목록 반환
         print(f"Error: Could not load crawl_sites.json: {e}")
-        return []
+        return [], {}
+    return _crawl_sites_cache[1], _crawl_sites_cache[2]
+
+
+def load_crawl_site_configs() -> List[dict]:
+    """Load all site entries (enabled or not) from the JSON configuration file"""
+    return list(_crawl_sites()[0])
+
+
+def load_crawl_sites() -> List[str]:
+    """Load the URLs of the enabled sites from the JSON configuration file"""
+    return [site["url"] for site in load_crawl_site_configs() if site.get("enabled", True)]
+
+
+def find_crawl_site(url: str) -> Optional[dict]:
+    """Find the configured site whose host matches the given URL"""
+    return _crawl_sites()[1].get(urlparse(url).netloc)
+
+
+def site_id_for_url(url: str) -> str:
+    """Site a page belongs to: the "id" of its configured site, else its host"""
+    site = find_crawl_site(url)
+    if site and site.get("id"):
+        return site["id"]
+    return urlparse(url).netloc
 
 
 class Settings(BaseSettings):
     # OpenAI
     openai_api_key: str = Field(..., env="OPENAI_API_KEY")
+    openai_base_url: str = Field(default="", env="OPENAI_BASE_URL")  # 로컬 대체 서버 (벤치마크용)
     
     # RabbitMQ
     rabbitmq_host: str = Field(default="localhost", env="RABBITMQ_HOST")
@@ -64,21 +94,159 @@ class Settings(BaseSettings):
     chunk_size: int = Field(default=1000, env="CHUNK_SIZE")
     chunk_overlap: int = Field(default=100, env="CHUNK_OVERLAP")
     
+    # Text Extraction
+    extraction_engine: str = Field(default="lxml", env="EXTRACTION_ENGINE")  # lxml | bs4 | bs4-lxml
+    extraction_pool_workers: int = Field(default=0, env="EXTRACTION_POOL_WORKERS")  # 0이면 인라인 처리
+    extraction_pool_min_bytes: int = Field(default=200_000, env="EXTRACTION_POOL_MIN_BYTES")
+    
+    # Boilerplate Detection (blocks repeated across a site's pages)
+    boilerplate_enabled: bool = Field(default=True, env="BOILERPLATE_ENABLED")
+    boilerplate_min_pages: int = Field(default=5, env="BOILERPLATE_MIN_PAGES")  # 모델 적용 전 최소 관찰 페이지 수
+    boilerplate_min_ratio: float = Field(default=0.5, env="BOILERPLATE_MIN_RATIO")  # 이 비율 이상 페이지에 등장하면 boilerplate
+    boilerplate_window_days: int = Field(default=7, env="BOILERPLATE_WINDOW_DAYS")  # 최근 1~2개 구간(일)의 관찰만 사용
+    
+    # Near-Duplicate Detection (SimHash across URLs)
+    near_duplicate_enabled: bool = Field(default=True, env="NEAR_DUPLICATE_ENABLED")
+    near_duplicate_max_distance: int = Field(default=3, env="NEAR_DUPLICATE_MAX_DISTANCE")  # 64비트 중 허용 Hamming 거리
+    
+    # Batched Ingestion (크롤러가 발견한 URL을 묶어서 하나의 태스크로 처리)
+    ingest_batch_size: int = Field(default=20, env="INGEST_BATCH_SIZE")  # 1이면 URL마다 개별 태스크
+    ingest_batch_window_seconds: float = Field(default=10.0, env="INGEST_BATCH_WINDOW_SECONDS")  # 배치가 이보다 오래되면 바로 전송
+    ingest_fetch_concurrency: int = Field(default=8, env="INGEST_FETCH_CONCURRENCY")
+    upsert_batch_size: int = Field(default=256, env="UPSERT_BATCH_SIZE")  # Qdrant upsert 요청당 포인트 수
+    
+    # Qdrant Write Buffer (워커에서 여러 태스크의 쓰기를 모아서 전송)
+    qdrant_write_buffer_enabled: bool = Field(default=True, env="QDRANT_WRITE_BUFFER_ENABLED")
+    qdrant_write_buffer_max_points: int = Field(default=2048, env="QDRANT_WRITE_BUFFER_MAX_POINTS")  # 이만큼 쌓이면 바로 전송
+    qdrant_write_buffer_max_seconds: float = Field(default=5.0, env="QDRANT_WRITE_BUFFER_MAX_SECONDS")  # 가장 오래된 쓰기가 이보다 오래되면 전송
+    qdrant_write_parallelism: int = Field(default=4, env="QDRANT_WRITE_PARALLELISM")  # 동시 upsert 요청 수
+    
+    # Bulk Embedding (OpenAI Batch API, 야간 자동 크롤링용)
+    bulk_embedding_enabled: bool = Field(default=False, env="BULK_EMBEDDING_ENABLED")  # true면 자동 크롤링 결과를 Batch API로 임베딩
+    bulk_embedding_batch_urls: int = Field(default=500, env="BULK_EMBEDDING_BATCH_URLS")  # Batch API 작업 하나에 담을 URL 수
+    bulk_embedding_completion_window: str = Field(default="24h", env="BULK_EMBEDDING_COMPLETION_WINDOW")
+    bulk_embedding_poll_seconds: int = Field(default=300, env="BULK_EMBEDDING_POLL_SECONDS")
+    bulk_embedding_job_ttl_hours: int = Field(default=48, env="BULK_EMBEDDING_JOB_TTL_HOURS")
+    bulk_embedding_resume_minutes: int = Field(default=60, env="BULK_EMBEDDING_RESUME_MINUTES")  # 폴링이 끊긴 작업을 다시 확인하는 주기
+    
+    # Embedding Task Checkpoints (재시도 시 실패한 단계부터 재개)
+    checkpoint_enabled: bool = Field(default=True, env="CHECKPOINT_ENABLED")
+    checkpoint_ttl_hours: int = Field(default=6, env="CHECKPOINT_TTL_HOURS")
+    checkpoint_max_html_kb: int = Field(default=256, env="CHECKPOINT_MAX_HTML_KB")  # 이보다 큰 HTML은 저장하지 않음 (0이면 HTML 저장 안 함)
+    task_done_ttl_hours: int = Field(default=24, env="TASK_DONE_TTL_HOURS")  # 중복 전달 메시지 무시 기간
+    
     # Embeddings
+    embedding_backend: str = Field(default="openai", env="EMBEDDING_BACKEND")  # openai | local (바꾸면 컬렉션 재구축 필요)
     embedding_model: str = Field(default="text-embedding-3-small", env="EMBEDDING_MODEL")
+    embedding_dimension: int = Field(default=1536, env="EMBEDDING_DIMENSION")  # OpenAI 임베딩 차원
+    embedding_batch_size: int = Field(default=100, env="EMBEDDING_BATCH_SIZE")  # 요청당 최대 청크 수
+    
+    # Local Embeddings (EMBEDDING_BACKEND=local, CPU ONNX 모델; onnxruntime, tokenizers 설치 필요)
+    local_embedding_model_dir: str = Field(default="models/multilingual-e5-small", env="LOCAL_EMBEDDING_MODEL_DIR")  # model.onnx + tokenizer.json
+    local_embedding_query_prefix: str = Field(default="query: ", env="LOCAL_EMBEDDING_QUERY_PREFIX")  # E5 계열 모델 규칙
+    local_embedding_document_prefix: str = Field(default="passage: ", env="LOCAL_EMBEDDING_DOCUMENT_PREFIX")
+    local_embedding_max_length: int = Field(default=512, env="LOCAL_EMBEDDING_MAX_LENGTH")  # 토큰
+    local_embedding_threads: int = Field(default=0, env="LOCAL_EMBEDDING_THREADS")  # 0이면 onnxruntime 기본값
+    local_embedding_max_batch: int = Field(default=32, env="LOCAL_EMBEDDING_MAX_BATCH")
+    local_embedding_max_wait_ms: float = Field(default=2.0, env="LOCAL_EMBEDDING_MAX_WAIT_MS")  # 동시 요청을 모으는 최대 대기
     
     # LLM
     llm_model: str = Field(default="gpt-4-turbo-preview", env="LLM_MODEL")
     llm_temperature: float = Field(default=0.0, env="LLM_TEMPERATURE")
     
+    # OpenAI Rate Limits (Redis로 API/워커 전체가 공유, 계정 한도에 맞게 설정)
+    rate_limit_enabled: bool = Field(default=True, env="RATE_LIMIT_ENABLED")
+    openai_embedding_rpm: int = Field(default=3000, env="OPENAI_EMBEDDING_RPM")
+    openai_embedding_tpm: int = Field(default=1000000, env="OPENAI_EMBEDDING_TPM")
+    openai_llm_rpm: int = Field(default=500, env="OPENAI_LLM_RPM")  # 모델별로 따로 적용
+    openai_llm_tpm: int = Field(default=300000, env="OPENAI_LLM_TPM")
+    rate_limit_interactive_reserve: float = Field(default=0.2, env="RATE_LIMIT_INTERACTIVE_RESERVE")  # 수집 작업이 남겨둘 채팅용 비율
+    rate_limit_interactive_max_wait_seconds: float = Field(default=5.0, env="RATE_LIMIT_INTERACTIVE_MAX_WAIT_SECONDS")
+    rate_limit_bulk_max_wait_seconds: float = Field(default=300.0, env="RATE_LIMIT_BULK_MAX_WAIT_SECONDS")
+    rate_limit_max_retries: int = Field(default=5, env="RATE_LIMIT_MAX_RETRIES")  # 429 재시도 (태스크 전체 재실행 없이)
+    llm_expected_output_tokens: int = Field(default=500, env="LLM_EXPECTED_OUTPUT_TOKENS")  # TPM 예약용 답변 길이 추정치
+    
+    # LLM Routing (검색 신뢰도가 높고 짧은 질문은 빠른 모델로)
+    llm_fast_model: str = Field(default="gpt-3.5-turbo", env="LLM_FAST_MODEL")  # 비우면 라우팅 비활성화
+    llm_route_max_question_chars: int = Field(default=80, env="LLM_ROUTE_MAX_QUESTION_CHARS")
+    llm_route_min_top_score: float = Field(default=0.55, env="LLM_ROUTE_MIN_TOP_SCORE")  # 최상위 청크의 코사인 유사도 하한
+    llm_route_min_score_gap: float = Field(default=0.05, env="LLM_ROUTE_MIN_SCORE_GAP")  # 다른 페이지 최상위와의 점수 차 하한
+    
     # RAG
     top_k: int = Field(default=5, env="TOP_K")
+    hybrid_search_enabled: bool = Field(default=True, env="HYBRID_SEARCH_ENABLED")  # dense + BM25 sparse, RRF 결합
+    hybrid_prefetch_limit: int = Field(default=20, env="HYBRID_PREFETCH_LIMIT")  # 결합 전 검색 방식별 후보 수
+    context_candidates: int = Field(default=10, env="CONTEXT_CANDIDATES")  # MMR 후보 수 (이 중 top_k개 선택)
+    context_max_tokens: int = Field(default=0, env="CONTEXT_MAX_TOKENS")  # 프롬프트 컨텍스트 토큰 예산 (0이면 CHUNK_SIZE * TOP_K)
+    context_mmr_lambda: float = Field(default=0.7, env="CONTEXT_MMR_LAMBDA")  # 1.0이면 관련도만, 낮을수록 다양성 우선
+    context_duplicate_threshold: float = Field(default=0.95, env="CONTEXT_DUPLICATE_THRESHOLD")  # 이 유사도 이상은 중복으로 제외
+    
+    # Chat Admission Control (API 프로세스당)
+    chat_max_concurrency: int = Field(default=8, env="CHAT_MAX_CONCURRENCY")  # 동시 답변 생성 수
+    chat_max_queue: int = Field(default=32, env="CHAT_MAX_QUEUE")  # 대기열 길이
+    chat_max_queue_wait_seconds: float = Field(default=10.0, env="CHAT_MAX_QUEUE_WAIT_SECONDS")  # 예상/실제 대기 상한
+    chat_degraded_enabled: bool = Field(default=True, env="CHAT_DEGRADED_ENABLED")  # 과부하 시 출처만 반환
+    chat_max_degraded_concurrency: int = Field(default=16, env="CHAT_MAX_DEGRADED_CONCURRENCY")
     
     # Auto Crawling Configuration
     auto_crawl_enabled: bool = Field(default=True, env="AUTO_CRAWL_ENABLED")
     crawl_schedule: str = Field(default="0 2 * * *", env="CRAWL_SCHEDULE")  # 매일 새벽 2시
     max_crawl_depth: int = Field(default=2, env="MAX_CRAWL_DEPTH")
     
+    # Scheduling Leases (Redis; one scheduler and one crawl per site across processes)
+    scheduler_lease_seconds: int = Field(default=60, env="SCHEDULER_LEASE_SECONDS")  # 스케줄러 리더가 사라지면 이 시간 뒤 다른 프로세스가 인계
+    crawl_site_lease_seconds: int = Field(default=300, env="CRAWL_SITE_LEASE_SECONDS")  # 크롤링 중 자동 갱신, 워커가 죽으면 만료
+    
+    # Chunk Text Store (chunk text outside the Qdrant payload)
+    chunk_text_store: str = Field(default="", env="CHUNK_TEXT_STORE")  # 비우면 payload에 저장 | redis | disk
+    chunk_text_store_dir: str = Field(default="/data/chunk_texts", env="CHUNK_TEXT_STORE_DIR")  # disk: API와 워커가 공유하는 쓰기 가능한 볼륨
+    chunk_text_compression_level: int = Field(default=3, env="CHUNK_TEXT_COMPRESSION_LEVEL")  # zstd 레벨
+    chunk_text_gc_grace_hours: int = Field(default=24, env="CHUNK_TEXT_GC_GRACE_HOURS")  # 참조가 없어도 이 시간 동안은 삭제하지 않음
+    
+    # Stale Page Sweep (pages no crawl reaches anymore)
+    sweep_enabled: bool = Field(default=False, env="SWEEP_ENABLED")  # false면 자동 크롤링 후 dry-run 리포트만 생성
+    sweep_keep_generations: int = Field(default=3, env="SWEEP_KEEP_GENERATIONS")  # 연속 N회 크롤링에서 발견되지 않으면 삭제
+    sweep_min_visited_ratio: float = Field(default=0.5, env="SWEEP_MIN_VISITED_RATIO")  # 이전 크롤링 대비 방문 페이지가 이 비율 미만이면 세대 미확정
+    sweep_max_stale_ratio: float = Field(default=0.3, env="SWEEP_MAX_STALE_RATIO")  # 사이트 페이지 중 이 비율 초과가 삭제 대상이면 중단
+    
+    # Page Loading (per-site overrides via "wait" in crawl_sites.json)
+    crawl_wait_until: str = Field(default="domcontentloaded", env="CRAWL_WAIT_UNTIL")  # domcontentloaded | load | networkidle
+    crawl_page_timeout_ms: int = Field(default=20000, env="CRAWL_PAGE_TIMEOUT_MS")
+    crawl_networkidle_cap_ms: int = Field(default=3000, env="CRAWL_NETWORKIDLE_CAP_MS")
+    crawl_blocked_resource_types: str = Field(
+        default="image,media,font,stylesheet,texttrack,eventsource,websocket,manifest,other",
+        env="CRAWL_BLOCKED_RESOURCE_TYPES"
+    )
+    crawl_block_third_party: bool = Field(default=True, env="CRAWL_BLOCK_THIRD_PARTY")
+    
+    # Crawl Progress Tracking
+    crawl_progress_ttl_hours: int = Field(default=72, env="CRAWL_PROGRESS_TTL_HOURS")
+    
+    # Browser Pool (per worker process)
+    browser_max_pages: int = Field(default=300, env="BROWSER_MAX_PAGES")  # 브라우저 재시작 전 최대 페이지 수
+    browser_page_max_uses: int = Field(default=50, env="BROWSER_PAGE_MAX_USES")  # 탭 재사용 횟수
+    browser_max_rss_mb: int = Field(default=700, env="BROWSER_MAX_RSS_MB")  # 컨테이너 1G 제한 이하로 유지
+    browser_max_idle_pages: int = Field(default=2, env="BROWSER_MAX_IDLE_PAGES")
+    
+    # Adaptive Recrawl Configuration
+    adaptive_recrawl_enabled: bool = Field(default=True, env="ADAPTIVE_RECRAWL_ENABLED")
+    recrawl_check_interval_minutes: int = Field(default=15, env="RECRAWL_CHECK_INTERVAL_MINUTES")
+    recrawl_batch_size: int = Field(default=200, env="RECRAWL_BATCH_SIZE")
+    recrawl_initial_interval_hours: float = Field(default=24, env="RECRAWL_INITIAL_INTERVAL_HOURS")
+    recrawl_min_interval_hours: float = Field(default=2, env="RECRAWL_MIN_INTERVAL_HOURS")  # 자주 바뀌는 페이지 하한
+    recrawl_max_interval_hours: float = Field(default=24 * 30, env="RECRAWL_MAX_INTERVAL_HOURS")  # 안 바뀌는 페이지 상한
+    recrawl_backoff_factor: float = Field(default=2.0, env="RECRAWL_BACKOFF_FACTOR")
+    recrawl_speedup_factor: float = Field(default=0.5, env="RECRAWL_SPEEDUP_FACTOR")
+    recrawl_claim_lease_minutes: int = Field(default=60, env="RECRAWL_CLAIM_LEASE_MINUTES")
+    crawl_state_ttl_days: int = Field(default=45, env="CRAWL_STATE_TTL_DAYS")  # 재방문 일정/근접 중복 색인/세대 기록 TTL, 쓸 때마다 갱신 (RECRAWL_MAX_INTERVAL_HOURS보다 길게)
+    
+    # Metrics (Prometheus)
+    metrics_enabled: bool = Field(default=True, env="METRICS_ENABLED")
+    worker_metrics_port: int = Field(default=9100, env="WORKER_METRICS_PORT")
+    
+    # API Startup
+    rag_warmup_enabled: bool = Field(default=True, env="RAG_WARMUP_ENABLED")  # 시작 직후 백그라운드에서 RAG 서비스 로드
+    
     # CORS Configuration
     cors_origins: str = Field(default="http://localhost:3000", env="CORS_ORIGINS")
     
@@ -87,6 +255,11 @@ class Settings(BaseSettings):
         """Parse CORS origins from comma-separated string"""
         return [origin.strip() for origin in self.cors_origins.split(",")]
     
+    @property
+    def crawl_blocked_resource_types_set(self) -> Set[str]:
+        """Parse blocked Playwright resource types from comma-separated string"""
+        return {t.strip() for t in self.crawl_blocked_resource_types.split(",") if t.strip()}
+    
     @property
     def crawl_urls(self) -> List[str]:
         """Load crawl URLs from configuration file"""
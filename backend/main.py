@@ -1,9 +1,13 @@
+import asyncio
 import structlog
 from api import create_app
+from api.routes.chat import get_rag_service
+from celery_app import celery_app
 from config import settings
+from services.locks import RedisLease
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
-from tasks.crawler import auto_crawl_websites
+from apscheduler.triggers.interval import IntervalTrigger
 
 # Configure structured logging
 logger = structlog.get_logger()
@@ -14,6 +18,38 @@ app = create_app()
 # Scheduler instance
 scheduler = None
 
+# Every API process runs the scheduler, but only the holder of this lease
+# sends scheduled tasks. The holder renews it; if it dies, another process
+# takes over within SCHEDULER_LEASE_SECONDS. While Redis is unavailable no
+# process can take over, so each keeps its last known role: the leader
+# keeps sending and the others keep waiting.
+scheduler_lease = RedisLease("scheduler:leader", settings.scheduler_lease_seconds)
+is_scheduler_leader = False
+
+
+def renew_scheduler_lease() -> bool:
+    """Take or keep scheduler leadership (runs every third of the lease); True if this process leads"""
+    global is_scheduler_leader
+    
+    try:
+        leader = scheduler_lease.try_acquire()
+    except Exception as e:
+        logger.warning(f"Could not renew scheduler lease, keeping current role: {e}", leader=is_scheduler_leader)
+        return is_scheduler_leader
+    
+    if leader != is_scheduler_leader:
+        logger.info("Scheduler leadership changed", leader=leader)
+    is_scheduler_leader = leader
+    return leader
+
+
+def send_if_leader(task_name: str):
+    """Send a scheduled task from the leader process only"""
+    if not renew_scheduler_lease():
+        logger.debug("Not the scheduler leader, skipping scheduled task", task=task_name)
+        return
+    celery_app.send_task(task_name)
+
 
 # Scheduler setup
 def setup_scheduler():
@@ -34,13 +70,41 @@ def setup_scheduler():
         )
         
         scheduler.add_job(
-            func=lambda: auto_crawl_websites.delay(),
+            func=renew_scheduler_lease,
+            trigger=IntervalTrigger(seconds=max(1, settings.scheduler_lease_seconds // 3)),
+            id='scheduler_lease_job',
+            name='Renew Scheduler Lease',
+            replace_existing=True
+        )
+        
+        scheduler.add_job(
+            func=lambda: send_if_leader("auto_crawl_websites"),
             trigger=trigger,
             id='auto_crawl_job',
             name='Auto Crawl Websites',
             replace_existing=True
         )
         
+        # Add adaptive recrawl job (revisits URLs based on their change rate)
+        if settings.adaptive_recrawl_enabled:
+            scheduler.add_job(
+                func=lambda: send_if_leader("recrawl_due_urls"),
+                trigger=IntervalTrigger(minutes=settings.recrawl_check_interval_minutes),
+                id='recrawl_due_urls_job',
+                name='Recrawl Due URLs',
+                replace_existing=True
+            )
+        
+        # Re-check bulk embedding jobs whose poll chain was lost (worker restarts, exhausted retries)
+        if settings.bulk_embedding_enabled:
+            scheduler.add_job(
+                func=lambda: send_if_leader("resume_bulk_embedding_jobs"),
+                trigger=IntervalTrigger(minutes=settings.bulk_embedding_resume_minutes),
+                id='resume_bulk_embedding_jobs_job',
+                name='Resume Bulk Embedding Jobs',
+                replace_existing=True
+            )
+        
         return scheduler
     return None
 
@@ -53,10 +117,19 @@ async def startup_event():
     # Setup scheduler
     scheduler = setup_scheduler()
     if scheduler:
+        renew_scheduler_lease()
         scheduler.start()
         logger.info(f"Auto-crawl scheduler started: {settings.crawl_schedule}")
     
-    logger.info("RAG service initialized")
+    # A misconfigured chunk text store fails here instead of on the first chat
+    from services.chunk_store import get_chunk_store
+    get_chunk_store()
+
+    # Build the RAG service in the background: the API answers health checks
+    # right away and the first chat does not pay for loading it
+    if settings.rag_warmup_enabled:
+        asyncio.get_running_loop().run_in_executor(None, get_rag_service)
+        logger.info("RAG service warming up")
 
 
 @app.on_event("shutdown") 
@@ -64,6 +137,8 @@ async def shutdown_event():
     """Cleanup on shutdown"""
     if scheduler:
         scheduler.shutdown()
+        # Hand leadership over now instead of after the lease expires
+        scheduler_lease.release()
     logger.info("RAG Chatbot API shutdown complete")
 
 
@@ -0,0 +1,141 @@
+"""
+Admission control for the chat endpoint.
+
+At most `max_concurrent` answers are generated at once per API process.
+Further requests wait in a short FIFO queue. A request is turned away up
+front when the queue is full or its expected wait (queue position times the
+recent average service time) exceeds `max_queue_wait`. It is also turned
+away if it waits longer than that. Rejected requests can still receive a
+degraded answer (retrieved sources only) through a separate, cheaper slot
+pool.
+"""
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque
+import asyncio
+import math
+import time
+import structlog
+
+from config import settings
+from services.metrics import record_admission
+
+logger = structlog.get_logger()
+
+# EWMA weight of the newest service time
+SERVICE_TIME_ALPHA = 0.2
+
+
+class AdmissionRejected(Exception):
+    """No capacity for this request; retry after `retry_after` seconds"""
+
+    def __init__(self, retry_after: float, reason: str):
+        super().__init__(reason)
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.reason = reason
+
+
+class AdmissionController:
+    """Bounded concurrency with a short, deadline-aware wait queue"""
+
+    def __init__(self, max_concurrent: int, max_queue: int, max_queue_wait: float,
+                 max_degraded: int, initial_service_time: float = 2.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_queue_wait = max_queue_wait
+        self.max_degraded = max_degraded
+        self._running = 0
+        self._degraded_running = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._service_time = initial_service_time
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for w in self._waiters if not w.done())
+
+    def estimated_wait(self, position: int) -> float:
+        """Expected seconds until the `position`-th queued request gets a slot"""
+        return math.ceil(position / self.max_concurrent) * self._service_time
+
+    async def acquire(self):
+        """Take a slot, waiting in the queue if needed; raises AdmissionRejected"""
+        if self._running < self.max_concurrent and not self.queued:
+            self._running += 1
+            record_admission("admitted")
+            return
+
+        position = self.queued + 1
+        wait = self.estimated_wait(position)
+        if position > self.max_queue:
+            record_admission("rejected")
+            raise AdmissionRejected(wait, "queue_full")
+        if wait > self.max_queue_wait:
+            record_admission("rejected")
+            raise AdmissionRejected(wait, "queue_wait_too_long")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout=self.max_queue_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self.release()
+            else:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            record_admission("rejected")
+            raise AdmissionRejected(self.estimated_wait(self.queued + 1), "queue_timeout")
+
+        record_admission("queued")
+
+    def release(self, service_time: float = None):
+        """Free a slot, handing it straight to the oldest waiter if any"""
+        if service_time is not None:
+            self._service_time += SERVICE_TIME_ALPHA * (service_time - self._service_time)
+
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._running -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    @asynccontextmanager
+    async def degraded_slot(self):
+        """Slot for a retrieval-only answer; never queues"""
+        if self._degraded_running >= self.max_degraded:
+            record_admission("rejected")
+            raise AdmissionRejected(self.estimated_wait(self.queued + 1), "degraded_full")
+
+        self._degraded_running += 1
+        record_admission("degraded")
+        try:
+            yield
+        finally:
+            self._degraded_running -= 1
+
+
+chat_admission = AdmissionController(
+    max_concurrent=settings.chat_max_concurrency,
+    max_queue=settings.chat_max_queue,
+    max_queue_wait=settings.chat_max_queue_wait_seconds,
+    max_degraded=settings.chat_max_degraded_concurrency
+)
@@ -0,0 +1,137 @@
+from typing import List, Set
+from urllib.parse import urlparse
+import hashlib
+import time
+import structlog
+
+from config import settings
+from services.redis_client import get_redis_client
+
+logger = structlog.get_logger()
+
+# Redis keys per site (host) and window (BOILERPLATE_WINDOW_DAYS long, numbered from the epoch)
+# - boilerplate:{site}:{window}:pages    number of distinct page versions observed
+# - boilerplate:{site}:{window}:urls     set of observed "{url}#{text hash}" (each version counted once)
+# - boilerplate:{site}:{window}:blocks   hash, block hash -> number of page versions containing it
+# The model is read from the current and the previous window, so it follows
+# template changes and a page whose content changed is counted again; the keys
+# expire once no read uses them.
+KEY_PREFIX = "boilerplate:"
+
+
+def _window(offset: int = 0) -> int:
+    return int(time.time() // (settings.boilerplate_window_days * 86400)) - offset
+
+
+def _site_key(site: str, window: int, suffix: str) -> str:
+    return f"{KEY_PREFIX}{site}:{window}:{suffix}"
+
+
+def _block_hash(block: str) -> str:
+    return hashlib.md5(block.encode('utf-8')).hexdigest()[:16]
+
+
+def _split_blocks(text: str) -> List[str]:
+    """Text blocks are the cleaned lines produced by the extractor"""
+    return [line for line in text.split('\n') if line.strip()]
+
+
+def observe_page(url: str, text: str):
+    """Add a page's blocks to the site-wide block frequency model (once per URL and content)"""
+    site = urlparse(url).netloc
+    window = _window()
+    version = f"{url}#{hashlib.md5(text.encode('utf-8')).hexdigest()}"
+    keys = [_site_key(site, window, suffix) for suffix in ("urls", "pages", "blocks")]
+
+    try:
+        client = get_redis_client()
+        if not client.sadd(keys[0], version):
+            return
+
+        block_hashes = {_block_hash(block) for block in _split_blocks(text)}
+        pipe = client.pipeline()
+        pipe.incr(keys[1])
+        for block_hash in block_hashes:
+            pipe.hincrby(keys[2], block_hash, 1)
+        # Read while this and the next window are current
+        for key in keys:
+            pipe.expire(key, 2 * settings.boilerplate_window_days * 86400)
+        pipe.execute()
+
+    except Exception as e:
+        logger.warning(f"Could not update boilerplate model: {e}", url=url)
+
+
+def model_warm(url: str) -> bool:
+    """Whether the model of the page's site has seen enough pages (BOILERPLATE_MIN_PAGES) to strip anything"""
+    site = urlparse(url).netloc
+    try:
+        counts = get_redis_client().mget([_site_key(site, window, "pages") for window in (_window(), _window(1))])
+    except Exception as e:
+        logger.warning(f"Could not read boilerplate model: {e}", site=site)
+        return False
+    return sum(int(count or 0) for count in counts) >= settings.boilerplate_min_pages
+
+
+def get_boilerplate_hashes(site: str, block_hashes: List[str]) -> Set[str]:
+    """Return the block hashes that appear on a large share of the site's pages"""
+    if not block_hashes:
+        return set()
+
+    windows = [_window(), _window(1)]
+    try:
+        pipe = get_redis_client().pipeline()
+        for window in windows:
+            pipe.get(_site_key(site, window, "pages"))
+            pipe.hmget(_site_key(site, window, "blocks"), block_hashes)
+        results = pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not read boilerplate model: {e}", site=site)
+        return set()
+
+    # A page observed in both windows counts twice on both sides of the ratio
+    pages = sum(int(results[i] or 0) for i in range(0, len(results), 2))
+    if pages < settings.boilerplate_min_pages:
+        return set()
+
+    counts = [
+        sum(int(window_counts[i] or 0) for window_counts in results[1::2])
+        for i in range(len(block_hashes))
+    ]
+    threshold = settings.boilerplate_min_ratio * pages
+    return {
+        block_hash for block_hash, count in zip(block_hashes, counts)
+        if count and count >= threshold
+    }
+
+
+def strip_boilerplate(url: str, text: str) -> str:
+    """Remove blocks that the site model marks as boilerplate (menus, contact blocks, footers)"""
+    blocks = _split_blocks(text)
+    hashes = [_block_hash(block) for block in blocks]
+    boilerplate = get_boilerplate_hashes(urlparse(url).netloc, list(set(hashes)))
+
+    if not boilerplate:
+        return text
+
+    kept = [block for block, block_hash in zip(blocks, hashes) if block_hash not in boilerplate]
+    logger.info(
+        "Stripped boilerplate blocks",
+        url=url,
+        removed=len(blocks) - len(kept),
+        kept=len(kept)
+    )
+    return '\n'.join(kept)
+
+
+def dedupe_chunks(chunks: List[str]) -> List[str]:
+    """Drop chunks whose (whitespace-normalized) text already occurred in the page"""
+    seen = set()
+    unique = []
+    for chunk in chunks:
+        key = hashlib.md5(' '.join(chunk.split()).encode('utf-8')).digest()
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(chunk)
+    return unique
@@ -0,0 +1,153 @@
+"""
+Stage checkpoints for embedding tasks.
+
+A retried task (same Celery task id) resumes after the last stage that
+completed instead of starting over:
+
+- ckpt:task:{task_id}: hash with the fetched HTML and the extracted text.
+  Only the latest of the two is kept. HTML larger than
+  CHECKPOINT_MAX_HTML_KB is not kept: a retry fetches the page again.
+- ckpt:chunks:{url_key}:{content_hash}: chunks of that page content, plus
+  their embeddings once computed. Keyed by content, so any task that sees
+  the same page content can reuse them.
+- ckpt:done:{task_id}: result of a finished task. A redelivered message
+  returns it without doing any work.
+
+Every helper fails soft: without Redis, tasks simply run every stage.
+Checkpoints are a cache. All their keys expire (CHECKPOINT_TTL_HOURS), so
+under the volatile-* eviction policy Redis needs for the write journals
+and chunk texts they are the keys evicted first. With noeviction, a full
+Redis refuses them and tasks run without checkpoints.
+"""
+from typing import List, Optional, Tuple
+import hashlib
+import json
+import structlog
+
+from config import settings
+from services.redis_client import get_redis_client
+from services.vector_store import decode_vector, encode_vector
+
+logger = structlog.get_logger()
+
+TASK_PREFIX = "ckpt:task:"
+CHUNKS_PREFIX = "ckpt:chunks:"
+DONE_PREFIX = "ckpt:done:"
+
+
+def _url_key(url: str) -> str:
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+def _chunks_key(url: str, content_hash: str) -> str:
+    return f"{CHUNKS_PREFIX}{_url_key(url)}:{content_hash}"
+
+
+def _ttl() -> int:
+    return settings.checkpoint_ttl_hours * 3600
+
+
+def get_done(task_id: Optional[str]) -> Optional[dict]:
+    """Result of a message that already finished, if any"""
+    if not (settings.checkpoint_enabled and task_id):
+        return None
+    try:
+        data = get_redis_client().get(f"{DONE_PREFIX}{task_id}")
+        return json.loads(data) if data else None
+    except Exception as e:
+        logger.warning(f"Could not read task result checkpoint: {e}", task_id=task_id)
+        return None
+
+
+def mark_done(task_id: Optional[str], result: dict, url: Optional[str] = None,
+              content_hash: Optional[str] = None):
+    """Record the result and drop the stage checkpoints it no longer needs"""
+    if not (settings.checkpoint_enabled and task_id):
+        return
+    try:
+        pipe = get_redis_client().pipeline(transaction=False)
+        pipe.set(f"{DONE_PREFIX}{task_id}", json.dumps(result), ex=settings.task_done_ttl_hours * 3600)
+        pipe.delete(f"{TASK_PREFIX}{task_id}")
+        if url and content_hash:
+            pipe.delete(_chunks_key(url, content_hash))
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not write task result checkpoint: {e}", task_id=task_id)
+
+
+def clear(stage_ids: List[str], pages: List[Tuple[str, str]]):
+    """Drop stage checkpoints and (url, content_hash) chunk checkpoints"""
+    keys = [f"{TASK_PREFIX}{stage_id}" for stage_id in stage_ids if stage_id]
+    keys += [_chunks_key(url, content_hash) for url, content_hash in pages]
+    if not (settings.checkpoint_enabled and keys):
+        return
+    try:
+        get_redis_client().delete(*keys)
+    except Exception as e:
+        logger.warning(f"Could not clear checkpoints: {e}")
+
+
+def load_stage(task_id: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """(html, text) saved by an earlier attempt of this task"""
+    if not (settings.checkpoint_enabled and task_id):
+        return None, None
+    try:
+        html, text = get_redis_client().hmget(f"{TASK_PREFIX}{task_id}", ["html", "text"])
+        return html, text
+    except Exception as e:
+        logger.warning(f"Could not read stage checkpoint: {e}", task_id=task_id)
+        return None, None
+
+
+def save_html(task_id: Optional[str], html: str):
+    # Refetching costs less than holding a large page in Redis for hours
+    if len(html) > settings.checkpoint_max_html_kb * 1024:
+        return
+    _save_stage(task_id, {"html": html})
+
+
+def save_text(task_id: Optional[str], text: str):
+    _save_stage(task_id, {"text": text}, drop=["html"])
+
+
+def _save_stage(task_id: Optional[str], fields: dict, drop: Optional[List[str]] = None):
+    if not (settings.checkpoint_enabled and task_id):
+        return
+    try:
+        key = f"{TASK_PREFIX}{task_id}"
+        pipe = get_redis_client().pipeline(transaction=False)
+        pipe.hset(key, mapping=fields)
+        if drop:
+            pipe.hdel(key, *drop)
+        pipe.expire(key, _ttl())
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not write stage checkpoint: {e}", task_id=task_id)
+
+
+def load_chunks(url: str, content_hash: str) -> Tuple[Optional[List[str]], Optional[List[List[float]]]]:
+    """(chunks, vectors) saved for this content; vectors is None until embedded"""
+    if not settings.checkpoint_enabled:
+        return None, None
+    try:
+        data = get_redis_client().get(_chunks_key(url, content_hash))
+        if not data:
+            return None, None
+        saved = json.loads(data)
+        vectors = saved.get("vectors")
+        return saved["chunks"], [decode_vector(v) for v in vectors] if vectors else None
+    except Exception as e:
+        logger.warning(f"Could not read chunk checkpoint: {e}", url=url)
+        return None, None
+
+
+def save_chunks(url: str, content_hash: str, chunks: List[str], vectors: Optional[List[List[float]]] = None):
+    if not settings.checkpoint_enabled:
+        return
+    try:
+        saved = {"chunks": chunks}
+        if vectors is not None:
+            saved["vectors"] = [encode_vector(v) for v in vectors]
+        get_redis_client().set(_chunks_key(url, content_hash), json.dumps(saved, ensure_ascii=False), ex=_ttl())
+    except Exception as e:
+        logger.warning(f"Could not write chunk checkpoint: {e}", url=url)
@@ -0,0 +1,274 @@
+"""
+External store for chunk texts, selected by CHUNK_TEXT_STORE.
+
+By default each point carries its chunk text in the Qdrant payload. With
+"redis" or "disk", the text is zstd-compressed and stored under a hash of
+its content. The payload then keeps only text_hash. Identical chunks of
+different pages share one entry. Qdrant holds less payload in memory, and
+searches and scrolls transfer less. RAGService reads the texts of the hits
+it keeps in one bulk request.
+
+- redis: chunk:text:{hash}; shared by every process using this Redis. The
+  entries have no TTL, so the store is refused when Redis may evict them
+  (maxmemory-policy allkeys-*): an evicted text drops its chunks from search
+- disk: CHUNK_TEXT_STORE_DIR/{hash[:2]}/{hash}.zst; the directory must be
+  shared by the API and the workers (e.g. one volume)
+
+Entries are never overwritten; unreferenced ones are removed by the sweep
+(tasks.sweep) once they are older than CHUNK_TEXT_GC_GRACE_HOURS. The sweep
+only deletes an entry that is still older than its cutoff at that moment,
+so a text written again while the sweep ran is kept. Points
+written with an external store need it to stay configured; turning it off
+requires re-ingesting.
+"""
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+import hashlib
+import os
+import tempfile
+import time
+import structlog
+
+from config import settings
+from services.metrics import observe_stage
+from services.redis_client import get_binary_redis_client, keeps_persistent_keys
+
+logger = structlog.get_logger()
+
+# Redis keys: chunk:text:{hash} (compressed text), chunk:text:written (sorted set, hash -> last write time)
+KEY_PREFIX = "chunk:text:"
+WRITTEN_KEY = "chunk:text:written"
+
+
+# Delete the entries (ARGV[2:]) whose last write is still older than ARGV[1]; returns how many
+DELETE_OLDER_SCRIPT = """
+local removed = 0
+for i = 2, #ARGV do
+    local written = redis.call('ZSCORE', KEYS[1], ARGV[i])
+    if written and tonumber(written) < tonumber(ARGV[1]) then
+        redis.call('DEL', KEYS[2] .. ARGV[i])
+        redis.call('ZREM', KEYS[1], ARGV[i])
+        removed = removed + 1
+    end
+end
+return removed
+"""
+
+
+def text_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class ChunkTextStore(ABC):
+    """Compressed chunk texts addressed by text_hash"""
+    name = "base"
+
+    def __init__(self):
+        try:
+            import zstandard
+        except ImportError as e:
+            raise RuntimeError(f"CHUNK_TEXT_STORE={self.name} needs zstandard: pip install zstandard") from e
+        self._zstd = zstandard
+        self._level = settings.chunk_text_compression_level
+
+    def compress(self, text: str) -> bytes:
+        # Compressors are not thread-safe; creating one is cheap
+        return self._zstd.ZstdCompressor(level=self._level).compress(text.encode("utf-8"))
+
+    def decompress(self, data: bytes) -> str:
+        return self._zstd.ZstdDecompressor().decompress(data).decode("utf-8")
+
+    @abstractmethod
+    def put_many(self, texts: Dict[str, str]):
+        """Store texts by hash (entries that already exist are only marked as recently written)"""
+
+    @abstractmethod
+    def get_many(self, hashes: Iterable[str]) -> Dict[str, str]:
+        """Texts of the hashes that exist"""
+
+    @abstractmethod
+    def delete_many(self, hashes: List[str], written_before: float) -> int:
+        """Remove the entries whose last write is older than `written_before`; returns how many"""
+
+    @abstractmethod
+    def hashes_written_before(self, cutoff: float) -> Iterator[str]:
+        """Entries whose last write is older than `cutoff` (a timestamp)"""
+
+
+class RedisChunkTextStore(ChunkTextStore):
+    name = "redis"
+
+    def __init__(self):
+        super().__init__()
+        keeps = keeps_persistent_keys()
+        if keeps is False:
+            raise RuntimeError(
+                "CHUNK_TEXT_STORE=redis needs a Redis that does not evict keys without a TTL: "
+                "set maxmemory-policy to noeviction or volatile-*, or use CHUNK_TEXT_STORE=disk"
+            )
+        if keeps is None:
+            logger.warning("Could not verify that Redis keeps chunk texts under memory pressure (maxmemory-policy)")
+
+    def put_many(self, texts: Dict[str, str]):
+        if not texts:
+            return
+        now = time.time()
+        # One transaction: the sweep script never runs between the write and its timestamp
+        pipe = get_binary_redis_client().pipeline(transaction=True)
+        pipe.zadd(WRITTEN_KEY, {h: now for h in texts})
+        for h, text in texts.items():
+            pipe.set(f"{KEY_PREFIX}{h}", self.compress(text), nx=True)
+        pipe.execute()
+
+    def get_many(self, hashes: Iterable[str]) -> Dict[str, str]:
+        hashes = list(hashes)
+        if not hashes:
+            return {}
+        values = get_binary_redis_client().mget([f"{KEY_PREFIX}{h}" for h in hashes])
+        return {h: self.decompress(v) for h, v in zip(hashes, values) if v is not None}
+
+    def delete_many(self, hashes: List[str], written_before: float) -> int:
+        if not hashes:
+            return 0
+        client = get_binary_redis_client()
+        delete_older = client.register_script(DELETE_OLDER_SCRIPT)
+        return int(delete_older(keys=[WRITTEN_KEY, KEY_PREFIX], args=[written_before, *hashes], client=client))
+
+    def hashes_written_before(self, cutoff: float) -> Iterator[str]:
+        for h in get_binary_redis_client().zrangebyscore(WRITTEN_KEY, "-inf", cutoff):
+            yield h.decode("ascii")
+
+
+class DiskChunkTextStore(ChunkTextStore):
+    name = "disk"
+
+    def __init__(self, root: Optional[str] = None):
+        super().__init__()
+        self.root = Path(root or settings.chunk_text_store_dir)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, h: str) -> Path:
+        return self.root / h[:2] / f"{h}.zst"
+
+    def put_many(self, texts: Dict[str, str]):
+        for h, text in texts.items():
+            path = self._path(h)
+            try:
+                # Newer mtime keeps an entry that was just referenced again out of the sweep
+                os.utime(path)
+                continue
+            except FileNotFoundError:
+                path.parent.mkdir(exist_ok=True)
+            # Written under a temporary name and renamed, so readers never see a partial file
+            fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(self.compress(text))
+            os.replace(tmp, path)
+
+    def get_many(self, hashes: Iterable[str]) -> Dict[str, str]:
+        texts = {}
+        for h in hashes:
+            try:
+                texts[h] = self.decompress(self._path(h).read_bytes())
+            except FileNotFoundError:
+                continue
+        return texts
+
+    def delete_many(self, hashes: List[str], written_before: float) -> int:
+        removed = 0
+        for h in hashes:
+            path = self._path(h)
+            # Moved aside first: a put that touches the entry from now on finds
+            # it gone and writes it again; one that touched it just before is
+            # seen in the mtime, and the entry is put back
+            doomed = path.with_suffix(".deleting")
+            try:
+                if path.stat().st_mtime >= written_before:
+                    continue
+                os.replace(path, doomed)
+            except FileNotFoundError:
+                continue
+            if doomed.stat().st_mtime >= written_before:
+                # Same content as any entry a put wrote meanwhile
+                os.replace(doomed, path)
+                continue
+            doomed.unlink()
+            removed += 1
+        return removed
+
+    def hashes_written_before(self, cutoff: float) -> Iterator[str]:
+        for path in self.root.glob("*/*.zst"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    yield path.stem
+            except FileNotFoundError:
+                continue
+
+
+STORES = {
+    "redis": RedisChunkTextStore,
+    "disk": DiskChunkTextStore,
+}
+
+
+@lru_cache(maxsize=1)
+def get_chunk_store() -> Optional[ChunkTextStore]:
+    """The configured store, or None when texts stay in the payload"""
+    if not settings.chunk_text_store:
+        return None
+    try:
+        store_class = STORES[settings.chunk_text_store]
+    except KeyError:
+        raise ValueError(f"Unknown CHUNK_TEXT_STORE {settings.chunk_text_store!r}; use one of {sorted(STORES)} or leave it empty")
+    return store_class()
+
+
+def chunk_text_fields(chunks: List[str]) -> List[dict]:
+    """
+    Payload fields holding each chunk's text: the text itself, or its hash
+    once the text is stored (before the points that reference it are written)
+    """
+    store = get_chunk_store()
+    if store is None:
+        return [{"text": chunk} for chunk in chunks]
+
+    hashes = [text_hash(chunk) for chunk in chunks]
+    with observe_stage("chunk_text_store", items=len(chunks)):
+        store.put_many(dict(zip(hashes, chunks)))
+    return [{"text_hash": h} for h in hashes]
+
+
+def fill_texts(points) -> list:
+    """
+    Load the text of points that only carry text_hash, in one bulk read.
+    Points whose text cannot be found are dropped.
+    """
+    missing = {p.payload["text_hash"] for p in points if "text" not in p.payload and "text_hash" in p.payload}
+    if not missing:
+        return [p for p in points if "text" in p.payload]
+
+    texts = {}
+    store = get_chunk_store()
+    if store is None:
+        logger.warning("Points reference stored chunk texts but CHUNK_TEXT_STORE is not set", points=len(missing))
+    else:
+        try:
+            with observe_stage("chunk_text_fetch", items=len(missing)):
+                texts = store.get_many(missing)
+        except Exception as e:
+            logger.error(f"Could not read chunk texts: {e}", store=store.name)
+
+    filled = []
+    for point in points:
+        if "text" not in point.payload:
+            text = texts.get(point.payload.get("text_hash"))
+            if text is None:
+                continue
+            point.payload["text"] = text
+        filled.append(point)
+
+    if len(filled) < len(points):
+        logger.warning("Chunk texts missing from the store", missing=len(points) - len(filled))
+    return filled
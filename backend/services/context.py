@@ -0,0 +1,216 @@
+"""
+Prompt context assembly for RAG answers.
+
+Search hits are diversified with MMR (near-identical hits are dropped;
+relevance is the dense cosine, or the fused score of a hybrid search),
+neighbouring chunks of the same page are merged back into one passage with
+the splitter overlap removed, and passages are packed into a token budget in
+relevance order (CONTEXT_MAX_TOKENS, by default room for TOP_K full
+chunks). With an external chunk text store, only the texts of the hits MMR
+keeps are read.
+"""
+from dataclasses import dataclass, field
+from typing import List, Optional
+import numpy as np
+import structlog
+
+from config import settings
+from services.chunk_store import fill_texts
+from services.tokens import count_tokens, truncate_to_tokens
+
+logger = structlog.get_logger()
+
+
+@dataclass
+class Passage:
+    """One or more adjacent chunks of a page"""
+    url: str
+    first_index: int
+    last_index: int
+    text: str
+    rank: int  # best MMR rank among its chunks (0 = most relevant)
+    chunk_count: int = 1
+
+
+@dataclass
+class BuiltContext:
+    text: str
+    sources: List[str]
+    tokens: int
+    passages: List[Passage] = field(default_factory=list)
+    # Dense cosine similarity of the best candidate and its lead over the best
+    # hit from another page (None when hits carry no vectors); used for model routing
+    top_score: Optional[float] = None
+    score_gap: Optional[float] = None
+
+
+def _dense_vector(point) -> Optional[np.ndarray]:
+    vector = point.vector
+    if isinstance(vector, dict):
+        # Hybrid collections return named vectors; the dense one is unnamed
+        vector = vector.get("")
+    if not vector:
+        return None
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else None
+
+
+def _relevance(points, query_embedding: List[float]):
+    """(normalized hit vectors, cosine relevance to the query), or (None, None) without vectors"""
+    vectors = [_dense_vector(p) for p in points]
+    if not points or any(v is None for v in vectors):
+        return None, None
+
+    matrix = np.stack(vectors)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    # Not in place: asarray returns the caller's embedding itself when it is float32
+    query = query / (np.linalg.norm(query) or 1.0)
+    return matrix, matrix @ query
+
+
+def _fused_relevance(points) -> np.ndarray:
+    """Fusion scores scaled to the best hit (1.0), so they weigh against similarity like cosines"""
+    scores = np.asarray([point.score or 0.0 for point in points], dtype=np.float32)
+    best = scores.max()
+    return scores / best if best > 0 else scores
+
+
+def select_mmr(points, query_embedding: List[float], k: int,
+               mmr_lambda: float, duplicate_threshold: float, fused: bool = False) -> list:
+    """
+    Maximal marginal relevance: repeatedly take the hit with the best
+    lambda * relevance - (1 - lambda) * similarity to what is already
+    selected. Hits at least `duplicate_threshold` similar to a selected one
+    are dropped outright. Hits without vectors keep their search order.
+    With `fused` (hybrid search) relevance is the fusion score, so hits
+    found by the sparse retriever keep their rank.
+    """
+    matrix, relevance = _relevance(points, query_embedding)
+    if matrix is None:
+        return list(points)[:k]
+    if fused:
+        relevance = _fused_relevance(points)
+
+    similarity = matrix @ matrix.T
+
+    selected = []
+    remaining = list(range(len(points)))
+    seen_texts = set()
+    while remaining and len(selected) < k:
+        if selected:
+            redundancy = similarity[np.ix_(remaining, selected)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining))
+        scores = mmr_lambda * relevance[remaining] - (1 - mmr_lambda) * redundancy
+        best = remaining.pop(int(np.argmax(scores)))
+
+        # Same hash, same text: stored texts are compared without reading them
+        payload = points[best].payload
+        text = payload.get("text_hash") or payload.get("text", "")
+        if text in seen_texts or (selected and similarity[best, selected].max() >= duplicate_threshold):
+            continue
+        seen_texts.add(text)
+        selected.append(best)
+
+    return [points[i] for i in selected]
+
+
+def merge_overlap(left: str, right: str, max_overlap: int) -> str:
+    """Join two consecutive chunks, removing the text the splitter repeated"""
+    limit = min(max_overlap, len(left), len(right))
+    for size in range(limit, 0, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return f"{left}\n{right}"
+
+
+def merge_adjacent(points) -> List[Passage]:
+    """Group hits by URL and merge runs of consecutive chunk_index values"""
+    by_url = {}
+    for rank, point in enumerate(points):
+        payload = point.payload
+        by_url.setdefault(payload["url"], []).append((payload.get("chunk_index", 0), rank, payload["text"]))
+
+    # The splitter repeats up to chunk_overlap characters; allow some slack for whitespace trimming
+    max_overlap = settings.chunk_overlap * 2
+    passages = []
+    for url, chunks in by_url.items():
+        chunks.sort()
+        current = None
+        for index, rank, text in chunks:
+            if current and index == current.last_index + 1:
+                current.text = merge_overlap(current.text, text, max_overlap)
+                current.last_index = index
+                current.rank = min(current.rank, rank)
+                current.chunk_count += 1
+            elif current and index == current.last_index:
+                continue
+            else:
+                current = Passage(url=url, first_index=index, last_index=index, text=text, rank=rank)
+                passages.append(current)
+
+    passages.sort(key=lambda p: p.rank)
+    return passages
+
+
+def context_token_budget() -> int:
+    """CONTEXT_MAX_TOKENS, or room for TOP_K full chunks (Korean text is about a token per character)"""
+    return settings.context_max_tokens or settings.chunk_size * settings.top_k
+
+
+def build_context(points, query_embedding: List[float], max_tokens: Optional[int] = None,
+                  fused: bool = False) -> BuiltContext:
+    """Select, merge and pack search hits into at most `max_tokens` prompt tokens"""
+    max_tokens = max_tokens or context_token_budget()
+    selected = fill_texts(select_mmr(
+        points,
+        query_embedding,
+        k=settings.top_k,
+        mmr_lambda=settings.context_mmr_lambda,
+        duplicate_threshold=settings.context_duplicate_threshold,
+        fused=fused
+    ))
+
+    separator_tokens = count_tokens("\n\n")
+    included = []
+    used = 0
+    for passage in merge_adjacent(selected):
+        tokens = count_tokens(passage.text)
+        cost = tokens + (separator_tokens if included else 0)
+        if used + cost <= max_tokens:
+            included.append(passage)
+            used += cost
+        elif not included:
+            # Never send an empty context when the best passage alone is too long
+            passage.text = truncate_to_tokens(passage.text, max_tokens)
+            included.append(passage)
+            used = count_tokens(passage.text)
+            break
+
+    sources = []
+    for passage in included:
+        if passage.url not in sources:
+            sources.append(passage.url)
+
+    top_score = score_gap = None
+    _, relevance = _relevance(points, query_embedding)
+    if relevance is not None:
+        best = int(np.argmax(relevance))
+        top_score = float(relevance[best])
+        # Runner-up from another page: neighbouring chunks of the best page are not competition
+        others = [
+            float(score) for point, score in zip(points, relevance)
+            if point.payload.get("url") != points[best].payload.get("url")
+        ]
+        score_gap = top_score - max(others) if others else top_score
+
+    return BuiltContext(
+        text="\n\n".join(p.text for p in included),
+        sources=sources,
+        tokens=used,
+        passages=included,
+        top_score=top_score,
+        score_gap=score_gap
+    )
+
@@ -0,0 +1,244 @@
+"""
+Embedding backends, selected by EMBEDDING_BACKEND.
+
+- openai: the embeddings API through the shared rate limiter (default)
+- local: a sentence-embedding model exported to ONNX (e.g. a quantized
+  multilingual-e5-small), run on CPU in this process. The model is loaded
+  once per process. Concurrent query embeddings are grouped by a dynamic
+  batcher into one inference call.
+
+Vectors of different backends (and models) are not comparable. Switching
+the backend needs a collection built with it (see QDRANT_COLLECTION_NAME).
+"""
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, List, Optional
+import asyncio
+import os
+import queue
+import threading
+import time
+import numpy as np
+import openai
+import structlog
+
+from config import settings
+from services.metrics import record_retry
+from services.rate_limit import BULK, INTERACTIVE, get_rate_limiter, retry_after_seconds
+from services.tokens import count_tokens
+
+logger = structlog.get_logger()
+
+# Retries of a query embedding; chat cannot wait as long as ingestion
+QUERY_MAX_RETRIES = 2
+
+
+class EmbeddingBackend(ABC):
+    """Turns texts into vectors of `dimension` floats"""
+    name = "base"
+    dimension: int
+
+    @abstractmethod
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Vectors for chunks being ingested, in order"""
+
+    @abstractmethod
+    def embed_query(self, text: str) -> List[float]:
+        """Vector for a chat question"""
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await asyncio.to_thread(self.embed_query, text)
+
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    name = "openai"
+
+    def __init__(self):
+        self.model = settings.embedding_model
+        self.dimension = settings.embedding_dimension
+        self.client = openai.OpenAI(
+            api_key=settings.openai_api_key,
+            base_url=settings.openai_base_url or None,
+            max_retries=0  # 429s are retried through the shared rate limiter
+        )
+
+    def create(self, batch: List[str], priority: str = BULK, max_retries: Optional[int] = None):
+        """
+        One embeddings request through the shared rate limiter. A 429 pauses the
+        limiter for all processes and retries just this request; connection and
+        server errors are retried with backoff.
+        """
+        max_retries = settings.rate_limit_max_retries if max_retries is None else max_retries
+        limiter = get_rate_limiter(self.model)
+        tokens = sum(count_tokens(text) for text in batch)
+
+        for attempt in range(max_retries + 1):
+            limiter.acquire(tokens, priority=priority)
+            try:
+                return self.client.embeddings.create(model=self.model, input=batch)
+            except openai.RateLimitError as e:
+                if attempt == max_retries:
+                    raise
+                record_retry("embeddings.create")
+                limiter.penalize(retry_after_seconds(e, attempt))
+            except (openai.APIConnectionError, openai.InternalServerError):
+                if attempt == max_retries:
+                    raise
+                record_retry("embeddings.create")
+                time.sleep(min(2 ** attempt, 30))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), settings.embedding_batch_size):
+            response = self.create(texts[start:start + settings.embedding_batch_size])
+            vectors.extend(item.embedding for item in sorted(response.data, key=lambda d: d.index))
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        response = self.create([text], priority=INTERACTIVE, max_retries=QUERY_MAX_RETRIES)
+        return response.data[0].embedding
+
+
+class DynamicBatcher:
+    """
+    Runs `fn` over inputs submitted from many threads or coroutines. A
+    background thread takes the first waiting input and collects more for up
+    to `max_wait` seconds (or `max_batch` inputs), then makes one call for all.
+    Under load, inputs that arrive during a call form the next batch.
+    """
+
+    def __init__(self, fn: Callable[[List[str]], List[List[float]]], max_batch: int, max_wait: float):
+        self.fn = fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self._queue: "queue.Queue" = queue.Queue()
+        self._pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, text: str) -> Future:
+        self._ensure_started()
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def _ensure_started(self):
+        # A forked process has the queue but not the thread
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                threading.Thread(target=self._run, name="embedding-batcher", daemon=True).start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                vectors = self.fn([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+
+class LocalEmbeddingBackend(EmbeddingBackend):
+    """
+    ONNX sentence-embedding model on CPU. LOCAL_EMBEDDING_MODEL_DIR holds
+    model.onnx (a transformer encoder; token outputs are mean-pooled) and the
+    matching tokenizer.json. Requires onnxruntime and tokenizers.
+    """
+    name = "local"
+
+    def __init__(self, model_dir: Optional[str] = None):
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise RuntimeError(
+                "EMBEDDING_BACKEND=local needs the optional packages: pip install onnxruntime tokenizers"
+            ) from e
+
+        model_dir = Path(model_dir or settings.local_embedding_model_dir)
+        self.model = model_dir.name
+
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=settings.local_embedding_max_length)
+        self.tokenizer.enable_padding()
+
+        options = onnxruntime.SessionOptions()
+        if settings.local_embedding_threads:
+            options.intra_op_num_threads = settings.local_embedding_threads
+        self.session = onnxruntime.InferenceSession(
+            str(model_dir / "model.onnx"), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.batcher = DynamicBatcher(
+            self._encode,
+            max_batch=settings.local_embedding_max_batch,
+            max_wait=settings.local_embedding_max_wait_ms / 1000
+        )
+        # Also warms the session up so the first question is not slow
+        self.dimension = len(self._encode(["warmup"])[0])
+        logger.info("Local embedding model loaded", model=self.model, dimension=self.dimension)
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        encodings = self.tokenizer.encode_batch(texts)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feed = {"input_ids": np.array([e.ids for e in encodings], dtype=np.int64), "attention_mask": mask}
+        if "token_type_ids" in self.input_names:
+            feed["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        feed = {name: value for name, value in feed.items() if name in self.input_names}
+
+        output = self.session.run(None, feed)[0]
+        if output.ndim == 3:
+            # Mean of the token vectors, ignoring padding
+            weights = mask[:, :, None].astype(np.float32)
+            output = (output * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        output /= np.maximum(np.linalg.norm(output, axis=1, keepdims=True), 1e-12)
+        return output.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        prefix = settings.local_embedding_document_prefix
+        vectors = []
+        for start in range(0, len(texts), settings.local_embedding_max_batch):
+            vectors.extend(self._encode([prefix + text for text in texts[start:start + settings.local_embedding_max_batch]]))
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.batcher.submit(settings.local_embedding_query_prefix + text).result()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await asyncio.wrap_future(self.batcher.submit(settings.local_embedding_query_prefix + text))
+
+
+BACKENDS = {
+    "openai": OpenAIEmbeddingBackend,
+    "local": LocalEmbeddingBackend,
+}
+
+
+@lru_cache(maxsize=1)
+def get_embedding_backend() -> EmbeddingBackend:
+    """The configured backend (one per process)"""
+    try:
+        backend_class = BACKENDS[settings.embedding_backend]
+    except KeyError:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND {settings.embedding_backend!r}; use one of {sorted(BACKENDS)}")
+    return backend_class()
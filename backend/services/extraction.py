@@ -0,0 +1,261 @@
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+import asyncio
+import time
+import structlog
+
+from config import settings
+
+logger = structlog.get_logger()
+
+# Elements that never hold page content
+BOILERPLATE_TAGS = ["script", "style", "nav", "footer", "header", "noscript", "template"]
+
+# Main content candidates, in priority order
+MAIN_CONTENT_SELECTORS = ['main', 'article', 'div[role="main"]', '.content', '#content']
+MAIN_CONTENT_XPATH = (
+    '//main | //article | //div[@role="main"]'
+    ' | //*[contains(concat(" ", normalize-space(@class), " "), " content ")]'
+    ' | //*[@id="content"]'
+)
+
+
+def _clean_lines(fragments) -> str:
+    """Strip every text fragment line by line and drop empty lines"""
+    lines = []
+    for fragment in fragments:
+        for line in fragment.split("\n"):
+            line = line.strip()
+            if line:
+                lines.append(line)
+    return "\n".join(lines)
+
+
+class TextExtractor(ABC):
+    """Base class for HTML -> plain text extraction engines"""
+    name = "base"
+
+    @abstractmethod
+    def extract(self, html: str) -> str:
+        ...
+
+
+class BeautifulSoupExtractor(TextExtractor):
+    """BeautifulSoup engine (pure-Python html.parser by default)"""
+    name = "bs4"
+
+    def __init__(self, parser: str = "html.parser"):
+        self.parser = parser
+
+    def extract(self, html: str) -> str:
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(html, self.parser)
+
+        # Remove script, style and layout elements
+        for element in soup(BOILERPLATE_TAGS):
+            element.decompose()
+
+        # Try to find main content areas
+        main_content = None
+        for selector in MAIN_CONTENT_SELECTORS:
+            main_content = soup.select_one(selector)
+            if main_content:
+                break
+
+        # If no main content found, use body
+        if not main_content:
+            main_content = soup.body if soup.body else soup
+
+        return _clean_lines([main_content.get_text(separator="\n", strip=True)])
+
+
+class LxmlExtractor(TextExtractor):
+    """
+    lxml (libxml2) engine: boilerplate elements are stripped in a single C-level
+    pass and the main content area is located with one XPath query.
+    """
+    name = "lxml"
+
+    def extract(self, html: str) -> str:
+        from lxml import etree
+        from lxml import html as lxml_html
+
+        if not html or not html.strip():
+            return ""
+
+        # Parse from bytes so documents with an XML encoding declaration are accepted
+        parser = lxml_html.HTMLParser(encoding="utf-8", remove_comments=True)
+        try:
+            root = lxml_html.document_fromstring(html.encode("utf-8", "replace"), parser=parser)
+        except (etree.ParserError, ValueError):
+            return ""
+
+        etree.strip_elements(root, *BOILERPLATE_TAGS, with_tail=False)
+
+        main_content = None
+        best_priority = len(MAIN_CONTENT_SELECTORS)
+        for element in root.xpath(MAIN_CONTENT_XPATH):
+            priority = self._priority(element)
+            if priority < best_priority:
+                main_content, best_priority = element, priority
+                if priority == 0:
+                    break
+
+        if main_content is None:
+            main_content = root.body if root.find("body") is not None else root
+
+        return _clean_lines(main_content.itertext())
+
+    @staticmethod
+    def _priority(element) -> int:
+        tag = element.tag
+        if tag == "main":
+            return 0
+        if tag == "article":
+            return 1
+        if tag == "div" and element.get("role") == "main":
+            return 2
+        if "content" in (element.get("class") or "").split():
+            return 3
+        return 4
+
+
+EXTRACTORS = {
+    "lxml": LxmlExtractor,
+    "bs4": BeautifulSoupExtractor,
+    "bs4-lxml": lambda: BeautifulSoupExtractor(parser="lxml"),
+}
+
+_extractors: Dict[str, TextExtractor] = {}
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_broken = False
+
+
+def get_extractor(engine: Optional[str] = None) -> TextExtractor:
+    """Get the extraction engine by name (defaults to settings.extraction_engine)"""
+    engine = engine or settings.extraction_engine
+    if engine not in _extractors:
+        if engine not in EXTRACTORS:
+            raise ValueError(f"Unknown extraction engine: {engine}")
+        _extractors[engine] = EXTRACTORS[engine]()
+    return _extractors[engine]
+
+
+def _extract_in_worker(html: str, engine: str) -> str:
+    return get_extractor(engine).extract(html)
+
+
+def _get_process_pool() -> Optional[ProcessPoolExecutor]:
+    global _process_pool
+    if settings.extraction_pool_workers <= 0 or _process_pool_broken:
+        return None
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=settings.extraction_pool_workers)
+    return _process_pool
+
+
+def _disable_process_pool(error: Exception):
+    """Stop using the pool for the rest of the process: a broken pool fails every submit"""
+    global _process_pool, _process_pool_broken
+    # e.g. daemonic (prefork) workers cannot spawn a pool, or a pool worker was killed
+    logger.warning(f"Extraction pool unavailable, extracting in this process from now on: {error}")
+    _process_pool_broken = True
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+def _use_pool(html: str) -> bool:
+    return (
+        settings.extraction_pool_workers > 0
+        and not _process_pool_broken
+        and len(html) >= settings.extraction_pool_min_bytes
+    )
+
+
+def extract_text(html: str, engine: Optional[str] = None) -> str:
+    """Extract the main text of an HTML document"""
+    engine = engine or settings.extraction_engine
+
+    if _use_pool(html):
+        try:
+            future = _get_process_pool().submit(_extract_in_worker, html, engine)
+        except Exception as e:
+            _disable_process_pool(e)
+        else:
+            try:
+                return future.result()
+            except BrokenProcessPool as e:
+                _disable_process_pool(e)
+            except Exception as e:
+                logger.warning(f"Pooled extraction failed, extracting inline: {e}")
+
+    return get_extractor(engine).extract(html)
+
+
+async def extract_text_async(html: str, engine: Optional[str] = None) -> str:
+    """
+    Extract text without blocking the event loop: large pages go to the
+    process pool, the rest run in the default thread executor.
+    """
+    engine = engine or settings.extraction_engine
+    loop = asyncio.get_running_loop()
+
+    if _use_pool(html):
+        try:
+            future = loop.run_in_executor(_get_process_pool(), _extract_in_worker, html, engine)
+        except Exception as e:
+            _disable_process_pool(e)
+        else:
+            try:
+                return await future
+            except BrokenProcessPool as e:
+                _disable_process_pool(e)
+            except Exception as e:
+                logger.warning(f"Pooled extraction failed, extracting in thread: {e}")
+
+    return await loop.run_in_executor(None, _extract_in_worker, html, engine)
+
+
+def measure_throughput(pages: List[str], engine: Optional[str] = None, repeat: int = 3) -> dict:
+    """
+    Measure single-core extraction throughput of an engine over a set of HTML pages.
+    Uses CPU time of this process, so the result is pages/s per core.
+    """
+    extractor = get_extractor(engine)
+    total_bytes = sum(len(page.encode("utf-8")) for page in pages) * repeat
+
+    start = time.process_time()
+    for _ in range(repeat):
+        for page in pages:
+            extractor.extract(page)
+    elapsed = max(time.process_time() - start, 1e-9)
+
+    return {
+        "engine": extractor.name if engine is None else engine,
+        "pages": len(pages) * repeat,
+        "cpu_seconds": round(elapsed, 4),
+        "pages_per_sec": round(len(pages) * repeat / elapsed, 2),
+        "mb_per_sec": round(total_bytes / elapsed / (1024 * 1024), 2)
+    }
+
+
+if __name__ == "__main__":
+    # python -m services.extraction page1.html page2.html ...
+    import json
+    import sys
+
+    html_pages = []
+    for path in sys.argv[1:]:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            html_pages.append(f.read())
+
+    if not html_pages:
+        print("usage: python -m services.extraction FILE.html [FILE.html ...]")
+        sys.exit(1)
+
+    for name in EXTRACTORS:
+        print(json.dumps(measure_throughput(html_pages, name)))
@@ -0,0 +1,149 @@
+"""
+Crawl generations, for sweeping pages that disappeared from a site.
+
+Each site has a generation counter. A crawl stamps every URL it visits
+with the site's next generation. When a full auto crawl of the site ends,
+that generation is committed. A URL whose last stamp is
+SWEEP_KEEP_GENERATIONS or more generations behind the committed one was
+not reached by that many crawls in a row, and tasks.sweep removes it.
+
+A crawl that visits far fewer pages than the previous full crawl (site
+down, crawl cut short) does not commit its generation. Pages are then
+never counted as missing because of a bad crawl.
+
+The stamps expire CRAWL_STATE_TTL_DAYS after the last crawl of the site,
+so Redis may evict them under memory pressure. The first stamp of a new
+stamp set records its generation ("#since"); that generation may be
+incomplete, so URLs are only judged by the generations after it.
+"""
+from typing import Dict, List, Optional
+import json
+import time
+import structlog
+
+from config import settings
+from services.redis_client import get_redis_client
+
+logger = structlog.get_logger()
+
+# Redis keys
+# - crawl:generation:{site}  hash: committed generation, pages it visited, when (no TTL, one per site)
+# - crawl:seen:{site}        sorted set, url -> last generation that visited it, and "#since"
+# - crawl:sweep:report       JSON of the last sweep (dry run or not)
+GENERATION_PREFIX = "crawl:generation:"
+SEEN_PREFIX = "crawl:seen:"
+REPORT_KEY = "crawl:sweep:report"
+SINCE_MEMBER = "#since"
+
+STAMP_CHUNK = 1000
+
+
+def get_generation(site: str) -> Dict[str, float]:
+    """Committed generation of a site (0 before its first full crawl) and the pages it visited"""
+    try:
+        data = get_redis_client().hgetall(f"{GENERATION_PREFIX}{site}")
+        return {k: float(v) for k, v in data.items()}
+    except Exception as e:
+        logger.warning(f"Could not read crawl generation: {e}", site=site)
+        return {}
+
+
+def next_generation(site: str) -> int:
+    """Generation a crawl starting now stamps its URLs with"""
+    return int(get_generation(site).get("generation", 0)) + 1
+
+
+def stamp(site: str, urls, generation: int):
+    """Record that `urls` were visited by `generation`"""
+    urls = list(urls)
+    if not urls:
+        return
+    key = f"{SEEN_PREFIX}{site}"
+    try:
+        pipe = get_redis_client().pipeline(transaction=False)
+        pipe.zadd(key, {SINCE_MEMBER: generation}, nx=True)
+        for start in range(0, len(urls), STAMP_CHUNK):
+            pipe.zadd(key, {url: generation for url in urls[start:start + STAMP_CHUNK]}, gt=True)
+        pipe.expire(key, settings.crawl_state_ttl_days * 86400)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not stamp crawl generation: {e}", site=site, urls=len(urls))
+
+
+def commit(site: str, generation: int, visited: int) -> bool:
+    """
+    Make `generation` the site's current one after a full crawl. Refused
+    when the crawl visited less than SWEEP_MIN_VISITED_RATIO of the previous
+    full crawl's pages.
+    """
+    previous = get_generation(site)
+    previous_visited = previous.get("visited", 0)
+    if visited < previous_visited * settings.sweep_min_visited_ratio:
+        logger.warning(
+            "Crawl visited too few pages, not advancing its generation",
+            site=site, generation=generation, visited=visited, previous_visited=int(previous_visited)
+        )
+        return False
+
+    try:
+        get_redis_client().hset(f"{GENERATION_PREFIX}{site}", mapping={
+            "generation": generation,
+            "visited": visited,
+            "committed_at": time.time()
+        })
+        return True
+    except Exception as e:
+        logger.warning(f"Could not commit crawl generation: {e}", site=site)
+        return False
+
+
+def stale_urls(site: str, urls: List[str], keep_generations: int) -> Optional[List[str]]:
+    """
+    URLs not visited by the last `keep_generations` committed generations.
+    URLs never stamped count as last seen at generation 0. None when the
+    site does not have that many generations of complete stamps yet or
+    Redis is unavailable.
+    """
+    current = int(get_generation(site).get("generation", 0))
+    if current < keep_generations:
+        return None
+
+    threshold = current - keep_generations
+    try:
+        pipe = get_redis_client().pipeline(transaction=False)
+        pipe.zscore(f"{SEEN_PREFIX}{site}", SINCE_MEMBER)
+        for url in urls:
+            pipe.zscore(f"{SEEN_PREFIX}{site}", url)
+        since, *scores = pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not read crawl stamps: {e}", site=site)
+        return None
+
+    if since is None or since > threshold:
+        # Stamps expired or were evicted since: a URL missing from them may have been visited
+        logger.info("Crawl stamps do not cover enough generations yet", site=site, since=since, generation=current)
+        return None
+
+    return [url for url, score in zip(urls, scores) if (score or 0) <= threshold]
+
+
+def forget(site: str, urls: List[str]):
+    """Drop the stamps of swept URLs"""
+    if not urls:
+        return
+    try:
+        get_redis_client().zrem(f"{SEEN_PREFIX}{site}", *urls)
+    except Exception as e:
+        logger.warning(f"Could not drop crawl stamps: {e}", site=site)
+
+
+def save_report(report: dict):
+    try:
+        get_redis_client().set(REPORT_KEY, json.dumps(report, ensure_ascii=False))
+    except Exception as e:
+        logger.warning(f"Could not save sweep report: {e}")
+
+
+def load_report() -> Optional[dict]:
+    data = get_redis_client().get(REPORT_KEY)
+    return json.loads(data) if data else None
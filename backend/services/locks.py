@@ -0,0 +1,120 @@
+"""
+Leases in Redis, for work that must run in one process at a time across
+API processes, replicas and Celery workers.
+
+A lease is a key holding its owner's random token with a TTL. The owner
+renews it before it expires. If the owner dies, the lease lapses and
+another process can take it. Renew and release compare the token, so a
+process never extends or drops a lease that has passed to someone else.
+
+When Redis is unavailable a lease cannot be checked, and each lease says
+what happens then (fail_open). The Celery broker is RabbitMQ, so tasks keep
+flowing during a Redis outage. A fail-open lease lets the guarded work
+run, for work where a duplicate run costs less than a missed one (site
+crawls: page writes are idempotent). Otherwise the lease is refused. The
+scheduler keeps whatever role it had before the outage (main.py).
+"""
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Optional
+import threading
+import uuid
+import structlog
+
+from services.redis_client import get_redis_client
+
+logger = structlog.get_logger()
+
+# Redis key: lease:{name} (owner token, expires after the lease TTL)
+KEY_PREFIX = "lease:"
+
+# Take the lease if free, renew it if already ours; returns 1 if held afterwards
+ACQUIRE_SCRIPT = """
+local owner = redis.call('GET', KEYS[1])
+if owner == ARGV[1] then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+if owner then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+return 1
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+@lru_cache(maxsize=None)
+def _script(source: str):
+    return get_redis_client().register_script(source)
+
+
+class RedisLease:
+    """A named lease held by at most one process at a time"""
+
+    def __init__(self, name: str, ttl_seconds: float, fail_open: bool = False):
+        self.name = name
+        self.key = f"{KEY_PREFIX}{name}"
+        self.ttl_ms = max(1, int(ttl_seconds * 1000))
+        self.token = uuid.uuid4().hex
+        self.fail_open = fail_open
+
+    def try_acquire(self) -> bool:
+        """Take or renew the lease; False if another process holds it. Raises if Redis is unavailable"""
+        return bool(_script(ACQUIRE_SCRIPT)(keys=[self.key], args=[self.token, self.ttl_ms]))
+
+    def acquire(self) -> bool:
+        """Take or renew the lease; without Redis, True for a fail-open lease and False otherwise"""
+        try:
+            return self.try_acquire()
+        except Exception as e:
+            if self.fail_open:
+                logger.error(f"Could not check lease, proceeding without it: {e}", lease=self.name)
+            else:
+                logger.warning(f"Could not acquire lease: {e}", lease=self.name)
+            return self.fail_open
+
+    def release(self):
+        try:
+            _script(RELEASE_SCRIPT)(keys=[self.key], args=[self.token])
+        except Exception as e:
+            logger.warning(f"Could not release lease, it expires on its own: {e}", lease=self.name)
+
+    def owner(self) -> Optional[str]:
+        """Token of the current holder, if any"""
+        try:
+            return get_redis_client().get(self.key)
+        except Exception as e:
+            logger.warning(f"Could not read lease: {e}", lease=self.name)
+            return None
+
+    @contextmanager
+    def hold(self):
+        """
+        Hold the lease for the block, renewing it in the background. Yields
+        False (and runs the block without the lease) if it is taken.
+        """
+        if not self.acquire():
+            yield False
+            return
+
+        stop = threading.Event()
+        keeper = threading.Thread(target=self._keep, args=(stop,), name=f"lease-{self.name}", daemon=True)
+        keeper.start()
+        try:
+            yield True
+        finally:
+            stop.set()
+            keeper.join()
+            self.release()
+
+    def _keep(self, stop: threading.Event):
+        while not stop.wait(self.ttl_ms / 3000):
+            if not self.acquire():
+                logger.warning("Lost lease while holding it", lease=self.name)
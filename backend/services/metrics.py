@@ -0,0 +1,104 @@
+from contextlib import contextmanager
+import time
+import structlog
+from prometheus_client import Counter, Histogram, start_http_server
+
+logger = structlog.get_logger()
+
+# Per-stage latency of the ingestion pipeline and the chat path
+# (fetch, extract, split, embed, upsert, delete, crawl_page, query_embedding,
+# vector_search, context_build, llm_generation, llm_generation_fast)
+STAGE_DURATION = Histogram(
+    "rag_stage_duration_seconds",
+    "Duration of pipeline stages",
+    ["stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+
+STAGE_ITEMS = Counter(
+    "rag_stage_items_total",
+    "Items (pages, chunks, points) processed per stage, for throughput",
+    ["stage"]
+)
+
+CACHE_HITS = Counter(
+    "rag_cache_hits_total",
+    "Cache hits by cache name",
+    ["cache"]
+)
+
+TASK_RETRIES = Counter(
+    "rag_task_retries_total",
+    "Celery task retries by task name",
+    ["task"]
+)
+
+PAGES_SKIPPED = Counter(
+    "rag_pages_skipped_total",
+    "Pages skipped by the ingestion pipeline, by reason",
+    ["reason"]
+)
+
+CHAT_ADMISSION = Counter(
+    "rag_chat_admission_total",
+    "Chat admission decisions (admitted, queued, coalesced, degraded, rejected)",
+    ["outcome"]
+)
+
+LLM_ROUTES = Counter(
+    "rag_llm_route_total",
+    "Chat answers by routed model tier and routing reason",
+    ["tier", "reason"]
+)
+
+RATE_LIMIT_WAIT = Histogram(
+    "rag_rate_limit_wait_seconds",
+    "Time spent waiting for the shared OpenAI rate limiter",
+    ["limiter", "priority"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+)
+
+
+@contextmanager
+def observe_stage(stage: str, items: int = 1):
+    """Time a pipeline stage and count the items it processed"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_DURATION.labels(stage=stage).observe(time.perf_counter() - start)
+        if items:
+            STAGE_ITEMS.labels(stage=stage).inc(items)
+
+
+def record_cache_hit(cache: str):
+    CACHE_HITS.labels(cache=cache).inc()
+
+
+def record_retry(task: str):
+    TASK_RETRIES.labels(task=task).inc()
+
+
+def record_skipped(reason: str):
+    PAGES_SKIPPED.labels(reason=reason).inc()
+
+
+def record_admission(outcome: str):
+    CHAT_ADMISSION.labels(outcome=outcome).inc()
+
+
+def record_llm_route(tier: str, reason: str):
+    LLM_ROUTES.labels(tier=tier, reason=reason).inc()
+
+
+def observe_rate_limit_wait(limiter: str, priority: str, seconds: float):
+    RATE_LIMIT_WAIT.labels(limiter=limiter, priority=priority).observe(seconds)
+
+
+def start_worker_exporter(port: int):
+    """Expose worker-side metrics on a separate HTTP port"""
+    try:
+        start_http_server(port)
+        logger.info("Metrics exporter started", port=port)
+    except OSError as e:
+        logger.warning(f"Could not start metrics exporter: {e}", port=port)
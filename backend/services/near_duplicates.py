@@ -0,0 +1,198 @@
+from collections import Counter
+from dataclasses import dataclass
+from typing import List, Optional
+from urllib.parse import urlparse
+import hashlib
+import structlog
+
+from config import settings
+from services.redis_client import get_redis_client
+
+logger = structlog.get_logger()
+
+# 64-bit SimHash split into 4 bands of 16 bits. Two fingerprints within
+# Hamming distance 3 share at least one band (pigeonhole), so band buckets
+# give all candidates for the default threshold.
+FINGERPRINT_BITS = 64
+BANDS = 4
+BAND_BITS = FINGERPRINT_BITS // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+SHINGLE_SIZE = 3
+MIN_SHINGLES = 20  # SimHash is unstable on very short texts
+
+# Redis keys (expire CRAWL_STATE_TTL_DAYS after their last write, so they can
+# be evicted under memory pressure; pages are indexed again when recrawled)
+# - neardup:fp                hash, url -> fingerprint (hex) of indexed canonical pages
+# - neardup:band:{i}:{value}  set of urls whose band i equals value
+# - neardup:canonical         hash, duplicate url -> canonical url
+FINGERPRINT_KEY = "neardup:fp"
+CANONICAL_KEY = "neardup:canonical"
+
+
+@dataclass
+class NearDuplicateResult:
+    canonical_url: Optional[str] = None  # set if the page duplicates an indexed page
+    superseded_url: Optional[str] = None  # previous canonical replaced by this page
+
+
+def _band_key(band: int, value: int) -> str:
+    return f"neardup:band:{band}:{value:04x}"
+
+
+def _bands(fingerprint: int) -> List[int]:
+    return [(fingerprint >> (band * BAND_BITS)) & BAND_MASK for band in range(BANDS)]
+
+
+def _shingles(text: str) -> Counter:
+    tokens = text.split()
+    if len(tokens) < SHINGLE_SIZE:
+        return Counter()
+    return Counter(
+        ' '.join(tokens[i:i + SHINGLE_SIZE])
+        for i in range(len(tokens) - SHINGLE_SIZE + 1)
+    )
+
+
+def simhash(text: str) -> Optional[int]:
+    """64-bit SimHash over word 3-shingles (None if the text is too short)"""
+    shingles = _shingles(text)
+    if sum(shingles.values()) < MIN_SHINGLES:
+        return None
+
+    weights = [0] * FINGERPRINT_BITS
+    for shingle, count in shingles.items():
+        h = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(FINGERPRINT_BITS):
+            if h >> bit & 1:
+                weights[bit] += count
+            else:
+                weights[bit] -= count
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _canonical_rank(url: str) -> tuple:
+    """Prefer URLs without a query string (list/print/page views), then shorter ones"""
+    return (1 if urlparse(url).query else 0, len(url))
+
+
+def _find_closest(client, url: str, fingerprint: int) -> Optional[str]:
+    pipe = client.pipeline()
+    for band, value in enumerate(_bands(fingerprint)):
+        pipe.smembers(_band_key(band, value))
+    candidates = set().union(*pipe.execute())
+    candidates.discard(url)
+    if not candidates:
+        return None
+
+    candidates = list(candidates)
+    stored = client.hmget(FINGERPRINT_KEY, candidates)
+
+    best_url, best_distance = None, settings.near_duplicate_max_distance + 1
+    for candidate, fp_hex in zip(candidates, stored):
+        if fp_hex is None:
+            continue
+        distance = hamming_distance(fingerprint, int(fp_hex, 16))
+        if distance < best_distance:
+            best_url, best_distance = candidate, distance
+    return best_url
+
+
+def _ttl() -> int:
+    return settings.crawl_state_ttl_days * 86400
+
+
+def _index(client, url: str, fingerprint: int):
+    _unindex(client, url)
+    pipe = client.pipeline()
+    pipe.hset(FINGERPRINT_KEY, url, f"{fingerprint:016x}")
+    pipe.expire(FINGERPRINT_KEY, _ttl())
+    for band, value in enumerate(_bands(fingerprint)):
+        pipe.sadd(_band_key(band, value), url)
+        pipe.expire(_band_key(band, value), _ttl())
+    pipe.hdel(CANONICAL_KEY, url)
+    pipe.execute()
+
+
+def _map_to_canonical(client, url: str, canonical: str):
+    pipe = client.pipeline()
+    pipe.hset(CANONICAL_KEY, url, canonical)
+    pipe.expire(CANONICAL_KEY, _ttl())
+    pipe.execute()
+
+
+def _unindex(client, url: str):
+    fp_hex = client.hget(FINGERPRINT_KEY, url)
+    if fp_hex is None:
+        return
+    pipe = client.pipeline()
+    for band, value in enumerate(_bands(int(fp_hex, 16))):
+        pipe.srem(_band_key(band, value), url)
+    pipe.hdel(FINGERPRINT_KEY, url)
+    pipe.execute()
+
+
+def resolve_near_duplicate(url: str, text: str) -> NearDuplicateResult:
+    """
+    Check a page against the near-duplicate index before it is chunked.
+
+    If the page duplicates an indexed page, `canonical_url` is set and the
+    caller should skip embedding it. Otherwise the page is indexed as
+    canonical; if it replaces a worse canonical (e.g. one with a query
+    string), that URL is returned as `superseded_url` so its points can be removed.
+    """
+    fingerprint = simhash(text)
+    if fingerprint is None:
+        return NearDuplicateResult()
+
+    try:
+        client = get_redis_client()
+        canonical = _find_closest(client, url, fingerprint)
+
+        if canonical is None:
+            _index(client, url, fingerprint)
+            return NearDuplicateResult()
+
+        if _canonical_rank(url) < _canonical_rank(canonical):
+            # The new URL is the better canonical: swap roles
+            _unindex(client, canonical)
+            _index(client, url, fingerprint)
+            _map_to_canonical(client, canonical, url)
+            logger.info("Near-duplicate canonical replaced", url=url, superseded_url=canonical)
+            return NearDuplicateResult(superseded_url=canonical)
+
+        _unindex(client, url)
+        _map_to_canonical(client, url, canonical)
+        logger.info("Near-duplicate page", url=url, canonical_url=canonical)
+        return NearDuplicateResult(canonical_url=canonical)
+
+    except Exception as e:
+        logger.warning(f"Near-duplicate check failed: {e}", url=url)
+        return NearDuplicateResult()
+
+
+def get_canonical_url(url: str) -> Optional[str]:
+    """Canonical URL a page was mapped to, if it is a known near-duplicate"""
+    try:
+        return get_redis_client().hget(CANONICAL_KEY, url)
+    except Exception:
+        return None
+
+
+def forget_url(url: str):
+    """Remove a URL from the near-duplicate index"""
+    try:
+        client = get_redis_client()
+        _unindex(client, url)
+        client.hdel(CANONICAL_KEY, url)
+    except Exception as e:
+        logger.warning(f"Could not remove URL from near-duplicate index: {e}", url=url)
@@ -0,0 +1,98 @@
+"""
+OpenAI Batch API plumbing for bulk embedding jobs.
+
+Requests are written to a JSONL file, uploaded and submitted as one batch.
+OpenAI completes it within the completion window under the Batch API's own
+quota, so bulk jobs do not draw on the synchronous rate limits that chat
+depends on. Which page each request belongs to is kept in Redis
+(bulkembed:job:{batch_id}) until the results are ingested.
+"""
+from typing import Iterable, Iterator, List, Optional
+import json
+import tempfile
+import structlog
+
+from config import settings
+from services.redis_client import get_redis_client
+
+logger = structlog.get_logger()
+
+JOB_PREFIX = "bulkembed:job:"
+
+# Batch statuses that may still change; anything else is final
+ACTIVE_STATUSES = ("validating", "in_progress", "finalizing", "cancelling")
+
+
+def submit_batch(client, requests: Iterable[dict], endpoint: str, metadata: Optional[dict] = None) -> str:
+    """Upload the requests as a JSONL file and start a batch; returns the batch id"""
+    with tempfile.TemporaryFile() as f:
+        for request in requests:
+            f.write(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+        f.seek(0)
+        uploaded = client.files.create(file=("requests.jsonl", f), purpose="batch")
+
+    batch = client.batches.create(
+        input_file_id=uploaded.id,
+        endpoint=endpoint,
+        completion_window=settings.bulk_embedding_completion_window,
+        metadata=metadata
+    )
+    logger.info("Submitted OpenAI batch", batch_id=batch.id, endpoint=endpoint)
+    return batch.id
+
+
+def iter_file_lines(client, file_id: str) -> Iterator[dict]:
+    """Stream a JSONL file (batch input, output or errors) line by line"""
+    with client.files.with_streaming_response.content(file_id) as response:
+        for line in response.iter_lines():
+            if line.strip():
+                yield json.loads(line)
+
+
+def delete_files(client, batch):
+    """Remove the batch's files from OpenAI storage once they are ingested"""
+    for file_id in (batch.input_file_id, batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        try:
+            client.files.delete(file_id)
+        except Exception as e:
+            logger.warning(f"Could not delete batch file: {e}", file_id=file_id)
+
+
+def save_job(batch_id: str, job: dict) -> bool:
+    try:
+        get_redis_client().set(
+            f"{JOB_PREFIX}{batch_id}",
+            json.dumps(job, ensure_ascii=False),
+            ex=settings.bulk_embedding_job_ttl_hours * 3600
+        )
+        return True
+    except Exception as e:
+        logger.warning(f"Could not save bulk embedding job: {e}", batch_id=batch_id)
+        return False
+
+
+def load_job(batch_id: str) -> Optional[dict]:
+    try:
+        data = get_redis_client().get(f"{JOB_PREFIX}{batch_id}")
+        return json.loads(data) if data else None
+    except Exception as e:
+        logger.warning(f"Could not load bulk embedding job: {e}", batch_id=batch_id)
+        return None
+
+
+def delete_job(batch_id: str):
+    try:
+        get_redis_client().delete(f"{JOB_PREFIX}{batch_id}")
+    except Exception as e:
+        logger.warning(f"Could not delete bulk embedding job: {e}", batch_id=batch_id)
+
+
+def list_jobs() -> List[str]:
+    """Batch ids of every job not ingested yet"""
+    try:
+        return [key[len(JOB_PREFIX):] for key in get_redis_client().scan_iter(match=f"{JOB_PREFIX}*")]
+    except Exception as e:
+        logger.warning(f"Could not list bulk embedding jobs: {e}")
+        return []
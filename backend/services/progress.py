@@ -0,0 +1,173 @@
+from typing import Optional
+import time
+import structlog
+
+from config import settings
+from services.redis_client import get_redis_client
+
+logger = structlog.get_logger()
+
+# Redis key: crawl:progress:{task_id} (hash of counters and timestamps)
+KEY_PREFIX = "crawl:progress:"
+
+COUNTERS = [
+    "pages_discovered",
+    "pages_visited",
+    "pages_failed",
+    "embed_queued",
+    "embed_succeeded",
+    "embed_skipped_unchanged",
+    "embed_skipped_insufficient",
+    "embed_skipped_duplicate",
+    "embed_failed",
+    "chunks_written",
+]
+
+# Embedding task skip reasons -> progress counter
+SKIP_REASON_COUNTERS = {
+    "content_unchanged": "embed_skipped_unchanged",
+    "already_exists": "embed_skipped_unchanged",
+    "insufficient_content": "embed_skipped_insufficient",
+    "boilerplate_only": "embed_skipped_insufficient",
+    "near_duplicate": "embed_skipped_duplicate",
+}
+
+
+def _key(task_id: str) -> str:
+    return f"{KEY_PREFIX}{task_id}"
+
+
+def _write(task_id: Optional[str], counters: Optional[dict] = None, fields: Optional[dict] = None, nx_fields: Optional[dict] = None):
+    """Apply counter increments and field updates in one round trip (no-op without task_id)"""
+    if not task_id:
+        return
+
+    try:
+        key = _key(task_id)
+        pipe = get_redis_client().pipeline(transaction=False)
+        for name, amount in (counters or {}).items():
+            pipe.hincrby(key, name, amount)
+        if fields:
+            pipe.hset(key, mapping=fields)
+        for name, value in (nx_fields or {}).items():
+            pipe.hsetnx(key, name, value)
+        pipe.expire(key, settings.crawl_progress_ttl_hours * 3600)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not update crawl progress: {e}", task_id=task_id)
+
+
+def queue_crawl(task_id: Optional[str]):
+    """Mark a crawl as queued (never overrides a status set by the running task)"""
+    _write(task_id, nx_fields={"status": "queued"})
+
+
+def start_crawl(task_id: Optional[str]):
+    """Start (or restart, on task retry) progress tracking for a crawl"""
+    if not task_id:
+        return
+    try:
+        get_redis_client().delete(_key(task_id))
+    except Exception as e:
+        logger.warning(f"Could not reset crawl progress: {e}", task_id=task_id)
+    _write(task_id, fields={"status": "crawling", "started_at": time.time()})
+
+
+def finish_crawl(task_id: Optional[str]):
+    """Mark the crawl (link discovery) phase done; embedding tasks may still be running"""
+    _write(task_id, fields={"status": "embedding", "crawl_finished_at": time.time()})
+
+
+def skip_crawl(task_id: Optional[str]):
+    """Mark a crawl that did not run because its site was already being crawled"""
+    _write(task_id, fields={"status": "skipped"})
+
+
+def fail_crawl(task_id: Optional[str], error: str):
+    _write(task_id, fields={"status": "failed", "error": error[:500]})
+
+
+def incr(task_id: Optional[str], counter: str, amount: int = 1):
+    _write(task_id, counters={counter: amount})
+
+
+def record_crawled_page(task_id: Optional[str], visited: bool, discovered: int = 0):
+    """Count one crawled page and the new URLs found on it"""
+    counters = {"pages_visited" if visited else "pages_failed": 1}
+    if discovered:
+        counters["pages_discovered"] = discovered
+    _write(task_id, counters=counters)
+
+
+def record_embed_result(task_id: Optional[str], result: dict):
+    """Count the outcome returned by a process_url_for_embedding* task"""
+    if not task_id or not result:
+        return
+
+    counters = {}
+    if result.get("status") == "success":
+        counters["embed_succeeded"] = 1
+        counters["chunks_written"] = int(result.get("chunks_processed", 0))
+    else:
+        counters[SKIP_REASON_COUNTERS.get(result.get("reason"), "embed_skipped_insufficient")] = 1
+
+    _write(task_id, counters=counters, nx_fields={"embed_started_at": time.time()})
+
+
+def _rate(count: int, start: Optional[float], end: float) -> float:
+    if not start or end <= start:
+        return 0.0
+    return count / (end - start)
+
+
+def get_progress(task_id: str) -> Optional[dict]:
+    """Read progress counters and derive throughput and ETA"""
+    data = get_redis_client().hgetall(_key(task_id))
+    if not data:
+        return None
+
+    now = time.time()
+    progress = {name: int(data.get(name, 0)) for name in COUNTERS}
+    started_at = float(data["started_at"]) if "started_at" in data else None
+    crawl_finished_at = float(data["crawl_finished_at"]) if "crawl_finished_at" in data else None
+    embed_started_at = float(data["embed_started_at"]) if "embed_started_at" in data else None
+
+    embed_done = (
+        progress["embed_succeeded"]
+        + progress["embed_skipped_unchanged"]
+        + progress["embed_skipped_insufficient"]
+        + progress["embed_skipped_duplicate"]
+        + progress["embed_failed"]
+    )
+    embed_remaining = max(progress["embed_queued"] - embed_done, 0)
+    pages_remaining = max(
+        progress["pages_discovered"] - progress["pages_visited"] - progress["pages_failed"], 0
+    )
+
+    crawl_rate = _rate(
+        progress["pages_visited"] + progress["pages_failed"],
+        started_at,
+        crawl_finished_at or now
+    )
+    embed_rate = _rate(embed_done, embed_started_at, now)
+
+    status = data.get("status", "queued")
+    if status == "embedding" and embed_remaining == 0:
+        status = "completed"
+
+    eta_seconds = None
+    if status == "crawling" and crawl_rate > 0:
+        eta_seconds = pages_remaining / crawl_rate
+    elif status == "embedding" and embed_rate > 0:
+        eta_seconds = embed_remaining / embed_rate
+
+    progress.update({
+        "status": status,
+        "embed_remaining": embed_remaining,
+        "pages_per_sec": round(crawl_rate, 3),
+        "embeds_per_sec": round(embed_rate, 3),
+        "eta_seconds": round(eta_seconds, 1) if eta_seconds is not None else None,
+        "elapsed_seconds": round(now - started_at, 1) if started_at else None,
+        "error": data.get("error"),
+    })
+    return progress
@@ -1,92 +1,324 @@
-from typing import List, Tuple
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
+import unicodedata
 import structlog
 from langchain_openai import ChatOpenAI
 from langchain.schema import SystemMessage, HumanMessage
-from qdrant_client import QdrantClient
 import openai
+from qdrant_client.models import Fusion, FusionQuery, Prefetch, ScoredPoint
 
 from config import settings
+from services.metrics import observe_stage, record_cache_hit, record_llm_route
+from services.rate_limit import INTERACTIVE, get_rate_limiter, retry_after_seconds
+from services.tokens import count_tokens
+from services.context import BuiltContext, build_context
+from services.embedding_backends import get_embedding_backend
+from services.search_scope import SearchScope
+from services.vector_store import get_qdrant_client, has_sparse_vectors, scope_filter
+from services.sparse import SPARSE_VECTOR_NAME, query_vector
 
 logger = structlog.get_logger()
 
 
+# System prompt and message framing, roughly
+PROMPT_OVERHEAD_TOKENS = 200
+
+NO_RESULTS_ANSWER = "죄송합니다. 관련된 정보를 찾을 수 없습니다."
+
+# Payload fields context building reads; the rest of the payload is not transferred
+SEARCH_PAYLOAD_FIELDS = ["url", "chunk_index", "text", "text_hash"]
+
+
+def normalize_question(question: str) -> str:
+    """Key under which identical questions share one computation"""
+    text = unicodedata.normalize("NFKC", question).lower()
+    text = " ".join(text.split())
+    return text.rstrip("?!.。？！ ")
+
+
+def route_model(question: str, context: BuiltContext) -> Tuple[str, str]:
+    """
+    Pick the model tier: "fast" when the question is short and one hit
+    clearly dominates retrieval, "main" otherwise. Returns (tier, reason).
+    """
+    if not settings.llm_fast_model:
+        return "main", "routing_disabled"
+    if len(question.strip()) > settings.llm_route_max_question_chars:
+        return "main", "long_question"
+    if context.top_score is None:
+        return "main", "no_scores"
+    if context.top_score < settings.llm_route_min_top_score:
+        return "main", "low_score"
+    if context.score_gap < settings.llm_route_min_score_gap:
+        return "main", "ambiguous"
+    return "fast", "confident"
+
+
+class _Flight:
+    """
+    One in-flight answer computation shared by every caller asking the same
+    question. Emitted answer pieces are kept, so a caller joining mid-stream
+    first receives the prefix already generated.
+    """
+    
+    def __init__(self):
+        self.sources: Optional[List[str]] = None
+        self.pieces: List[str] = []
+        self.done = False
+        self.error: Optional[Exception] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Condition()
+    
+    async def _notify(self):
+        async with self._changed:
+            self._changed.notify_all()
+    
+    async def set_sources(self, sources: List[str]):
+        self.sources = sources
+        await self._notify()
+    
+    async def emit(self, piece: str):
+        self.pieces.append(piece)
+        await self._notify()
+    
+    async def finish(self, error: Optional[Exception] = None):
+        self.error = error
+        self.done = True
+        await self._notify()
+    
+    async def events(self) -> AsyncIterator[Tuple[str, object]]:
+        """Yield ("sources", [...]), then ("delta", text) pieces, from the start"""
+        sent_sources = False
+        index = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(
+                    lambda: self.done
+                    or (not sent_sources and self.sources is not None)
+                    or index < len(self.pieces)
+                )
+            if not sent_sources and self.sources is not None:
+                sent_sources = True
+                yield "sources", self.sources
+            while index < len(self.pieces):
+                index += 1
+                yield "delta", self.pieces[index - 1]
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+
+
 class RAGService:
     """RAG service for question answering"""
     
     def __init__(self):
-        self.qdrant_client = QdrantClient(
-            url=settings.qdrant_host,
-            api_key=settings.qdrant_api_key
-        )
+        self.qdrant_client = get_qdrant_client()
         
         self.llm = ChatOpenAI(
             model=settings.llm_model,
             temperature=settings.llm_temperature,
-            openai_api_key=settings.openai_api_key
+            openai_api_key=settings.openai_api_key,
+            openai_api_base=settings.openai_base_url or None
         )
         
-        self.embeddings_client = openai.OpenAI(api_key=settings.openai_api_key)
+        # Cheaper, faster model for questions retrieval answers with confidence
+        self.fast_llm = None
+        if settings.llm_fast_model:
+            self.fast_llm = ChatOpenAI(
+                model=settings.llm_fast_model,
+                temperature=settings.llm_temperature,
+                openai_api_key=settings.openai_api_key,
+                openai_api_base=settings.openai_base_url or None
+            )
+        
+        self.embedder = get_embedding_backend()
+        
+        # normalized question and scope -> in-flight computation (single-flight)
+        self._inflight: Dict[str, _Flight] = {}
     
-    async def get_answer(self, question: str) -> Tuple[str, List[str]]:
+    async def get_answer(self, question: str, scope: Optional[SearchScope] = None) -> Tuple[str, List[str]]:
         """
-        Get answer for a question using RAG
+        Get answer for a question using RAG, searching only `scope` if given
         Returns: (answer, sources)
         """
+        flight = self._join(question, scope)
+        # Shielded: a caller going away must not cancel the answer others wait for
+        return await asyncio.shield(flight.task)
+    
+    async def stream_answer(self, question: str, scope: Optional[SearchScope] = None) -> AsyncIterator[Tuple[str, object]]:
+        """
+        Stream an answer as ("sources", [...]) followed by ("delta", text)
+        events. Joining a computation already in progress replays its prefix.
+        """
+        async for event in self._join(question, scope).events():
+            yield event
+    
+    def is_inflight(self, question: str, scope: Optional[SearchScope] = None) -> bool:
+        """Whether an identical question over the same scope is being answered right now"""
+        return self._flight_key(question, scope) in self._inflight
+    
+    @staticmethod
+    def _flight_key(question: str, scope: Optional[SearchScope]) -> str:
+        key = normalize_question(question)
+        return f"{key}\n{scope.key}" if scope else key
+    
+    def _join(self, question: str, scope: Optional[SearchScope] = None) -> _Flight:
+        """Attach to the in-flight computation for this question, starting one if needed"""
+        key = self._flight_key(question, scope)
+        flight = self._inflight.get(key)
+        if flight is not None:
+            record_cache_hit("chat_inflight")
+            return flight
+        
+        flight = _Flight()
+        self._inflight[key] = flight
+        flight.task = asyncio.create_task(self._run(key, flight, question, scope))
+        # Streaming-only flights never await the task; keep its exception "retrieved"
+        flight.task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return flight
+    
+    async def get_sources(self, question: str, scope: Optional[SearchScope] = None) -> List[str]:
+        """Retrieval only, no generation (degraded answers under load)"""
+        context = await self._retrieve(question, scope)
+        return context.sources if context else []
+    
+    async def _retrieve(self, question: str, scope: Optional[SearchScope] = None) -> Optional[BuiltContext]:
+        """Embed, search and build the prompt context; None when nothing matches"""
+        # Blocking client calls run in threads so queued requests keep their deadlines
+        query_embedding = await self._get_embedding(question)
+        
+        # Search similar documents
+        with observe_stage("vector_search"):
+            search_results, fused = await asyncio.to_thread(self._search, question, query_embedding, scope)
+        
+        if not search_results:
+            return None
+        
+        # Diversify, merge neighbouring chunks and fit the token budget
+        # In a thread too: it may read chunk texts from the external store
+        with observe_stage("context_build"):
+            context = await asyncio.to_thread(build_context, search_results, query_embedding, fused=fused)
+        logger.debug(
+            "Built context",
+            candidates=len(search_results),
+            passages=len(context.passages),
+            tokens=context.tokens
+        )
+        return context
+    
+    async def _run(self, key: str, flight: _Flight, question: str,
+                   scope: Optional[SearchScope] = None) -> Tuple[str, List[str]]:
+        """Compute one answer, publishing sources and answer pieces to the flight"""
         try:
-            # Get query embedding
-            query_embedding = self._get_embedding(question)
-            
-            # Search similar documents
-            search_results = self.qdrant_client.search(
-                collection_name=settings.qdrant_collection_name,
-                query_vector=query_embedding,
-                limit=settings.top_k
-            )
-            
-            if not search_results:
-                return "죄송합니다. 관련된 정보를 찾을 수 없습니다.", []
+            context = await self._retrieve(question, scope)
             
-            # Extract documents and sources
-            documents = []
-            sources = set()
+            if context is None:
+                await flight.set_sources([])
+                await flight.emit(NO_RESULTS_ANSWER)
+                await flight.finish()
+                return NO_RESULTS_ANSWER, []
             
-            for result in search_results:
-                documents.append(result.payload["text"])
-                sources.add(result.payload["url"])
+            await flight.set_sources(context.sources)
             
-            # Build context
-            context = "\n\n".join(documents)
+            # Generate answer using GPT, publishing pieces as they arrive
+            async for piece in self._generate_answer(context, question):
+                await flight.emit(piece)
             
-            # Generate answer using GPT
-            answer = await self._generate_answer(context, question)
-            
-            return answer, list(sources)
+            await flight.finish()
+            return "".join(flight.pieces), context.sources
         
         except Exception as e:
             logger.error("Failed to get answer", question=question, error=str(e))
+            await flight.finish(error=e)
             raise
+        
+        finally:
+            if self._inflight.get(key) is flight:
+                del self._inflight[key]
+    
+    def _search(self, question: str, query_embedding: List[float],
+                scope: Optional[SearchScope] = None) -> Tuple[List[ScoredPoint], bool]:
+        """
+        Dense search, or hybrid dense + BM25 sparse search fused with
+        reciprocal rank fusion. Both retrievers run as prefetches of a
+        single Qdrant query, so hybrid costs one round trip like dense.
+        A scope becomes a filter on the indexed site/updated_ts payload.
+        Returns context_candidates hits with their dense vectors, for MMR,
+        and whether their scores are fusion scores.
+        """
+        collection = settings.qdrant_collection_name
+        query_filter = scope_filter(scope)
+        if not (settings.hybrid_search_enabled and has_sparse_vectors(collection)):
+            return self.qdrant_client.query_points(
+                collection_name=collection,
+                query=query_embedding,
+                query_filter=query_filter,
+                limit=settings.context_candidates,
+                with_payload=SEARCH_PAYLOAD_FIELDS,
+                with_vectors=True
+            ).points, False
+        
+        return self.qdrant_client.query_points(
+            collection_name=collection,
+            prefetch=[
+                Prefetch(query=query_embedding, filter=query_filter, limit=settings.hybrid_prefetch_limit),
+                Prefetch(
+                    query=query_vector(question),
+                    using=SPARSE_VECTOR_NAME,
+                    filter=query_filter,
+                    limit=settings.hybrid_prefetch_limit
+                ),
+            ],
+            query=FusionQuery(fusion=Fusion.RRF),
+            limit=settings.context_candidates,
+            with_payload=SEARCH_PAYLOAD_FIELDS,
+            # The unnamed dense vector only: MMR does not use the sparse ones
+            with_vectors=[""]
+        ).points, True
     
-    def _get_embedding(self, text: str) -> List[float]:
+    async def _get_embedding(self, text: str) -> List[float]:
         """Get embedding for text"""
-        response = self.embeddings_client.embeddings.create(
-            model=settings.embedding_model,
-            input=text
-        )
-        return response.data[0].embedding
+        with observe_stage("query_embedding"):
+            return await self.embedder.aembed_query(text)
     
-    async def _generate_answer(self, context: str, question: str) -> str:
-        """Generate answer using GPT"""
+    async def _generate_answer(self, context: BuiltContext, question: str) -> AsyncIterator[str]:
+        """Generate answer using GPT, yielding it piece by piece"""
+        tier, reason = route_model(question, context)
+        record_llm_route(tier, reason)
+        llm = self.fast_llm if tier == "fast" else self.llm
+        logger.debug(
+            "Routed answer generation",
+            tier=tier,
+            reason=reason,
+            top_score=context.top_score,
+            score_gap=context.score_gap
+        )
+        
         messages = [
             SystemMessage(content="""당신은 학교 웹사이트 정보를 안내하는 Q&A 챗봇입니다. 
 반드시 주어진 '컨텍스트' 내용만을 사용하여 사용자의 '질문'에 답변해야 합니다. 
 컨텍스트에 없는 내용은 '정보를 찾을 수 없습니다.'라고 답변하세요. 
 답변은 친절하고 명확하게 작성하되, 컨텍스트의 정보를 정확하게 전달하세요."""),
             HumanMessage(content=f"""[컨텍스트]
-{context}
+{context.text}
 
 [질문]
 {question}""")
         ]
         
-        response = await self.llm.ainvoke(messages)
-        return response.content
\ No newline at end of file
+        limiter = get_rate_limiter(llm.model_name)
+        # OpenAI counts the completion allowance against TPM as well
+        await limiter.acquire_async(
+            context.tokens + count_tokens(question) + PROMPT_OVERHEAD_TOKENS + settings.llm_expected_output_tokens,
+            priority=INTERACTIVE
+        )
+        
+        try:
+            with observe_stage("llm_generation" if tier == "main" else "llm_generation_fast"):
+                async for chunk in llm.astream(messages):
+                    if chunk.content:
+                        yield chunk.content
+        except openai.RateLimitError as e:
+            limiter.penalize(retry_after_seconds(e, 0))
+            raise
\ No newline at end of file
@@ -0,0 +1,199 @@
+"""
+Shared OpenAI rate limiting across API processes and Celery workers.
+
+One Redis hash per model holds two token buckets, requests/min and
+tokens/min, refilled continuously from Redis server time. A Lua script
+checks and debits both buckets atomically. Bulk callers (ingestion) may only
+draw the buckets down to a reserve fraction, which keeps headroom for
+interactive chat. A 429 from OpenAI pauses the bucket for everyone via
+`penalize`, instead of each worker retrying on its own.
+
+If Redis is unreachable the limiter fails open, so OpenAI's own limits and
+client retries still apply.
+"""
+from functools import lru_cache
+import asyncio
+import random
+import time
+import structlog
+
+from config import settings
+from services.metrics import observe_rate_limit_wait
+from services.redis_client import get_redis_client
+
+logger = structlog.get_logger()
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+# Redis key: ratelimit:{model} (hash of bucket levels, last refill and pause deadline)
+KEY_PREFIX = "ratelimit:"
+
+# KEYS[1] bucket; ARGV: rpm, tpm, tokens, reserve fraction
+# Returns 0 when granted, otherwise milliseconds to wait before trying again
+ACQUIRE_SCRIPT = """
+local rpm = tonumber(ARGV[1])
+local tpm = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local reserve = tonumber(ARGV[4])
+
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+
+local state = redis.call('HMGET', KEYS[1], 'requests', 'tokens', 'updated', 'paused_until')
+local paused_until = tonumber(state[4]) or 0
+if paused_until > now then
+    return paused_until - now
+end
+
+local requests = tonumber(state[1]) or rpm
+local tokens = tonumber(state[2]) or tpm
+local updated = tonumber(state[3]) or now
+local elapsed = math.max(0, now - updated)
+requests = math.min(rpm, requests + elapsed * rpm / 60000)
+tokens = math.min(tpm, tokens + elapsed * tpm / 60000)
+
+local need_requests = 1 + rpm * reserve
+local need_tokens = math.min(cost, tpm * (1 - reserve)) + tpm * reserve
+local wait = 0
+if requests < need_requests then
+    wait = math.max(wait, (need_requests - requests) * 60000 / rpm)
+end
+if tokens < need_tokens then
+    wait = math.max(wait, (need_tokens - tokens) * 60000 / tpm)
+end
+
+if wait == 0 then
+    requests = requests - 1
+    tokens = tokens - math.min(cost, tpm * (1 - reserve))
+end
+redis.call('HSET', KEYS[1], 'requests', requests, 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], 120000)
+return math.ceil(wait)
+"""
+
+# KEYS[1] bucket; ARGV[1] pause in milliseconds
+PENALIZE_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local until_ms = now + tonumber(ARGV[1])
+local current = tonumber(redis.call('HGET', KEYS[1], 'paused_until')) or 0
+if until_ms > current then
+    -- Restart from an empty request bucket so workers ramp up instead of bursting
+    redis.call('HSET', KEYS[1], 'paused_until', until_ms, 'requests', 0, 'updated', until_ms)
+    redis.call('PEXPIRE', KEYS[1], 120000)
+end
+return until_ms
+"""
+
+
+@lru_cache(maxsize=None)
+def _script(source: str):
+    return get_redis_client().register_script(source)
+
+
+class RateLimiter:
+    """Requests/min and tokens/min buckets for one OpenAI model, shared through Redis"""
+
+    def __init__(self, name: str, rpm: int, tpm: int):
+        self.name = name
+        self.key = f"{KEY_PREFIX}{name}"
+        self.rpm = rpm
+        self.tpm = tpm
+
+    def _reserve(self, priority: str) -> float:
+        return 0.0 if priority == INTERACTIVE else settings.rate_limit_interactive_reserve
+
+    def try_acquire(self, tokens: int, priority: str = BULK) -> float:
+        """Debit one request and `tokens`; returns 0 if granted, else seconds to wait"""
+        try:
+            wait_ms = _script(ACQUIRE_SCRIPT)(
+                keys=[self.key],
+                args=[self.rpm, self.tpm, max(tokens, 1), self._reserve(priority)]
+            )
+            return int(wait_ms) / 1000
+        except Exception as e:
+            logger.warning(f"Rate limiter unavailable, proceeding: {e}", limiter=self.name)
+            return 0.0
+
+    def _max_wait(self, priority: str) -> float:
+        if priority == INTERACTIVE:
+            return settings.rate_limit_interactive_max_wait_seconds
+        return settings.rate_limit_bulk_max_wait_seconds
+
+    def acquire(self, tokens: int, priority: str = BULK) -> bool:
+        """
+        Block until the buckets allow the call. Gives up after the priority's
+        max wait and returns False; the caller then proceeds anyway and relies
+        on OpenAI's response.
+        """
+        start = time.monotonic()
+        deadline = start + self._max_wait(priority)
+        try:
+            while True:
+                wait = self.try_acquire(tokens, priority)
+                if wait <= 0:
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning("Rate limit wait exceeded, proceeding", limiter=self.name, priority=priority)
+                    return False
+                # Jitter keeps workers woken by the same refill from colliding
+                time.sleep(min(wait * random.uniform(1.0, 1.2), remaining))
+        finally:
+            observe_rate_limit_wait(self.name, priority, time.monotonic() - start)
+
+    async def acquire_async(self, tokens: int, priority: str = INTERACTIVE) -> bool:
+        """`acquire` for the event loop"""
+        start = time.monotonic()
+        deadline = start + self._max_wait(priority)
+        try:
+            while True:
+                wait = await asyncio.to_thread(self.try_acquire, tokens, priority)
+                if wait <= 0:
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning("Rate limit wait exceeded, proceeding", limiter=self.name, priority=priority)
+                    return False
+                await asyncio.sleep(min(wait * random.uniform(1.0, 1.2), remaining))
+        finally:
+            observe_rate_limit_wait(self.name, priority, time.monotonic() - start)
+
+    def penalize(self, seconds: float):
+        """Pause the bucket for every process after OpenAI answered 429"""
+        try:
+            _script(PENALIZE_SCRIPT)(keys=[self.key], args=[int(seconds * 1000)])
+            logger.warning("OpenAI rate limited, pausing shared bucket", limiter=self.name, seconds=seconds)
+        except Exception as e:
+            logger.warning(f"Could not pause rate limiter: {e}", limiter=self.name)
+
+
+class _NoopLimiter(RateLimiter):
+    def try_acquire(self, tokens: int, priority: str = BULK) -> float:
+        return 0.0
+
+    def penalize(self, seconds: float):
+        pass
+
+
+@lru_cache(maxsize=None)
+def get_rate_limiter(model: str) -> RateLimiter:
+    """Limiter for an OpenAI model (embedding limits for the embedding model, LLM limits otherwise)"""
+    if model == settings.embedding_model:
+        rpm, tpm = settings.openai_embedding_rpm, settings.openai_embedding_tpm
+    else:
+        rpm, tpm = settings.openai_llm_rpm, settings.openai_llm_tpm
+
+    limiter_class = RateLimiter if settings.rate_limit_enabled else _NoopLimiter
+    return limiter_class(model, rpm, tpm)
+
+
+def retry_after_seconds(error, attempt: int) -> float:
+    """Pause after a 429: the Retry-After header if present, else exponential backoff"""
+    response = getattr(error, "response", None)
+    header = response.headers.get("retry-after") if response is not None else None
+    try:
+        return max(float(header), 0.5)
+    except (TypeError, ValueError):
+        return min(2 ** attempt, 60)
@@ -0,0 +1,153 @@
+from typing import Dict, List, Optional
+import time
+import structlog
+
+from config import settings
+from services.redis_client import get_redis_client
+
+logger = structlog.get_logger()
+
+# Redis keys (expire CRAWL_STATE_TTL_DAYS after their last write, so they can
+# be evicted under memory pressure; losing one only resets a schedule)
+# - recrawl:due            sorted set, url -> next visit timestamp
+# - recrawl:url:{url}      hash with the change history of a single URL
+DUE_KEY = "recrawl:due"
+URL_KEY_PREFIX = "recrawl:url:"
+
+HOUR = 3600
+
+
+def _url_key(url: str) -> str:
+    return f"{URL_KEY_PREFIX}{url}"
+
+
+def compute_next_interval(current_interval: Optional[float], changed: bool) -> float:
+    """
+    Compute the next revisit interval (seconds) for a URL.
+
+    Pages that changed are revisited sooner (down to the floor for hot pages),
+    pages that stayed the same back off exponentially up to the ceiling.
+    """
+    min_interval = settings.recrawl_min_interval_hours * HOUR
+    max_interval = settings.recrawl_max_interval_hours * HOUR
+
+    if current_interval is None:
+        interval = settings.recrawl_initial_interval_hours * HOUR
+    elif changed:
+        interval = current_interval * settings.recrawl_speedup_factor
+    else:
+        interval = current_interval * settings.recrawl_backoff_factor
+
+    return max(min_interval, min(max_interval, interval))
+
+
+def record_crawl_result(url: str, changed: bool, now: Optional[float] = None) -> Optional[float]:
+    """
+    Record the outcome of a content-hash check for a URL and schedule its next visit.
+    Returns the next visit timestamp, or None if Redis is unavailable.
+    """
+    now = now or time.time()
+
+    try:
+        client = get_redis_client()
+        key = _url_key(url)
+
+        current = client.hget(key, "interval")
+        interval = compute_next_interval(
+            float(current) if current is not None else None,
+            changed
+        )
+        next_visit = now + interval
+
+        pipe = client.pipeline()
+        pipe.hset(key, mapping={
+            "interval": interval,
+            "last_checked": now,
+            "next_visit": next_visit
+        })
+        pipe.hincrby(key, "checks", 1)
+        if changed:
+            pipe.hset(key, "last_changed", now)
+            pipe.hincrby(key, "changes", 1)
+        pipe.zadd(DUE_KEY, {url: next_visit})
+        ttl = settings.crawl_state_ttl_days * 86400
+        pipe.expire(key, ttl)
+        pipe.expire(DUE_KEY, ttl)
+        pipe.execute()
+
+        logger.info(
+            "Recrawl scheduled",
+            url=url,
+            changed=changed,
+            interval_hours=round(interval / HOUR, 2)
+        )
+        return next_visit
+
+    except Exception as e:
+        logger.warning(f"Could not record recrawl result: {e}", url=url)
+        return None
+
+
+def get_url_schedule(url: str) -> Dict[str, float]:
+    """Get the stored change history and next visit time for a URL"""
+    try:
+        data = get_redis_client().hgetall(_url_key(url))
+        return {k: float(v) for k, v in data.items()}
+    except Exception as e:
+        logger.warning(f"Could not read recrawl schedule: {e}", url=url)
+        return {}
+
+
+def claim_due_urls(limit: int, now: Optional[float] = None) -> List[str]:
+    """
+    Return up to `limit` URLs whose next visit time has passed.
+
+    Claimed URLs are pushed back by the claim lease so they are not dispatched
+    twice before the embedding task records the new result.
+    """
+    now = now or time.time()
+
+    try:
+        client = get_redis_client()
+        urls = client.zrangebyscore(DUE_KEY, "-inf", now, start=0, num=limit)
+        if urls:
+            lease_until = now + settings.recrawl_claim_lease_minutes * 60
+            client.zadd(DUE_KEY, {url: lease_until for url in urls}, xx=True)
+        return urls
+
+    except Exception as e:
+        logger.warning(f"Could not claim due URLs: {e}")
+        return []
+
+
+def filter_due_urls(urls: List[str], now: Optional[float] = None) -> List[str]:
+    """
+    Keep only URLs that are new (never scheduled) or due for a revisit.
+    Falls back to all URLs if Redis is unavailable.
+    """
+    now = now or time.time()
+    urls = list(urls)
+
+    try:
+        pipe = get_redis_client().pipeline()
+        for url in urls:
+            pipe.zscore(DUE_KEY, url)
+        scores = pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not filter due URLs: {e}")
+        return urls
+
+    return [url for url, score in zip(urls, scores) if score is None or score <= now]
+
+
+def forget_urls(urls: List[str]):
+    """Drop the revisit schedule of URLs removed from the index"""
+    if not urls:
+        return
+    try:
+        pipe = get_redis_client().pipeline(transaction=False)
+        pipe.zrem(DUE_KEY, *urls)
+        pipe.delete(*[_url_key(url) for url in urls])
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not forget recrawl schedules: {e}", urls=len(urls))
@@ -0,0 +1,48 @@
+from functools import lru_cache
+from typing import Optional
+import redis
+import structlog
+
+from config import settings
+
+logger = structlog.get_logger()
+
+# Policies that never evict keys without a TTL (write journals, chunk texts)
+KEEPING_POLICIES = {"noeviction", "volatile-lru", "volatile-lfu", "volatile-random", "volatile-ttl"}
+
+
+@lru_cache(maxsize=1)
+def get_redis_client() -> redis.Redis:
+    """Shared Redis client (one connection pool per process)"""
+    return redis.Redis(
+        host=settings.redis_host,
+        port=settings.redis_port,
+        db=settings.redis_db,
+        decode_responses=True
+    )
+
+
+@lru_cache(maxsize=1)
+def get_binary_redis_client() -> redis.Redis:
+    """Shared Redis client returning raw bytes (compressed values)"""
+    return redis.Redis(
+        host=settings.redis_host,
+        port=settings.redis_port,
+        db=settings.redis_db
+    )
+
+
+def keeps_persistent_keys() -> Optional[bool]:
+    """
+    Whether Redis keeps keys without a TTL under memory pressure: True with
+    no memory limit or a noeviction/volatile-* policy, False with allkeys-*,
+    None if the configuration cannot be read (e.g. CONFIG is disabled)
+    """
+    try:
+        config = get_redis_client().config_get("maxmemory*")
+    except Exception as e:
+        logger.warning(f"Could not read Redis eviction policy: {e}")
+        return None
+    if str(config.get("maxmemory", "0")) == "0":
+        return True
+    return config.get("maxmemory-policy") in KEEPING_POLICIES
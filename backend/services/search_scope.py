@@ -0,0 +1,45 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+import pytz
+
+KST = pytz.timezone('Asia/Seoul')
+
+
+def to_timestamp(value: Optional[datetime]) -> Optional[float]:
+    """Epoch seconds; naive datetimes are read as Korean time"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = KST.localize(value)
+    return value.timestamp()
+
+
+@dataclass(frozen=True)
+class SearchScope:
+    """
+    Narrows retrieval to some sites (ids from crawl_sites.json, see
+    config.site_id_for_url) and to pages written within a time window
+    """
+    sites: Tuple[str, ...] = ()
+    updated_after: Optional[float] = None
+    updated_before: Optional[float] = None
+
+    @classmethod
+    def create(cls, sites: Optional[Iterable[str]] = None, updated_after: Optional[datetime] = None,
+               updated_before: Optional[datetime] = None) -> "SearchScope":
+        return cls(
+            sites=tuple(sorted({site.strip() for site in sites or [] if site.strip()})),
+            updated_after=to_timestamp(updated_after),
+            updated_before=to_timestamp(updated_before)
+        )
+
+    def __bool__(self) -> bool:
+        return bool(self.sites) or self.updated_after is not None or self.updated_before is not None
+
+    @property
+    def key(self) -> str:
+        """Part of the single-flight key: identical questions over different scopes are different questions"""
+        if not self:
+            return ""
+        return f"{','.join(self.sites)}|{self.updated_after or ''}|{self.updated_before or ''}"
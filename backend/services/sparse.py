@@ -0,0 +1,69 @@
+"""
+BM25-style sparse vectors over Korean-aware tokens.
+
+Hangul runs are split into character bigrams, so particles and compound
+nouns still match ("수강신청을" shares "수강", "강신", "신청" with "수강신청"),
+and alphanumeric runs such as course codes, room numbers and dates are kept
+whole. Token ids are crc32 hashes, so no vocabulary has to be stored.
+
+Documents carry the BM25 term-frequency part of the score; Qdrant applies
+IDF at query time (Modifier.IDF on the sparse vector), so weights never need
+recomputing as the corpus grows.
+"""
+from collections import Counter
+from typing import List
+import re
+import zlib
+
+from qdrant_client.models import SparseVector
+
+# Named sparse vector in the Qdrant collection
+SPARSE_VECTOR_NAME = "lexical"
+
+# BM25 parameters; AVG_DOC_TOKENS approximates a full chunk (about 1000 chars)
+K1 = 1.2
+B = 0.75
+AVG_DOC_TOKENS = 600
+
+TOKEN_PATTERN = re.compile(r"[가-힣]+|[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Hangul character bigrams plus lowercase alphanumeric tokens"""
+    tokens = []
+    for run in TOKEN_PATTERN.findall(text.lower()):
+        if "가" <= run[0] <= "힣":
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def _token_id(token: str) -> int:
+    return zlib.crc32(token.encode("utf-8"))
+
+
+def _to_sparse(weights: dict) -> SparseVector:
+    indices = sorted(weights)
+    return SparseVector(indices=indices, values=[weights[i] for i in indices])
+
+
+def document_vector(text: str) -> SparseVector:
+    """Sparse vector for a stored chunk (saturated, length-normalized term frequency)"""
+    tokens = tokenize(text)
+    norm = K1 * (1 - B + B * len(tokens) / AVG_DOC_TOKENS)
+
+    weights = {}
+    for token, tf in Counter(tokens).items():
+        token_id = _token_id(token)
+        # Hash collisions just merge the two terms
+        weights[token_id] = weights.get(token_id, 0.0) + tf * (K1 + 1) / (tf + norm)
+    return _to_sparse(weights)
+
+
+def query_vector(text: str) -> SparseVector:
+    """Sparse vector for a query (each distinct term counts once)"""
+    return _to_sparse({_token_id(token): 1.0 for token in set(tokenize(text))})
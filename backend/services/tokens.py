@@ -0,0 +1,36 @@
+"""Token counting with tiktoken, estimated when the encoding is unavailable"""
+from functools import lru_cache
+import structlog
+
+from config import settings
+
+logger = structlog.get_logger()
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """tiktoken encoding for the LLM, or None when it cannot be loaded (e.g. offline)"""
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(settings.llm_model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken encoding unavailable, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        # About one token per Hangul syllable; overestimates Latin text, which is the safe side
+        return len(text)
+    return len(encoding.encode(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    encoding = _encoding()
+    if encoding is None:
+        return text[:max_tokens]
+    return encoding.decode(encoding.encode(text)[:max_tokens])
@@ -0,0 +1,140 @@
+from array import array
+from functools import lru_cache
+from typing import Dict, List, Optional
+import base64
+import time
+import structlog
+from qdrant_client import QdrantClient
+from qdrant_client.models import FieldCondition, Filter, KeywordIndexParams, MatchAny, PayloadSchemaType, Range
+
+from config import settings
+from services.search_scope import SearchScope
+from services.sparse import SPARSE_VECTOR_NAME
+
+logger = structlog.get_logger()
+
+# collection name -> (has sparse vector, checked at)
+_sparse_support = {}
+SPARSE_SUPPORT_TTL_SECONDS = 60
+
+# Payload fields that writes, deletes and scoped searches filter on. The site
+# index is a tenant index: Qdrant keeps each site's points together, so a
+# search scoped to one site reads only that site's data.
+PAYLOAD_INDEXES = {
+    "url": PayloadSchemaType.KEYWORD,
+    "site": KeywordIndexParams(type="keyword", is_tenant=True),
+    "updated_ts": PayloadSchemaType.FLOAT,
+}
+_indexed_collections = set()
+
+
+@lru_cache(maxsize=1)
+def get_qdrant_client() -> QdrantClient:
+    """
+    Shared Qdrant client (one per process).
+    QDRANT_HOST=":memory:" runs an in-process instance for local runs and benchmarks.
+    """
+    if settings.qdrant_host == ":memory:":
+        return QdrantClient(location=":memory:")
+    
+    return QdrantClient(
+        url=settings.qdrant_host,
+        api_key=settings.qdrant_api_key
+    )
+
+
+def has_sparse_vectors(collection_name: str) -> bool:
+    """
+    Whether the collection carries the lexical sparse vector. Collections
+    created before hybrid search have none until migrated (POST /db/backfill-sparse).
+    Cached briefly so the hot path does not fetch collection info per request.
+    """
+    cached = _sparse_support.get(collection_name)
+    if cached and time.monotonic() - cached[1] < SPARSE_SUPPORT_TTL_SECONDS:
+        return cached[0]
+    
+    try:
+        info = get_qdrant_client().get_collection(collection_name)
+        supported = SPARSE_VECTOR_NAME in (info.config.params.sparse_vectors or {})
+        if not supported:
+            logger.warning(
+                "Collection has no sparse vector; hybrid search is off until it is migrated (POST /db/backfill-sparse)",
+                collection=collection_name
+            )
+    except Exception as e:
+        logger.warning(f"Could not read collection config: {e}", collection=collection_name)
+        supported = False
+    
+    _sparse_support[collection_name] = (supported, time.monotonic())
+    return supported
+
+
+def forget_sparse_support(collection_name: str):
+    """Drop the cached answer (after creating or deleting the collection)"""
+    _sparse_support.pop(collection_name, None)
+
+
+def ensure_payload_indexes(collection_name: str):
+    """Create the payload indexes once per process (creating an existing index is a no-op)"""
+    if collection_name in _indexed_collections:
+        return
+    client = get_qdrant_client()
+    for field_name, field_schema in PAYLOAD_INDEXES.items():
+        try:
+            client.create_payload_index(collection_name, field_name=field_name, field_schema=field_schema)
+        except Exception as e:
+            logger.warning(f"Could not create payload index: {e}", collection=collection_name, field=field_name)
+            return
+    _indexed_collections.add(collection_name)
+
+
+def scope_filter(scope: Optional[SearchScope]) -> Optional[Filter]:
+    """Qdrant filter for a search scope; None searches everything"""
+    if not scope:
+        return None
+    conditions = []
+    if scope.sites:
+        conditions.append(FieldCondition(key="site", match=MatchAny(any=list(scope.sites))))
+    if scope.updated_after is not None or scope.updated_before is not None:
+        conditions.append(FieldCondition(
+            key="updated_ts",
+            range=Range(gte=scope.updated_after, lte=scope.updated_before)
+        ))
+    return Filter(must=conditions)
+
+
+def urls_filter(urls: List[str]) -> Filter:
+    """Filter matching every point stored for any of the URLs"""
+    return Filter(must=[FieldCondition(key="url", match=MatchAny(any=list(urls)))])
+
+
+def group_by_url(points: list, max_points: int) -> List[list]:
+    """
+    Split points into upsert groups of about max_points without splitting a
+    URL's points: a failed group leaves its pages without points (reprocessed
+    as new), never with part of them (skipped as unchanged)
+    """
+    pages: Dict[str, list] = {}
+    for point in points:
+        pages.setdefault(point.payload.get("url"), []).append(point)
+
+    groups, current = [], []
+    for page_points in pages.values():
+        if current and len(current) + len(page_points) > max_points:
+            groups.append(current)
+            current = []
+        current.extend(page_points)
+    if current:
+        groups.append(current)
+    return groups
+
+
+def encode_vector(vector: List[float]) -> str:
+    """float32 bytes, base64: about a quarter of the JSON size"""
+    return base64.b64encode(array("f", vector).tobytes()).decode("ascii")
+
+
+def decode_vector(data: str) -> List[float]:
+    values = array("f")
+    values.frombytes(base64.b64decode(data))
+    return values.tolist()
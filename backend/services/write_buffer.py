@@ -0,0 +1,329 @@
+"""
+Write-behind buffer for the Qdrant writes of embedding tasks.
+
+Tasks hand their deletes and upserts to the buffer and move on. A flusher
+thread merges the writes of many tasks and sends them once `max_points`
+points are pending or the oldest write is `max_seconds` old. Deletes go
+first, as one filter request for all URLs. The upserts follow in parallel
+groups with wait=False: Qdrant acknowledges them once they are in its WAL,
+without waiting for indexing. A page's points always share one group.
+
+A delete drops buffered upserts of the same URL. Sending every delete before
+every upsert therefore gives the same result as applying writes in order.
+
+Durability: each write is appended to a Redis journal (qdrant:wal:{owner})
+before the task continues. It is trimmed only after the flush that sent it
+succeeded. While its process lives, the owner keeps a heartbeat key. Every
+running buffer periodically replays the journals of owners that are gone
+(their heartbeat expired), so the writes of a crashed worker are not lost,
+even when it is restarted before its heartbeat runs out. Journals have no
+TTL: Redis must not evict them (maxmemory-policy noeviction or volatile-*;
+a warning is logged otherwise). They stay small: a journal only holds the
+writes its buffer has not flushed yet. Journaled writes are idempotent
+(deterministic point ids, deletes by URL), which makes replaying a partly
+flushed journal safe. When the journal cannot be written, the caller writes
+straight to Qdrant instead.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set
+import json
+import os
+import threading
+import time
+import uuid
+import structlog
+from qdrant_client.models import FilterSelector, PointStruct, SparseVector
+
+from config import settings
+from services.metrics import observe_stage
+from services.redis_client import get_redis_client, keeps_persistent_keys
+from services.vector_store import decode_vector, encode_vector, get_qdrant_client, group_by_url, urls_filter
+
+logger = structlog.get_logger()
+
+# Redis keys: qdrant:wal:{owner} (list of JSON writes), qdrant:wal-owner:{owner} (heartbeat)
+WAL_PREFIX = "qdrant:wal:"
+OWNER_PREFIX = "qdrant:wal-owner:"
+OWNER_TTL_SECONDS = 60
+
+
+def encode_point(point: PointStruct) -> dict:
+    """JSON-safe form of a point for the journal (dense vectors as base64 float32)"""
+    vector = point.vector
+    if isinstance(vector, dict):
+        vector = {
+            name: {"indices": list(v.indices), "values": list(v.values)} if isinstance(v, SparseVector) else encode_vector(v)
+            for name, v in vector.items()
+        }
+    else:
+        vector = encode_vector(vector)
+    return {"id": point.id, "vector": vector, "payload": point.payload}
+
+
+def decode_point(data: dict) -> PointStruct:
+    vector = data["vector"]
+    if isinstance(vector, dict):
+        vector = {
+            name: SparseVector(**v) if isinstance(v, dict) else decode_vector(v)
+            for name, v in vector.items()
+        }
+    else:
+        vector = decode_vector(vector)
+    return PointStruct(id=data["id"], vector=vector, payload=data["payload"])
+
+
+class QdrantWriteBuffer:
+    """Merges Qdrant writes from many tasks into few, large, parallel requests"""
+
+    def __init__(self, collection_name: str, max_points: int, max_seconds: float,
+                 parallelism: int, journal: bool = True):
+        self.collection_name = collection_name
+        self.max_points = max_points
+        self.max_seconds = max_seconds
+        self.parallelism = max(1, parallelism)
+        self.journal = journal
+        self._pid: Optional[int] = None
+        self._reset()
+
+    def _reset(self):
+        self._deletes: Set[str] = set()
+        self._upserts: Dict[str, PointStruct] = {}
+        self._journaled = 0
+        self._oldest: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self._pid == os.getpid()
+
+    @property
+    def pending_points(self) -> int:
+        return len(self._upserts)
+
+    @property
+    def _wal_key(self) -> str:
+        return f"{WAL_PREFIX}{self._owner}"
+
+    def start(self):
+        """Start buffering in this process (idempotent; a forked child starts afresh)"""
+        if self.running:
+            return
+        # Locks and writes copied from a parent process belong to the parent
+        self._pid = os.getpid()
+        self._reset()
+        self._lock = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._owner = uuid.uuid4().hex
+        self._stopping = False
+        self._last_heartbeat = 0.0
+        self._last_recovery = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=self.parallelism, thread_name_prefix="qdrant-write")
+
+        if self.journal:
+            if keeps_persistent_keys() is False:
+                logger.warning("Redis may evict Qdrant write journals under memory pressure; use maxmemory-policy noeviction or volatile-*")
+            self._heartbeat()
+            self._recover_orphans()
+        self._thread = threading.Thread(target=self._run, name="qdrant-write-buffer", daemon=True)
+        self._thread.start()
+        logger.info("Qdrant write buffer started", max_points=self.max_points, max_seconds=self.max_seconds)
+
+    def upsert(self, points: List[PointStruct]) -> bool:
+        """Buffer points; False if they were not buffered and the caller must write them"""
+        if not points:
+            return True
+        entry = {"op": "upsert", "points": [encode_point(p) for p in points]} if self.journal else None
+        return self._submit(entry, points=points)
+
+    def delete_urls(self, urls: List[str]) -> bool:
+        """Buffer the removal of every point of the URLs; False if the caller must delete them"""
+        if not urls:
+            return True
+        return self._submit({"op": "delete", "urls": list(urls)}, urls=urls)
+
+    def _submit(self, entry: Optional[dict], points=None, urls=None) -> bool:
+        if not self.running:
+            return False
+
+        with self._lock:
+            journaled = self._journal([json.dumps(entry, ensure_ascii=False)]) if self.journal else True
+            if journaled:
+                self._apply(points=points, urls=urls)
+                full = len(self._upserts) >= self.max_points
+
+        if not journaled:
+            # Send what is buffered first so the caller's direct write lands after it
+            self.flush()
+            return False
+        if full:
+            # Backpressure: the task that filled the buffer pays for the flush
+            self.flush()
+        return True
+
+    def _apply(self, points=None, urls=None):
+        """Merge one write into the pending set (caller holds the lock)"""
+        if urls:
+            urls = set(urls)
+            self._deletes.update(urls)
+            self._upserts = {pid: p for pid, p in self._upserts.items() if p.payload.get("url") not in urls}
+        for point in points or []:
+            self._upserts[str(point.id)] = point
+
+        self._journaled += 1
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+            self._lock.notify()
+
+    def flush(self):
+        """Send everything buffered; on failure the writes stay buffered and journaled"""
+        if not self.running:
+            return
+        with self._flush_lock:
+            with self._lock:
+                deletes, upserts, journaled = self._deletes, self._upserts, self._journaled
+                self._reset()
+            if not journaled:
+                return
+
+            try:
+                self._send(deletes, list(upserts.values()))
+            except Exception:
+                with self._lock:
+                    self._restore(deletes, upserts, journaled)
+                raise
+            self._trim(journaled)
+
+    def _send(self, deletes: Set[str], points: List[PointStruct]):
+        client = get_qdrant_client()
+        if deletes:
+            # Waited for, so none of the upserts below can be applied before it
+            with observe_stage("delete", items=len(deletes)):
+                client.delete(
+                    collection_name=self.collection_name,
+                    points_selector=FilterSelector(filter=urls_filter(sorted(deletes))),
+                    wait=True
+                )
+        if not points:
+            return
+
+        groups = group_by_url(points, settings.upsert_batch_size)
+        with observe_stage("upsert", items=len(points)):
+            futures = [
+                self._executor.submit(client.upsert, collection_name=self.collection_name, points=group, wait=False)
+                for group in groups
+            ]
+            for future in futures:
+                future.result()
+
+    def _restore(self, deletes: Set[str], upserts: Dict[str, PointStruct], journaled: int):
+        """Put back writes of a failed flush, under any writes buffered since (caller holds the lock)"""
+        newer_deletes, newer_upserts = self._deletes, self._upserts
+        self._deletes = deletes | newer_deletes
+        self._upserts = {pid: p for pid, p in upserts.items() if p.payload.get("url") not in newer_deletes}
+        self._upserts.update(newer_upserts)
+        self._journaled += journaled
+        self._oldest = time.monotonic()
+
+    def _journal(self, entries: List[str]) -> bool:
+        try:
+            get_redis_client().rpush(self._wal_key, *entries)
+            return True
+        except Exception as e:
+            logger.warning(f"Could not journal Qdrant write, writing directly: {e}")
+            return False
+
+    def _trim(self, count: int):
+        """Drop the `count` oldest journal entries (a failed trim only leaves flushed, idempotent entries)"""
+        if not self.journal:
+            return
+        try:
+            get_redis_client().ltrim(self._wal_key, count, -1)
+        except Exception as e:
+            logger.warning(f"Could not trim Qdrant write journal: {e}")
+
+    def _heartbeat(self):
+        try:
+            get_redis_client().set(f"{OWNER_PREFIX}{self._owner}", self._owner, ex=OWNER_TTL_SECONDS)
+            self._last_heartbeat = time.monotonic()
+        except Exception as e:
+            logger.warning(f"Could not refresh Qdrant write journal heartbeat: {e}")
+
+    def _recover_orphans(self):
+        """Take over the journals of buffers whose process is gone"""
+        self._last_recovery = time.monotonic()
+        try:
+            redis_client = get_redis_client()
+            for key in redis_client.scan_iter(match=f"{WAL_PREFIX}*"):
+                owner = key[len(WAL_PREFIX):]
+                if owner == self._owner:
+                    continue
+                # Claiming the owner key fails while the owner is alive or another buffer claimed it
+                if not redis_client.set(f"{OWNER_PREFIX}{owner}", self._owner, nx=True, ex=OWNER_TTL_SECONDS):
+                    continue
+
+                entries = redis_client.lrange(key, 0, -1)
+                with self._lock:
+                    if entries:
+                        redis_client.rpush(self._wal_key, *entries)
+                    for entry in entries:
+                        write = json.loads(entry)
+                        if write["op"] == "delete":
+                            self._apply(urls=write["urls"])
+                        else:
+                            self._apply(points=[decode_point(p) for p in write["points"]])
+                redis_client.delete(key, f"{OWNER_PREFIX}{owner}")
+                logger.info("Recovered journaled Qdrant writes", owner=owner, writes=len(entries))
+        except Exception as e:
+            logger.warning(f"Could not recover Qdrant write journals: {e}")
+
+    def _run(self):
+        while not self._stopping:
+            with self._lock:
+                if self._oldest is None:
+                    timeout = OWNER_TTL_SECONDS / 3
+                else:
+                    timeout = max(0.0, self._oldest + self.max_seconds - time.monotonic())
+                if timeout:
+                    self._lock.wait(timeout)
+                due = self._oldest is not None and time.monotonic() - self._oldest >= self.max_seconds
+
+            if self.journal and time.monotonic() - self._last_heartbeat >= OWNER_TTL_SECONDS / 3:
+                self._heartbeat()
+            # Owners that died recently still had a live heartbeat at the last scan
+            if self.journal and time.monotonic() - self._last_recovery >= OWNER_TTL_SECONDS:
+                self._recover_orphans()
+            if due and not self._stopping:
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.warning(f"Qdrant write flush failed, will retry: {e}")
+                    time.sleep(1)
+
+    def close(self):
+        """Flush and stop; writes that cannot be sent stay in the journal for the next worker"""
+        if not self.running:
+            return
+        self._stopping = True
+        with self._lock:
+            self._lock.notify()
+        self._thread.join(timeout=10)
+
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Could not flush Qdrant writes on shutdown, leaving them journaled: {e}")
+        else:
+            if self.journal:
+                try:
+                    get_redis_client().delete(f"{OWNER_PREFIX}{self._owner}")
+                except Exception:
+                    pass
+        self._executor.shutdown(wait=True)
+        self._pid = None
+
+
+write_buffer = QdrantWriteBuffer(
+    collection_name=settings.qdrant_collection_name,
+    max_points=settings.qdrant_write_buffer_max_points,
+    max_seconds=settings.qdrant_write_buffer_max_seconds,
+    parallelism=settings.qdrant_write_parallelism
+)
@@ -0,0 +1,259 @@
+from contextlib import asynccontextmanager
+from typing import List, Optional
+import asyncio
+import os
+import structlog
+from celery.signals import worker_process_shutdown, worker_shutdown
+
+from config import settings
+
+logger = structlog.get_logger()
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+
+# RSS is measured by scanning /proc, so only check it every few acquisitions
+RSS_CHECK_EVERY = 10
+
+
+def _process_tree_rss_mb(root_pid: Optional[int] = None) -> float:
+    """
+    Resident memory (MB) of this process and all its descendants (the Chromium
+    processes are children of the Playwright driver). Returns 0 where /proc is unavailable.
+    """
+    root_pid = root_pid or os.getpid()
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    parents = {}
+    rss = {}
+
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return 0.0
+
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # Fields after the command name: state, ppid, ..., rss (24th field overall)
+        fields = stat.rsplit(")", 1)[1].split()
+        pid = int(entry)
+        parents[pid] = int(fields[1])
+        rss[pid] = int(fields[21]) * page_size
+
+    total = 0
+    tree = {root_pid}
+    changed = True
+    while changed:
+        changed = False
+        for pid, ppid in parents.items():
+            if ppid in tree and pid not in tree:
+                tree.add(pid)
+                changed = True
+
+    for pid in tree:
+        total += rss.get(pid, 0)
+
+    return total / (1024 * 1024)
+
+
+class BrowserPool:
+    """
+    Worker-scoped Chromium pool.
+
+    The browser and its tabs are reused across crawl tasks. Tabs are recycled
+    after `page_max_uses` navigations, the whole browser is relaunched after
+    `max_pages` navigations or when the worker's process tree exceeds `max_rss_mb`,
+    and a crashed/disconnected browser is relaunched on the next acquisition.
+    """
+
+    def __init__(
+        self,
+        max_pages: int,
+        page_max_uses: int,
+        max_rss_mb: int,
+        max_idle_pages: int
+    ):
+        self.max_pages = max_pages
+        self.page_max_uses = page_max_uses
+        self.max_rss_mb = max_rss_mb
+        self.max_idle_pages = max_idle_pages
+
+        self._playwright = None
+        self._browser = None
+        self._context = None
+        self._idle_pages: List = []
+        self._page_uses = {}
+        self._pages_since_launch = 0
+        self._acquisitions = 0
+        self._recycle_requested = False
+        self._lock = asyncio.Lock()
+
+    def is_connected(self) -> bool:
+        return self._browser is not None and self._browser.is_connected()
+
+    def _needs_recycle(self) -> bool:
+        if self._recycle_requested:
+            return True
+        if self._pages_since_launch >= self.max_pages:
+            logger.info("Recycling browser after page limit", pages=self._pages_since_launch)
+            return True
+        if self.max_rss_mb and self._acquisitions % RSS_CHECK_EVERY == 0:
+            rss_mb = _process_tree_rss_mb()
+            if rss_mb > self.max_rss_mb:
+                logger.info("Recycling browser after RSS limit", rss_mb=round(rss_mb, 1))
+                return True
+        return False
+
+    async def _ensure_browser(self):
+        if self.is_connected() and not self._needs_recycle():
+            return
+
+        if self._browser is not None and not self._browser.is_connected():
+            logger.warning("Browser disconnected, restarting")
+
+        await self._close_browser()
+
+        if self._playwright is None:
+            from playwright.async_api import async_playwright
+            self._playwright = await async_playwright().start()
+
+        self._browser = await self._playwright.chromium.launch(
+            headless=True,
+            args=["--disable-dev-shm-usage"]
+        )
+        self._context = await self._browser.new_context(user_agent=USER_AGENT)
+        self._pages_since_launch = 0
+        self._recycle_requested = False
+        logger.info("🧭 Browser launched")
+
+    async def _close_browser(self):
+        self._idle_pages = []
+        self._page_uses = {}
+
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception as e:
+                logger.warning(f"Error closing browser: {e}")
+
+        self._browser = None
+        self._context = None
+
+    async def _acquire(self):
+        async with self._lock:
+            self._acquisitions += 1
+            await self._ensure_browser()
+
+            page = None
+            while self._idle_pages:
+                candidate = self._idle_pages.pop()
+                if not candidate.is_closed():
+                    page = candidate
+                    break
+
+            if page is None:
+                page = await self._context.new_page()
+                self._page_uses[id(page)] = 0
+
+            self._page_uses[id(page)] = self._page_uses.get(id(page), 0) + 1
+            self._pages_since_launch += 1
+            return page
+
+    async def _release(self, page, healthy: bool):
+        uses = self._page_uses.get(id(page), 0)
+
+        if (
+            not healthy
+            or page.is_closed()
+            or not self.is_connected()
+            or uses >= self.page_max_uses
+            or len(self._idle_pages) >= self.max_idle_pages
+        ):
+            self._page_uses.pop(id(page), None)
+            try:
+                if not page.is_closed():
+                    await page.close()
+            except Exception:
+                pass
+            return
+
+        try:
+            # Drop the previous document so an idle tab holds almost no memory
+            await page.goto("about:blank")
+            self._idle_pages.append(page)
+        except Exception:
+            self._page_uses.pop(id(page), None)
+
+    @asynccontextmanager
+    async def page(self):
+        """Borrow a tab from the pool"""
+        page = await self._acquire()
+        healthy = False
+        try:
+            yield page
+            healthy = True
+        finally:
+            await self._release(page, healthy)
+
+    def request_recycle(self):
+        """Relaunch the browser on the next acquisition"""
+        self._recycle_requested = True
+
+    async def close(self):
+        await self._close_browser()
+        if self._playwright is not None:
+            try:
+                await self._playwright.stop()
+            except Exception as e:
+                logger.warning(f"Error stopping playwright: {e}")
+            self._playwright = None
+
+
+# Worker-scoped event loop and pool. Playwright objects are bound to the loop
+# they were created on, so all crawl tasks in this process share one loop.
+_worker_loop: Optional[asyncio.AbstractEventLoop] = None
+_browser_pool: Optional[BrowserPool] = None
+
+
+def get_worker_loop() -> asyncio.AbstractEventLoop:
+    global _worker_loop
+    if _worker_loop is None or _worker_loop.is_closed():
+        _worker_loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_worker_loop)
+    return _worker_loop
+
+
+def run_in_worker_loop(coro):
+    """Run a coroutine on the worker-scoped event loop"""
+    return get_worker_loop().run_until_complete(coro)
+
+
+def get_browser_pool() -> BrowserPool:
+    global _browser_pool
+    if _browser_pool is None:
+        _browser_pool = BrowserPool(
+            max_pages=settings.browser_max_pages,
+            page_max_uses=settings.browser_page_max_uses,
+            max_rss_mb=settings.browser_max_rss_mb,
+            max_idle_pages=settings.browser_max_idle_pages
+        )
+    return _browser_pool
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def shutdown_browser_pool(**kwargs):
+    """Close the browser when the worker process exits"""
+    global _browser_pool
+    if _browser_pool is None or _worker_loop is None or _worker_loop.is_closed():
+        return
+    try:
+        _worker_loop.run_until_complete(_browser_pool.close())
+    except Exception as e:
+        logger.warning(f"Failed to close browser pool: {e}")
+    finally:
+        _browser_pool = None
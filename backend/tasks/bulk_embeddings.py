@@ -0,0 +1,313 @@
+"""
+Bulk embedding through the OpenAI Batch API for the nightly crawl.
+
+submit_bulk_embedding fetches and chunks a group of URLs like the batch
+ingestion task. Instead of calling the embeddings endpoint, it submits all
+chunks as one Batch API job (OpenAI embedding backend only).
+poll_bulk_embedding checks the job every
+BULK_EMBEDDING_POLL_SECONDS. Once the job has finished, it streams the
+output file into Qdrant page by page. resume_bulk_embedding_jobs checks
+every tracked job every BULK_EMBEDDING_RESUME_MINUTES, which picks up jobs
+whose poll chain was lost; a lease per job keeps two checks from ingesting
+it at once. Requests that failed or never ran
+(expired job) are embedded through the regular endpoint at bulk priority.
+Pages written by another task since the job was submitted are left alone:
+the job's vectors belong to the older content.
+"""
+from functools import lru_cache
+from typing import Dict, List, Optional, Set
+import time
+import openai
+import structlog
+from qdrant_client.models import FieldCondition, MatchValue
+
+from celery_app import celery_app
+from config import settings
+from services import checkpoints, openai_batch, progress
+from services.locks import RedisLease
+from services.openai_batch import ACTIVE_STATUSES
+from tasks.embeddings import (
+    EmbeddingTask, PreparedPage, embed_pages, ensure_collection_exists, fetch_and_prepare_pages,
+    page_result, record_result, record_results, write_pages, page_checkpoint_id
+)
+from services.vector_store import get_qdrant_client, urls_filter
+
+logger = structlog.get_logger()
+
+EMBEDDINGS_ENDPOINT = "/v1/embeddings"
+INGEST_LEASE_SECONDS = 300
+
+
+@lru_cache(maxsize=1)
+def get_openai_client() -> openai.OpenAI:
+    return openai.OpenAI(
+        api_key=settings.openai_api_key,
+        base_url=settings.openai_base_url or None
+    )
+
+
+def _custom_id(page_index: int, start: int) -> str:
+    return f"{page_index}:{start}"
+
+
+def _parse_custom_id(custom_id: str):
+    page_index, start = custom_id.split(":")
+    return int(page_index), int(start)
+
+
+def embedding_requests(pages: List[PreparedPage]):
+    """One embeddings request per EMBEDDING_BATCH_SIZE chunks of a page"""
+    for page_index, page in enumerate(pages):
+        for start in range(0, len(page.chunks), settings.embedding_batch_size):
+            yield {
+                "custom_id": _custom_id(page_index, start),
+                "method": "POST",
+                "url": EMBEDDINGS_ENDPOINT,
+                "body": {
+                    "model": settings.embedding_model,
+                    "input": page.chunks[start:start + settings.embedding_batch_size]
+                }
+            }
+
+
+def submit_pages(pages: List[PreparedPage], crawl_task_id: Optional[str] = None) -> Optional[str]:
+    """
+    Submit the chunks of prepared pages as one Batch API job. Returns the
+    batch id, or None if the job state could not be saved (the batch is then
+    cancelled and the caller must embed the pages itself).
+    """
+    batch_id = openai_batch.submit_batch(
+        get_openai_client(),
+        embedding_requests(pages),
+        endpoint=EMBEDDINGS_ENDPOINT,
+        metadata={"purpose": "bulk_embedding"}
+    )
+    # Chunk texts come back with the request file; only the page of each request is kept
+    job = {
+        "crawl_task_id": crawl_task_id,
+        "submitted_at": time.time(),
+        "pages": [[page.url, page.content_hash, len(page.chunks), page.boilerplate_warm] for page in pages]
+    }
+    if openai_batch.save_job(batch_id, job):
+        return batch_id
+
+    try:
+        get_openai_client().batches.cancel(batch_id)
+    except Exception as e:
+        logger.warning(f"Could not cancel untracked batch: {e}", batch_id=batch_id)
+    return None
+
+
+@celery_app.task(base=EmbeddingTask, bind=True, name="submit_bulk_embedding")
+def submit_bulk_embedding(self, urls: List[str], crawl_task_id: Optional[str] = None):
+    """
+    Fetch, check and chunk a group of URLs, then hand their embedding to the
+    Batch API. Changed pages are counted when the job's results are ingested.
+    """
+    task_id = self.request.id
+    done = checkpoints.get_done(task_id)
+    if done is not None:
+        logger.info("Bulk submission already processed, skipping", urls=len(urls), task_id=task_id)
+        return done
+
+    logger.info("Preparing URLs for bulk embedding", urls=len(urls))
+    results, prepared = fetch_and_prepare_pages(urls, task_id)
+
+    batch_id = submit_pages(prepared, crawl_task_id) if prepared else None
+    if prepared and batch_id is None:
+        logger.warning("Could not track bulk job, embedding synchronously", pages=len(prepared))
+        embed_pages(prepared)
+        write_pages(prepared)
+        for page in prepared:
+            results[page.url] = page_result(page)
+
+    summary = {
+        "status": "submitted" if batch_id else "completed",
+        "urls": len(urls),
+        "batch_id": batch_id,
+        "pages_submitted": len(prepared) if batch_id else 0,
+        "results": [results[url] for url in urls if url in results]
+    }
+    record_results(crawl_task_id, summary["results"])
+
+    checkpoints.mark_done(task_id, summary)
+    checkpoints.clear(
+        [page_checkpoint_id(task_id, url) for url in urls],
+        [(page.url, page.content_hash) for page in prepared]
+    )
+    if batch_id:
+        poll_bulk_embedding.apply_async(args=[batch_id], countdown=settings.bulk_embedding_poll_seconds)
+    return summary
+
+
+def superseded_urls(pages: List[PreparedPage], submitted_at: Optional[float]) -> Set[str]:
+    """
+    URLs of job pages stored by another task since the job was submitted
+    (points newer than the submission, or the job's content already)
+    """
+    if not pages:
+        return set()
+    first_chunks = urls_filter([page.url for page in pages])
+    first_chunks.must.append(FieldCondition(key="chunk_index", match=MatchValue(value=0)))
+    points, _ = get_qdrant_client().scroll(
+        collection_name=settings.qdrant_collection_name,
+        scroll_filter=first_chunks,
+        limit=len(pages),
+        with_payload=["url", "content_hash", "updated_ts"]
+    )
+
+    job_hashes = {page.url: page.content_hash for page in pages}
+    return {
+        point.payload["url"] for point in points
+        if point.payload.get("content_hash") == job_hashes.get(point.payload["url"])
+        or (submitted_at is not None and (point.payload.get("updated_ts") or 0) > submitted_at)
+    }
+
+
+def ingest_batch(batch, job: dict) -> dict:
+    """
+    Stream a finished batch into Qdrant. A page is written as soon as all its
+    requests have vectors; pages left incomplete are embedded synchronously.
+    """
+    crawl_task_id = job.get("crawl_task_id")
+    submitted_at = job.get("submitted_at")
+    # Jobs saved before the boilerplate flag was tracked have three fields per page
+    pages = [
+        PreparedPage(url=url, content_hash=content_hash, chunks=[None] * count, vectors=[None] * count,
+                     boilerplate_warm=bool(warm and warm[0]))
+        for url, content_hash, count, *warm in job["pages"]
+    ]
+
+    for line in openai_batch.iter_file_lines(get_openai_client(), batch.input_file_id):
+        page_index, start = _parse_custom_id(line["custom_id"])
+        chunks = line["body"]["input"]
+        pages[page_index].chunks[start:start + len(chunks)] = chunks
+
+    ensure_collection_exists()
+    missing: Dict[int, int] = {i: len(page.chunks) for i, page in enumerate(pages)}
+    ready: List[PreparedPage] = []
+    written = 0
+    superseded = 0
+    failed_requests = 0
+
+    def drop_superseded(candidates: List[PreparedPage]) -> List[PreparedPage]:
+        nonlocal superseded
+        skipped = superseded_urls(candidates, submitted_at)
+        for url in skipped:
+            logger.info("Page stored since bulk submission, keeping it", url=url, batch_id=batch.id)
+            record_result(crawl_task_id, {"status": "skipped", "url": url, "reason": "superseded"})
+        superseded += len(skipped)
+        return [page for page in candidates if page.url not in skipped]
+
+    def write_ready():
+        nonlocal ready, written
+        ready = drop_superseded(ready)
+        write_pages(ready)
+        for page in ready:
+            record_result(crawl_task_id, page_result(page))
+        written += len(ready)
+        ready = []
+
+    if batch.output_file_id:
+        for line in openai_batch.iter_file_lines(get_openai_client(), batch.output_file_id):
+            response = line.get("response") or {}
+            if response.get("status_code") != 200:
+                failed_requests += 1
+                continue
+
+            page_index, start = _parse_custom_id(line["custom_id"])
+            page = pages[page_index]
+            data = sorted(response["body"]["data"], key=lambda d: d["index"])
+            page.vectors[start:start + len(data)] = [d["embedding"] for d in data]
+            missing[page_index] -= len(data)
+            if missing[page_index] == 0:
+                ready.append(page)
+                if sum(len(p.chunks) for p in ready) >= settings.upsert_batch_size:
+                    write_ready()
+        write_ready()
+
+    # Failed requests, an expired window or a failed batch: fall back to the embeddings endpoint
+    incomplete = [
+        page for i, page in enumerate(pages)
+        if missing[i] > 0 and all(chunk is not None for chunk in page.chunks)
+    ]
+    incomplete = drop_superseded(incomplete)
+    if incomplete:
+        logger.warning(
+            "Embedding incomplete batch pages synchronously",
+            batch_id=batch.id, status=batch.status, pages=len(incomplete), failed_requests=failed_requests
+        )
+        for page in incomplete:
+            page.vectors = None
+        embed_pages(incomplete)
+        ready = incomplete
+        write_ready()
+
+    # Pages whose request lines are missing from the input file cannot be rebuilt
+    if len(pages) > written + superseded:
+        progress.incr(crawl_task_id, "embed_failed", len(pages) - written - superseded)
+
+    return {
+        "status": "completed",
+        "batch_id": batch.id,
+        "batch_status": batch.status,
+        "pages": len(pages),
+        "pages_written": written,
+        "pages_superseded": superseded,
+        "pages_embedded_synchronously": len(incomplete),
+        "failed_requests": failed_requests
+    }
+
+
+def check_bulk_job(batch_id: str) -> dict:
+    """Ingest the job if its batch has finished; otherwise report its status"""
+    job = openai_batch.load_job(batch_id)
+    if job is None:
+        logger.warning("Unknown or already ingested bulk job", batch_id=batch_id)
+        return {"status": "unknown_job", "batch_id": batch_id}
+
+    batch = get_openai_client().batches.retrieve(batch_id)
+    if batch.status in ACTIVE_STATUSES:
+        return {"status": batch.status, "batch_id": batch_id}
+
+    with RedisLease(f"bulkembed:{batch_id}", INGEST_LEASE_SECONDS).hold() as held:
+        if not held:
+            return {"status": "busy", "batch_id": batch_id}
+        # Another check may have ingested the job while this one waited
+        job = openai_batch.load_job(batch_id)
+        if job is None:
+            return {"status": "unknown_job", "batch_id": batch_id}
+
+        logger.info("Ingesting bulk embedding job", batch_id=batch_id, status=batch.status)
+        summary = ingest_batch(batch, job)
+        openai_batch.delete_job(batch_id)
+    openai_batch.delete_files(get_openai_client(), batch)
+    return summary
+
+
+@celery_app.task(
+    bind=True,
+    name="poll_bulk_embedding",
+    autoretry_for=(Exception,),
+    retry_backoff=60,
+    retry_kwargs={"max_retries": 10}
+)
+def poll_bulk_embedding(self, batch_id: str):
+    """Check a bulk job, re-scheduling itself until the batch has finished"""
+    result = check_bulk_job(batch_id)
+    if result["status"] in ACTIVE_STATUSES + ("busy",):
+        poll_bulk_embedding.apply_async(args=[batch_id], countdown=settings.bulk_embedding_poll_seconds)
+    return result
+
+
+@celery_app.task(name="resume_bulk_embedding_jobs")
+def resume_bulk_embedding_jobs():
+    """Check every tracked bulk job, including those whose poll chain was lost"""
+    results = []
+    for batch_id in openai_batch.list_jobs():
+        try:
+            results.append(check_bulk_job(batch_id))
+        except Exception as e:
+            logger.error(f"Could not check bulk embedding job: {e}", batch_id=batch_id)
+            results.append({"status": "error", "batch_id": batch_id, "error": str(e)})
+    return {"jobs": len(results), "results": results}
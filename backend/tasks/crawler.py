@@ -1,10 +1,9 @@
 from celery import Task
 from celery_app import celery_app
-from typing import Set, List
-import asyncio
+from typing import Callable, Set, List, Optional
+import time
 from urllib.parse import urljoin, urlparse
 import structlog
-from playwright.async_api import async_playwright
 from collections import deque
 import uuid
 import json
@@ -12,6 +11,16 @@ from pathlib import Path
 
 from tasks.embeddings import process_url_for_embedding
 from tasks.embeddings import process_url_for_embedding_incremental, process_url_for_embedding_smart
+from tasks.embeddings import process_urls_for_embedding_batch
+from tasks.bulk_embeddings import submit_bulk_embedding
+from tasks.sweep import sweep_stale_pages
+from services.recrawl import claim_due_urls, filter_due_urls
+from services.locks import RedisLease
+from tasks.browser_pool import get_browser_pool, run_in_worker_loop
+from services import generations, progress
+from services.metrics import observe_stage
+from tasks.page_loading import WaitPolicy, get_site_wait_policy, make_request_filter, navigate
+from config import settings, site_id_for_url
 
 logger = structlog.get_logger()
 
@@ -21,6 +30,83 @@ class CrawlerTask(Task):
     autoretry_for = (Exception,)
     retry_kwargs = {'max_retries': 3, 'countdown': 5}
     retry_backoff = True
+    
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        progress.fail_crawl(kwargs.get("task_id", task_id), str(exc))
+
+
+class UrlBatcher:
+    """
+    Groups crawled URLs into batched ingestion tasks. A batch is sent when it
+    reaches `batch_size` URLs or its oldest URL has waited `window_seconds`,
+    so embedding starts while the crawl is still running. With `bulk`, URLs
+    are grouped into Batch API jobs of BULK_EMBEDDING_BATCH_URLS instead and
+    only sent when full or flushed.
+    """
+    
+    def __init__(
+        self,
+        crawl_task_id: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        window_seconds: Optional[float] = None,
+        url_filter: Optional[Callable[[List[str]], List[str]]] = None,
+        bulk: bool = False
+    ):
+        self.crawl_task_id = crawl_task_id
+        self.bulk = bulk
+        if bulk:
+            self.batch_size = batch_size or settings.bulk_embedding_batch_urls
+            self.window_seconds = float("inf") if window_seconds is None else window_seconds
+        else:
+            self.batch_size = batch_size or settings.ingest_batch_size
+            self.window_seconds = settings.ingest_batch_window_seconds if window_seconds is None else window_seconds
+        self.url_filter = url_filter
+        self.queued = 0
+        self._pending: List[str] = []
+        self._oldest: Optional[float] = None
+    
+    def add(self, url: str):
+        if not self._pending:
+            self._oldest = time.monotonic()
+        self._pending.append(url)
+        if len(self._pending) >= self.batch_size or time.monotonic() - self._oldest >= self.window_seconds:
+            self.flush()
+    
+    def flush(self):
+        urls, self._pending = self._pending, []
+        if self.url_filter and urls:
+            urls = self.url_filter(urls)
+        if not urls:
+            return
+        
+        enqueue_embedding(urls, self.crawl_task_id, bulk=self.bulk)
+        progress.incr(self.crawl_task_id, "embed_queued", len(urls))
+        self.queued += len(urls)
+
+
+def enqueue_embedding(urls: List[str], crawl_task_id: Optional[str] = None, bulk: bool = False):
+    """Queue smart embedding for URLs, batched unless INGEST_BATCH_SIZE is 1, or as Batch API jobs with `bulk`"""
+    if bulk:
+        for start in range(0, len(urls), settings.bulk_embedding_batch_urls):
+            submit_bulk_embedding.delay(urls[start:start + settings.bulk_embedding_batch_urls], crawl_task_id=crawl_task_id)
+        return
+    
+    if settings.ingest_batch_size <= 1:
+        for url in urls:
+            process_url_for_embedding_smart.delay(url, crawl_task_id=crawl_task_id)
+        return
+    
+    for start in range(0, len(urls), settings.ingest_batch_size):
+        batch = urls[start:start + settings.ingest_batch_size]
+        if len(batch) == 1:
+            process_url_for_embedding_smart.delay(batch[0], crawl_task_id=crawl_task_id)
+        else:
+            process_urls_for_embedding_batch.delay(batch, crawl_task_id=crawl_task_id)
+
+
+def site_lease(root_url: str) -> RedisLease:
+    """Lease that keeps two crawls of the same site (by site id) from running at once"""
+    return RedisLease(f"crawl:site:{site_id_for_url(root_url)}", settings.crawl_site_lease_seconds, fail_open=True)
 
 
 @celery_app.task(base=CrawlerTask, name="crawl_website")
@@ -28,62 +114,88 @@ def crawl_website(task_id: str, root_url: str, max_depth: int = 2):
     """
     Crawl a website starting from root_url up to max_depth
     """
-    logger.info("🔵 MANUAL CRAWL STARTED", task_id=task_id, root_url=root_url, max_depth=max_depth)
-    
-    # Run async crawler
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    
-    try:
-        urls = loop.run_until_complete(
-            crawl_async(root_url, max_depth)
-        )
+    with site_lease(root_url).hold() as held:
+        if not held:
+            logger.warning("Site is already being crawled, skipping", task_id=task_id, root_url=root_url)
+            progress.skip_crawl(task_id)
+            return {
+                "task_id": task_id,
+                "status": "skipped",
+                "reason": "site_crawl_in_progress",
+                "urls_found": 0,
+                "urls": []
+            }
         
-        logger.info(f"Crawl completed, found {len(urls)} URLs", task_id=task_id)
+        logger.info("🔵 MANUAL CRAWL STARTED", task_id=task_id, root_url=root_url, max_depth=max_depth)
+        progress.start_crawl(task_id)
         
-        # Queue each URL for smart embedding processing (checks content changes)
-        for url in urls:
-            process_url_for_embedding_smart.delay(url)
+        # Crawled URLs are queued for smart embedding (checks content changes) in batches
+        batcher = UrlBatcher(task_id)
         
-        return {
-            "task_id": task_id,
-            "status": "completed",
-            "urls_found": len(urls),
-            "urls": list(urls)
-        }
+        # Run async crawler on the worker-scoped loop (keeps the browser alive between tasks)
+        urls = run_in_worker_loop(
+            crawl_async(root_url, max_depth, task_id=task_id, on_url=batcher.add)
+        )
+        batcher.flush()
+        
+        # Marks the pages as seen; only full auto crawls advance the site's generation
+        site = site_id_for_url(root_url)
+        generations.stamp(site, urls, generations.next_generation(site))
     
-    finally:
-        loop.close()
+    logger.info(f"Crawl completed, found {len(urls)} URLs", task_id=task_id)
+    progress.finish_crawl(task_id)
+    
+    return {
+        "task_id": task_id,
+        "status": "completed",
+        "urls_found": len(urls),
+        "urls": list(urls)
+    }
 
 
-async def crawl_async(root_url: str, max_depth: int) -> Set[str]:
+async def crawl_async(
+    root_url: str,
+    max_depth: int,
+    wait_policy: Optional[WaitPolicy] = None,
+    task_id: Optional[str] = None,
+    on_url: Optional[Callable[[str], None]] = None
+) -> Set[str]:
     """
-    Async crawler using Playwright and BFS
+    Async crawler using Playwright and BFS.
+    Browser tabs are borrowed from the worker-scoped browser pool; non-document
+    resources and third-party hosts are blocked since only links are read.
+    Page counters are reported to the progress tracker of `task_id`, and
+    `on_url` is called with each page as soon as it has been visited.
     """
     visited_urls = set()
+    retried_urls = set()
+    discovered_urls = {root_url}
+    progress.incr(task_id, "pages_discovered")
     to_visit = deque([(root_url, 0)])  # (url, depth)
     domain = urlparse(root_url).netloc
+    pool = get_browser_pool()
+    wait_policy = wait_policy or get_site_wait_policy(root_url)
+    request_filter = make_request_filter(root_url)
     
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
-        )
+    while to_visit:
+        current_url, depth = to_visit.popleft()
+        
+        if current_url in visited_urls or depth > max_depth:
+            continue
         
         try:
-            while to_visit:
-                current_url, depth = to_visit.popleft()
-                
-                if current_url in visited_urls or depth > max_depth:
-                    continue
-                
+            async with pool.page() as page:
+                await page.route("**/*", request_filter)
                 try:
-                    page = await context.new_page()
-                    await page.goto(current_url, wait_until="networkidle", timeout=60000)
+                    with observe_stage("crawl_page"):
+                        await navigate(page, current_url, wait_policy)
                     
                     visited_urls.add(current_url)
                     logger.info(f"🌐 Crawled: {current_url}", depth=depth)
+                    if on_url:
+                        on_url(current_url)
                     
+                    links = []
                     if depth < max_depth:
                         # Extract all links
                         links = await page.evaluate('''
@@ -93,26 +205,37 @@ async def crawl_async(root_url: str, max_depth: int) -> Set[str]:
                                     .filter(href => href && !href.startsWith('#'))
                             }
                         ''')
-                        
-                        # Filter and add new URLs
-                        for link in links:
-                            absolute_url = urljoin(current_url, link)
-                            parsed = urlparse(absolute_url)
-                            
-                            # Only follow same domain links
-                            if parsed.netloc == domain and absolute_url not in visited_urls:
-                                # Skip certain file types
-                                if not any(absolute_url.lower().endswith(ext) for ext in ['.pdf', '.jpg', '.png', '.gif', '.zip']):
-                                    to_visit.append((absolute_url, depth + 1))
-                    
-                    await page.close()
+                finally:
+                    # Tabs are reused across sites, drop this site's filter
+                    await page.unroute("**/*", request_filter)
+            
+            # Filter and add new URLs
+            newly_discovered = 0
+            for link in links:
+                absolute_url = urljoin(current_url, link)
+                parsed = urlparse(absolute_url)
                 
-                except Exception as e:
-                    logger.error(f"Error crawling {current_url}: {str(e)}")
-                    continue
+                # Only follow same domain links
+                if parsed.netloc == domain and absolute_url not in visited_urls:
+                    # Skip certain file types
+                    if not any(absolute_url.lower().endswith(ext) for ext in ['.pdf', '.jpg', '.png', '.gif', '.zip']):
+                        to_visit.append((absolute_url, depth + 1))
+                        if absolute_url not in discovered_urls:
+                            discovered_urls.add(absolute_url)
+                            newly_discovered += 1
+            
+            progress.record_crawled_page(task_id, visited=True, discovered=newly_discovered)
         
-        finally:
-            await browser.close()
+        except Exception as e:
+            logger.error(f"Error crawling {current_url}: {str(e)}")
+            
+            # Browser crashed: the pool relaunches it on the next page, retry this URL once
+            if not pool.is_connected() and current_url not in retried_urls:
+                retried_urls.add(current_url)
+                to_visit.appendleft((current_url, depth))
+            else:
+                progress.record_crawled_page(task_id, visited=False)
+            continue
     
     return visited_urls
 
@@ -141,20 +264,23 @@ def get_enabled_sites():
         return []
 
 
-@celery_app.task(base=CrawlerTask, name="auto_crawl_websites")
-def auto_crawl_websites():
+@celery_app.task(base=CrawlerTask, name="auto_crawl_websites", bind=True)
+def auto_crawl_websites(self):
     """
     Automatically crawl predefined websites for new content
     """
     from config import settings
     
-    logger.info("🤖 AUTO CRAWL STARTED - JSON SITES")
+    task_id = self.request.id
+    logger.info("🤖 AUTO CRAWL STARTED - JSON SITES", task_id=task_id)
+    progress.start_crawl(task_id)
     
     # Get enabled sites from crawl_sites.json
     enabled_sites = get_enabled_sites()
     
     if not enabled_sites:
         logger.warning("No enabled sites found for auto-crawl")
+        progress.finish_crawl(task_id)
         return {
             "status": "completed",
             "total_urls_found": 0,
@@ -165,46 +291,87 @@ def auto_crawl_websites():
     
     total_urls_found = 0
     total_new_urls = 0
+    crawled_sites = []
+    skipped_sites = []
     
     for root_url in enabled_sites:
         try:
-            logger.info(f"Auto-crawling: {root_url}")
-            
-            # Run async crawler
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            try:
-                urls = loop.run_until_complete(
-                    crawl_async(root_url, settings.max_crawl_depth)
-                )
+            with site_lease(root_url).hold() as held:
+                # A manual or overlapping auto crawl is already on this site
+                if not held:
+                    logger.warning(f"Site is already being crawled, skipping: {root_url}")
+                    skipped_sites.append(root_url)
+                    continue
                 
-                logger.info(f"Found {len(urls)} URLs from {root_url}")
-                total_urls_found += len(urls)
+                logger.info(f"Auto-crawling: {root_url}")
                 
-                # Queue each URL for smart embedding processing
-                new_urls = 0
-                for url in urls:
-                    # Use smart processing that checks content changes
-                    result = process_url_for_embedding_smart.delay(url)
-                    new_urls += 1
+                # Queue crawled URLs for smart processing in batches (or Batch API
+                # jobs in bulk mode); with adaptive recrawl, only new URLs and URLs
+                # due for a revisit are queued
+                batcher = UrlBatcher(
+                    task_id,
+                    url_filter=filter_due_urls if settings.adaptive_recrawl_enabled else None,
+                    bulk=settings.bulk_embedding_enabled and settings.embedding_backend == "openai"
+                )
                 
-                total_new_urls += new_urls
-                logger.info(f"Queued {new_urls} URLs for processing from {root_url}")
+                site = site_id_for_url(root_url)
+                generation = generations.next_generation(site)
                 
-            finally:
-                loop.close()
+                # Run async crawler
+                try:
+                    urls = run_in_worker_loop(
+                        crawl_async(root_url, settings.max_crawl_depth, task_id=task_id, on_url=batcher.add)
+                    )
+                finally:
+                    batcher.flush()
+                
+                generations.stamp(site, urls, generation)
+                generations.commit(site, generation, len(urls))
+            
+            logger.info(f"Found {len(urls)} URLs from {root_url}")
+            total_urls_found += len(urls)
+            crawled_sites.append(root_url)
+            
+            new_urls = batcher.queued
+            total_new_urls += new_urls
+            logger.info(f"Queued {new_urls} URLs for processing from {root_url}")
                 
         except Exception as e:
             logger.error(f"Failed to auto-crawl {root_url}: {str(e)}")
             continue
     
+    progress.finish_crawl(task_id)
+    
+    # Report (or, with SWEEP_ENABLED, remove) pages the recent crawls no longer reach
+    if crawled_sites:
+        sweep_stale_pages.delay(dry_run=not settings.sweep_enabled)
+    
     result = {
         "status": "completed",
         "total_urls_found": total_urls_found,
         "total_new_urls_queued": total_new_urls,
-        "crawled_sites": enabled_sites
+        "crawled_sites": crawled_sites,
+        "skipped_sites": skipped_sites
     }
     
     logger.info("Auto-crawl completed", **result)
-    return result
\ No newline at end of file
+    return result
+
+
+@celery_app.task(base=CrawlerTask, name="recrawl_due_urls")
+def recrawl_due_urls():
+    """
+    Re-check URLs whose adaptive revisit time has passed
+    """
+    from config import settings
+    
+    urls = claim_due_urls(settings.recrawl_batch_size)
+    enqueue_embedding(urls)
+    
+    if urls:
+        logger.info(f"🔁 Queued {len(urls)} due URLs for recrawl")
+    
+    return {
+        "status": "completed",
+        "urls_queued": len(urls)
+    }
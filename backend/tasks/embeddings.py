@@ -1,18 +1,38 @@
 from celery import Task
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown, worker_shutdown
 from celery_app import celery_app
 import httpx
-from bs4 import BeautifulSoup
 import structlog
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue, FilterSelector,
+    SparseVectorParams, Modifier, IsEmptyCondition, PayloadField
+)
 import uuid
 import hashlib
+import asyncio
 from datetime import datetime
 import pytz
+from typing import Dict, List, Optional
+from dataclasses import dataclass
+from functools import lru_cache
 
-from config import settings
+from config import settings, site_id_for_url
+from services.recrawl import record_crawl_result
+from services.vector_store import (
+    get_qdrant_client, has_sparse_vectors, forget_sparse_support, urls_filter, ensure_payload_indexes,
+    group_by_url
+)
+from services.write_buffer import write_buffer
+from services.sparse import SPARSE_VECTOR_NAME, document_vector
+from services.extraction import extract_text, extract_text_async
+from tasks.browser_pool import run_in_worker_loop
+from services.boilerplate import model_warm, observe_page, strip_boilerplate, dedupe_chunks
+from services.near_duplicates import forget_url, resolve_near_duplicate
+from services import checkpoints, progress
+from services.metrics import observe_stage, record_cache_hit, record_skipped
+from services.embedding_backends import get_embedding_backend
+from services.chunk_store import chunk_text_fields, get_chunk_store
 
 logger = structlog.get_logger()
 
@@ -24,37 +44,48 @@ def get_kst_now():
     return datetime.now(KST)
 
 
+def page_metadata(url: str) -> dict:
+    """Payload fields shared by every chunk of a page (scoped search filters on site and updated_ts)"""
+    now = get_kst_now()
+    return {"site": site_id_for_url(url), "updated_at": str(now), "updated_ts": now.timestamp()}
+
+
 class EmbeddingTask(Task):
     """Base embedding task with retry configuration"""
     autoretry_for = (Exception,)
     retry_kwargs = {'max_retries': 3, 'countdown': 10}
     retry_backoff = True
+    
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        # Called once retries are exhausted; batch tasks failed every URL of the batch
+        if checkpoints.get_done(task_id) is not None:
+            # The results were recorded before the failure
+            return
+        urls = kwargs.get("urls") or (args[0] if args and isinstance(args[0], list) else None)
+        progress.incr(kwargs.get("crawl_task_id"), "embed_failed", len(urls) if urls else 1)
 
 
-# Initialize clients
-qdrant_client = QdrantClient(
-    url=settings.qdrant_host,
-    api_key=settings.qdrant_api_key
-)
-
-embeddings = OpenAIEmbeddings(
-    model=settings.embedding_model,
-    openai_api_key=settings.openai_api_key
-)
-
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=settings.chunk_size,
-    chunk_overlap=settings.chunk_overlap,
-    length_function=len,
-    separators=["\n\n", "\n", ". ", " ", ""]
-)
+@lru_cache(maxsize=1)
+def get_text_splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=settings.chunk_size,
+        chunk_overlap=settings.chunk_overlap,
+        length_function=len,
+        separators=["\n\n", "\n", ". ", " ", ""]
+    )
 
 
 @celery_app.task(base=EmbeddingTask, name="process_url_for_embedding")
-def process_url_for_embedding(url: str):
+def process_url_for_embedding(url: str, crawl_task_id: Optional[str] = None):
     """
     Process a URL: fetch content, extract text, chunk, embed, and store
     """
+    result = _process_url_for_embedding(url)
+    record_result(crawl_task_id, result)
+    return result
+
+
+def _process_url_for_embedding(url: str) -> dict:
     logger.info("Processing URL for embedding", url=url)
     
     try:
@@ -68,36 +99,41 @@ def process_url_for_embedding(url: str):
             logger.warning("Insufficient content", url=url, length=len(text_content))
             return {"status": "skipped", "url": url, "reason": "insufficient_content"}
         
+        if settings.boilerplate_enabled:
+            observe_page(url, text_content)
+        
         # Split text into chunks
-        chunks = text_splitter.split_text(text_content)
+        chunks = split_into_chunks(remove_boilerplate(url, text_content))
         logger.info(f"Split into {len(chunks)} chunks", url=url)
         
+        if not chunks:
+            # Chunks stored for earlier content of the page are stale now
+            delete_url_points(url)
+            return {"status": "skipped", "url": url, "reason": "boilerplate_only"}
+        
         # Embed and store chunks
+        vectors = embed_chunks(chunks)
+        metadata = page_metadata(url)
+        text_fields = chunk_text_fields(chunks)
         points = []
-        for idx, chunk in enumerate(chunks):
-            # Generate embedding
-            embedding = embeddings.embed_query(chunk)
-            
+        for idx, (chunk, embedding) in enumerate(zip(chunks, vectors)):
             # Create point
             point_id = str(uuid.uuid4())
             point = PointStruct(
                 id=point_id,
-                vector=embedding,
+                vector=point_vector(chunk, embedding),
                 payload={
-                    "text": chunk,
+                    **text_fields[idx],
                     "url": url,
                     "chunk_index": idx,
                     "total_chunks": len(chunks),
-                    "updated_at": str(get_kst_now())
+                    **metadata
                 }
             )
             points.append(point)
         
         # Batch upload to Qdrant
-        qdrant_client.upsert(
-            collection_name=settings.qdrant_collection_name,
-            points=points
-        )
+        upsert_points(points)
         
         logger.info(f"Stored {len(points)} embeddings", url=url)
         return {
@@ -111,76 +147,214 @@ def process_url_for_embedding(url: str):
         raise
 
 
+def record_result(crawl_task_id: Optional[str], result: dict):
+    """Report a task outcome to the crawl progress tracker and metrics"""
+    progress.record_embed_result(crawl_task_id, result)
+    
+    if result.get("status") == "skipped":
+        record_skipped(result.get("reason", "unknown"))
+        if result.get("reason") in ("content_unchanged", "already_exists"):
+            record_cache_hit("content_hash")
+
+
+def remove_boilerplate(url: str, text_content: str) -> str:
+    """Strip blocks repeated across the site (menus, contact blocks, footers)"""
+    if settings.boilerplate_enabled:
+        return strip_boilerplate(url, text_content)
+    return text_content
+
+
+def split_into_chunks(text_content: str) -> List[str]:
+    """Split text into chunks and drop chunks repeated within the page"""
+    with observe_stage("split"):
+        return dedupe_chunks(get_text_splitter().split_text(text_content))
+
+
+def embed_chunks(chunks: List[str]) -> List[List[float]]:
+    """Generate embeddings for chunks with the configured backend"""
+    with observe_stage("embed", items=len(chunks)):
+        return get_embedding_backend().embed_documents(chunks)
+
+
+def upsert_points(points: List[PointStruct]):
+    """Write points to Qdrant (through the worker's write buffer when it runs)"""
+    if write_buffer.upsert(points):
+        return
+    with observe_stage("upsert", items=len(points)):
+        get_qdrant_client().upsert(
+            collection_name=settings.qdrant_collection_name,
+            points=points
+        )
+
+
+def url_filter(url: str) -> Filter:
+    """Filter matching every point stored for a URL"""
+    return Filter(must=[FieldCondition(key="url", match=MatchValue(value=url))])
+
+
+def delete_urls_points(urls: List[str]):
+    """Remove all points stored for several URLs in one request (buffered in workers)"""
+    if write_buffer.delete_urls(urls):
+        return
+    with observe_stage("delete", items=len(urls)):
+        get_qdrant_client().delete(
+            collection_name=settings.qdrant_collection_name,
+            points_selector=FilterSelector(filter=urls_filter(urls))
+        )
+
+
+def delete_url_points(url: str):
+    """Remove all points stored for a URL"""
+    delete_urls_points([url])
+
+
+@worker_init.connect
+@worker_process_init.connect
+def start_write_buffer(**kwargs):
+    """Buffer Qdrant writes in the process that runs tasks (solo pool: the worker, prefork: each child)"""
+    if settings.qdrant_write_buffer_enabled:
+        write_buffer.start()
+
+
+@worker_init.connect
+def check_chunk_store(**kwargs):
+    """Report a misconfigured chunk text store when the worker starts, not on its first page"""
+    get_chunk_store()
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def flush_write_buffer(**kwargs):
+    """Send buffered Qdrant writes before the process exits"""
+    write_buffer.close()
+
+
+def sparse_vectors_config() -> Dict[str, SparseVectorParams]:
+    # BM25 term weights; Qdrant applies IDF at query time
+    return {SPARSE_VECTOR_NAME: SparseVectorParams(modifier=Modifier.IDF)}
+
+
 def ensure_collection_exists():
     """Ensure Qdrant collection exists with proper configuration"""
-    collections = qdrant_client.get_collections().collections
-    collection_names = [c.name for c in collections]
+    client = get_qdrant_client()
+    # The name may be an alias (a collection migrated to sparse vectors)
+    collection_names = [c.name for c in client.get_collections().collections]
+    collection_names += [a.alias_name for a in client.get_aliases().aliases]
     
     if settings.qdrant_collection_name not in collection_names:
-        qdrant_client.create_collection(
+        client.create_collection(
             collection_name=settings.qdrant_collection_name,
             vectors_config=VectorParams(
-                size=1536,  # OpenAI embedding dimension
+                size=get_embedding_backend().dimension,
                 distance=Distance.COSINE
-            )
+            ),
+            sparse_vectors_config=sparse_vectors_config()
         )
+        forget_sparse_support(settings.qdrant_collection_name)
         logger.info("Created Qdrant collection", name=settings.qdrant_collection_name)
+    
+    ensure_payload_indexes(settings.qdrant_collection_name)
 
 
-def fetch_and_extract_text(url: str) -> str:
-    """Fetch URL content and extract text"""
+@celery_app.task(name="backfill_search_payload")
+def backfill_search_payload(batch_size: int = 256):
+    """
+    Add the site and updated_ts fields to points written before scoped
+    search. Unchanged pages are never rewritten, so they would otherwise
+    stay invisible to scoped searches.
+    """
+    ensure_collection_exists()
+    client = get_qdrant_client()
+    missing_site = Filter(must=[IsEmptyCondition(is_empty=PayloadField(key="site"))])
+    
+    urls = set()
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=settings.qdrant_collection_name,
+            scroll_filter=missing_site,
+            limit=batch_size,
+            offset=offset,
+            with_payload=["url", "updated_at"]
+        )
+        for point in points:
+            url = point.payload.get("url")
+            if not url or url in urls:
+                continue
+            urls.add(url)
+            
+            payload = {"site": site_id_for_url(url)}
+            try:
+                payload["updated_ts"] = datetime.fromisoformat(point.payload["updated_at"]).timestamp()
+            except (KeyError, TypeError, ValueError):
+                pass
+            client.set_payload(
+                collection_name=settings.qdrant_collection_name,
+                payload=payload,
+                points=url_filter(url)
+            )
+        if offset is None:
+            break
+    
+    logger.info("Backfilled search payload", urls=len(urls))
+    return {"status": "completed", "urls_updated": len(urls)}
+
+
+def point_vector(chunk: str, embedding: List[float]):
+    """Dense embedding, plus the lexical sparse vector when the collection supports it"""
+    if not has_sparse_vectors(settings.qdrant_collection_name):
+        return embedding
+    return {"": embedding, SPARSE_VECTOR_NAME: document_vector(chunk)}
+
+
+def fetch_html(url: str) -> str:
+    """Fetch URL content"""
     try:
-        # Fetch content
-        response = httpx.get(url, timeout=30, follow_redirects=True)
-        response.raise_for_status()
-        
-        # Parse HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Remove script and style elements
-        for script in soup(["script", "style", "nav", "footer", "header"]):
-            script.decompose()
-        
-        # Try to find main content areas
-        main_content = None
-        for tag in ['main', 'article', 'div[role="main"]', '.content', '#content']:
-            main_content = soup.select_one(tag)
-            if main_content:
-                break
-        
-        # If no main content found, use body
-        if not main_content:
-            main_content = soup.body if soup.body else soup
-        
-        # Extract text
-        text = main_content.get_text(separator="\n", strip=True)
-        
-        # Clean up excessive whitespace
-        lines = [line.strip() for line in text.split('\n') if line.strip()]
-        text = '\n'.join(lines)
-        
-        return text
+        with observe_stage("fetch"):
+            response = httpx.get(url, timeout=30, follow_redirects=True)
+            response.raise_for_status()
+        return response.text
     
     except Exception as e:
-        logger.error("Failed to fetch/extract text", url=url, error=str(e))
+        logger.error("Failed to fetch page", url=url, error=str(e))
         raise
 
 
+def extract_page_text(html: str) -> str:
+    """Extract main text with the configured engine"""
+    with observe_stage("extract"):
+        return extract_text(html)
+
+
+def fetch_and_extract_text(url: str) -> str:
+    """Fetch URL content and extract text"""
+    return extract_page_text(fetch_html(url))
+
+
+def load_page_text(url: str, task_id: Optional[str] = None) -> str:
+    """Fetch and extract stages, resuming from this task's checkpoint on retry"""
+    html, text = checkpoints.load_stage(task_id)
+    if text is not None:
+        logger.info("Resuming from extracted text checkpoint", url=url)
+        return text
+    
+    if html is None:
+        html = fetch_html(url)
+        checkpoints.save_html(task_id, html)
+    else:
+        logger.info("Resuming from fetched page checkpoint", url=url)
+    
+    text = extract_page_text(html)
+    checkpoints.save_text(task_id, text)
+    return text
+
+
 def url_exists_in_db(url: str) -> bool:
     """Check if URL already exists in the database"""
     try:
-        search_result = qdrant_client.scroll(
+        search_result = get_qdrant_client().scroll(
             collection_name=settings.qdrant_collection_name,
-            scroll_filter={
-                "must": [
-                    {
-                        "key": "url",
-                        "match": {
-                            "value": url
-                        }
-                    }
-                ]
-            },
+            scroll_filter=url_filter(url),
             limit=1
         )
         
@@ -200,18 +374,9 @@ def content_changed_since_last_crawl(url: str, new_content: str) -> bool:
         new_hash = get_content_hash(new_content)
         
         # Search for existing content with same URL
-        search_result = qdrant_client.scroll(
+        search_result = get_qdrant_client().scroll(
             collection_name=settings.qdrant_collection_name,
-            scroll_filter={
-                "must": [
-                    {
-                        "key": "url",
-                        "match": {
-                            "value": url
-                        }
-                    }
-                ]
-            },
+            scroll_filter=url_filter(url),
             limit=1,
             with_payload=True
         )
@@ -222,8 +387,16 @@ def content_changed_since_last_crawl(url: str, new_content: str) -> bool:
         # Get stored content hash
         existing_payload = search_result[0][0].payload
         stored_hash = existing_payload.get("content_hash", "")
+        if new_hash != stored_hash:
+            return True
+        
+        # Embedded before the site's boilerplate model could strip anything: its
+        # chunks still hold menus and footers, so embed it again once it can
+        if settings.boilerplate_enabled and not existing_payload.get("boilerplate_warm") and model_warm(url):
+            logger.info("Boilerplate model ready since last embedding, re-embedding", url=url)
+            return True
         
-        return new_hash != stored_hash
+        return False
         
     except Exception as e:
         logger.error(f"Error checking content change: {e}")
@@ -231,7 +404,7 @@ def content_changed_since_last_crawl(url: str, new_content: str) -> bool:
 
 
 @celery_app.task(base=EmbeddingTask, name="process_url_for_embedding_incremental")
-def process_url_for_embedding_incremental(url: str):
+def process_url_for_embedding_incremental(url: str, crawl_task_id: Optional[str] = None):
     """
     Process URL for embedding with duplicate checking
     """
@@ -240,102 +413,331 @@ def process_url_for_embedding_incremental(url: str):
     # Skip if URL already exists
     if url_exists_in_db(url):
         logger.info("URL already exists, skipping", url=url)
-        return {"status": "skipped", "url": url, "reason": "already_exists"}
+        result = {"status": "skipped", "url": url, "reason": "already_exists"}
+    else:
+        # Process new URL
+        result = _process_url_for_embedding(url)
     
-    # Process new URL
-    return process_url_for_embedding(url)
+    record_result(crawl_task_id, result)
+    return result
 
 
-@celery_app.task(base=EmbeddingTask, name="process_url_for_embedding_smart")
-def process_url_for_embedding_smart(url: str):
+@celery_app.task(base=EmbeddingTask, bind=True, name="process_url_for_embedding_smart")
+def process_url_for_embedding_smart(self, url: str, crawl_task_id: Optional[str] = None):
     """
-    Process URL with smart duplicate detection based on content changes
+    Process URL with smart duplicate detection based on content changes.
+    Retries resume at the failed stage; a redelivered, finished message is a no-op.
     """
+    task_id = self.request.id
+    done = checkpoints.get_done(task_id)
+    if done is not None:
+        logger.info("Message already processed, skipping", url=url, task_id=task_id)
+        return done
+    
+    result = _process_url_for_embedding_smart(url, task_id=task_id)
+    record_result(crawl_task_id, result)
+    checkpoints.mark_done(task_id, result, url=url, content_hash=result.get("content_hash"))
+    return result
+
+
+@dataclass
+class PreparedPage:
+    """A changed page, split and ready to embed and write"""
+    url: str
+    content_hash: str
+    chunks: List[str]
+    vectors: Optional[List[List[float]]] = None
+    boilerplate_warm: bool = False  # boilerplate was stripped with a warm site model
+
+
+def _process_url_for_embedding_smart(url: str, task_id: Optional[str] = None) -> dict:
     logger.info("Processing URL with smart duplicate detection", url=url)
     
     try:
         # Always fetch content first to check if it changed
-        text_content = fetch_and_extract_text(url)
-        
-        if not text_content or len(text_content.strip()) < 50:
-            logger.warning("Insufficient content", url=url, length=len(text_content))
-            return {"status": "skipped", "url": url, "reason": "insufficient_content"}
-        
-        # Check if content actually changed
-        if not content_changed_since_last_crawl(url, text_content):
-            logger.info("Content unchanged, skipping", url=url)
-            return {"status": "skipped", "url": url, "reason": "content_unchanged"}
-        
-        # Content changed or new URL - process it
-        logger.info("Content changed or new URL, processing", url=url)
-        
-        # Ensure collection exists
-        ensure_collection_exists()
+        text_content = load_page_text(url, task_id)
         
-        # Remove old content for this URL if exists
-        try:
-            qdrant_client.delete(
-                collection_name=settings.qdrant_collection_name,
-                points_selector={
-                    "filter": {
-                        "must": [
-                            {
-                                "key": "url",
-                                "match": {
-                                    "value": url
-                                }
-                            }
-                        ]
-                    }
-                }
-            )
-            logger.info("Removed old content for URL", url=url)
-        except Exception as e:
-            logger.warning(f"Could not remove old content: {e}")
+        prepared = prepare_page(url, text_content)
+        if isinstance(prepared, dict):
+            return prepared
         
-        # Split text into chunks
-        chunks = text_splitter.split_text(text_content)
-        logger.info(f"Split into {len(chunks)} chunks", url=url)
+        embed_pages([prepared])
+        write_pages([prepared])
+        return page_result(prepared)
         
-        # Generate content hash
-        content_hash = get_content_hash(text_content)
+    except Exception as e:
+        logger.error("Failed to process URL", url=url, error=str(e))
+        raise
+
+
+def prepare_page(url: str, text_content: str):
+    """
+    Change detection, boilerplate removal, near-duplicate check and
+    chunking. Returns a PreparedPage, or the skip result for the page.
+    """
+    if not text_content or len(text_content.strip()) < 50:
+        logger.warning("Insufficient content", url=url, length=len(text_content or ""))
+        record_crawl_result(url, changed=False)
+        return {"status": "skipped", "url": url, "reason": "insufficient_content"}
+    
+    # Feed the site-wide boilerplate model with every page, changed or not
+    if settings.boilerplate_enabled:
+        observe_page(url, text_content)
+    
+    # Check if content actually changed
+    if not content_changed_since_last_crawl(url, text_content):
+        logger.info("Content unchanged, skipping", url=url)
+        record_crawl_result(url, changed=False)
+        return {"status": "skipped", "url": url, "reason": "content_unchanged"}
+    
+    # Content changed or new URL - process it
+    logger.info("Content changed or new URL, processing", url=url)
+    
+    # Generate content hash
+    content_hash = get_content_hash(text_content)
+    
+    # Ensure collection exists
+    ensure_collection_exists()
+    
+    clean_text = remove_boilerplate(url, text_content)
+    chunks, vectors = checkpoints.load_chunks(url, content_hash)
+    # Checkpointed chunks may predate a warm model; unknown counts as cold
+    boilerplate_warm = settings.boilerplate_enabled and chunks is None and model_warm(url)
+    
+    # Skip pages that duplicate another URL (list/print/paginated views of the same notice)
+    if settings.near_duplicate_enabled:
+        near_duplicate = resolve_near_duplicate(url, clean_text)
         
-        # Embed and store chunks
-        points = []
-        for idx, chunk in enumerate(chunks):
-            # Generate embedding
-            embedding = embeddings.embed_query(chunk)
-            
-            # Create point with content hash
-            point_id = str(uuid.uuid4())
-            point = PointStruct(
-                id=point_id,
-                vector=embedding,
-                payload={
-                    "text": chunk,
-                    "url": url,
-                    "chunk_index": idx,
-                    "total_chunks": len(chunks),
-                    "content_hash": content_hash,
-                    "updated_at": str(get_kst_now())
-                }
-            )
-            points.append(point)
+        if near_duplicate.superseded_url:
+            try:
+                delete_url_points(near_duplicate.superseded_url)
+            except Exception as e:
+                logger.warning(f"Could not remove superseded duplicate: {e}")
         
-        # Batch upload to Qdrant
-        qdrant_client.upsert(
-            collection_name=settings.qdrant_collection_name,
-            points=points
+        if near_duplicate.canonical_url:
+            try:
+                delete_url_points(url)
+            except Exception as e:
+                logger.warning(f"Could not remove old content: {e}")
+            record_crawl_result(url, changed=False)
+            return {
+                "status": "skipped",
+                "url": url,
+                "reason": "near_duplicate",
+                "canonical_url": near_duplicate.canonical_url
+            }
+    
+    # Split text into chunks (boilerplate removed, duplicate chunks dropped)
+    if chunks is None:
+        chunks = split_into_chunks(clean_text)
+        checkpoints.save_chunks(url, content_hash, chunks)
+    logger.info(f"Split into {len(chunks)} chunks", url=url)
+    
+    if not chunks:
+        # The page changed to boilerplate only: its old chunks are stale. Without
+        # stored points it had no content last time either, which is no change
+        had_points = url_exists_in_db(url)
+        if had_points:
+            try:
+                delete_url_points(url)
+            except Exception as e:
+                logger.warning(f"Could not remove old content: {e}")
+            # Other pages must not be skipped as duplicates of content that is gone
+            forget_url(url)
+        logger.info("Only boilerplate content, skipping", url=url, removed_old=had_points)
+        record_crawl_result(url, changed=had_points)
+        return {"status": "skipped", "url": url, "reason": "boilerplate_only"}
+    
+    return PreparedPage(url=url, content_hash=content_hash, chunks=chunks, vectors=vectors, boilerplate_warm=boilerplate_warm)
+
+
+def embed_pages(pages: List[PreparedPage]):
+    """
+    Embed the chunks of every page lacking vectors, batching requests
+    across pages (vectors already checkpointed by a retry are reused)
+    """
+    pending = [page for page in pages if page.vectors is None]
+    for page in pages:
+        if page.vectors is not None:
+            logger.info("Resuming from embedding checkpoint", url=page.url)
+    if not pending:
+        return
+    
+    vectors = embed_chunks([chunk for page in pending for chunk in page.chunks])
+    offset = 0
+    for page in pending:
+        page.vectors = vectors[offset:offset + len(page.chunks)]
+        offset += len(page.chunks)
+        checkpoints.save_chunks(page.url, page.content_hash, page.chunks, page.vectors)
+
+
+def build_points(page: PreparedPage) -> List[PointStruct]:
+    metadata = page_metadata(page.url)
+    text_fields = chunk_text_fields(page.chunks)
+    points = []
+    for idx, (chunk, embedding) in enumerate(zip(page.chunks, page.vectors)):
+        # Deterministic id: rewriting the same content is idempotent
+        point_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{page.url}#{page.content_hash}#{idx}"))
+        point = PointStruct(
+            id=point_id,
+            vector=point_vector(chunk, embedding),
+            payload={
+                **text_fields[idx],
+                "url": page.url,
+                "chunk_index": idx,
+                "total_chunks": len(page.chunks),
+                "content_hash": page.content_hash,
+                "boilerplate_warm": page.boilerplate_warm,
+                **metadata
+            }
         )
+        points.append(point)
+    return points
+
+
+def write_pages(pages: List[PreparedPage]):
+    """Replace the stored points of the pages: one delete for all URLs, then upserts grouped by page"""
+    if not pages:
+        return
+    
+    # Remove old content for these URLs if it exists
+    try:
+        delete_urls_points([page.url for page in pages])
+        logger.info("Removed old content for URLs", urls=len(pages))
+    except Exception as e:
+        logger.warning(f"Could not remove old content: {e}")
+    
+    points = [point for page in pages for point in build_points(page)]
+    for group in group_by_url(points, settings.upsert_batch_size):
+        upsert_points(group)
+    
+    for page in pages:
+        logger.info(f"Updated {len(page.chunks)} embeddings", url=page.url)
+        record_crawl_result(page.url, changed=True)
+
+
+def page_result(page: PreparedPage) -> dict:
+    return {
+        "status": "success",
+        "url": page.url,
+        "chunks_processed": len(page.chunks),
+        "content_hash": page.content_hash
+    }
+
+
+@celery_app.task(base=EmbeddingTask, bind=True, name="process_urls_for_embedding_batch")
+def process_urls_for_embedding_batch(self, urls: List[str], crawl_task_id: Optional[str] = None):
+    """
+    Smart processing for a batch of URLs in one message: pages are fetched
+    concurrently, embedded with requests shared across pages and written
+    with grouped upserts. A page that cannot be fetched fails alone; a
+    failed write retries the batch, resuming from checkpoints.
+    """
+    task_id = self.request.id
+    done = checkpoints.get_done(task_id)
+    if done is not None:
+        logger.info("Batch already processed, skipping", urls=len(urls), task_id=task_id)
+        return done
+    
+    logger.info("Processing URL batch with smart duplicate detection", urls=len(urls))
+    results, prepared = fetch_and_prepare_pages(urls, task_id)
+    
+    embed_pages(prepared)
+    write_pages(prepared)
+    for page in prepared:
+        results[page.url] = page_result(page)
+    
+    summary = {"status": "completed", "urls": len(urls), "results": [results[url] for url in urls]}
+    record_results(crawl_task_id, summary["results"])
+    
+    checkpoints.mark_done(task_id, summary)
+    checkpoints.clear(
+        [page_checkpoint_id(task_id, url) for url in urls],
+        [(page.url, page.content_hash) for page in prepared]
+    )
+    return summary
+
+
+def fetch_and_prepare_pages(urls: List[str], task_id: Optional[str] = None):
+    """
+    Fetch the URLs concurrently and prepare each page. Returns the results of
+    pages that need no embedding (skipped or failed to fetch) by URL, and the
+    prepared pages.
+    """
+    texts = run_in_worker_loop(fetch_pages(urls, task_id))
+    
+    results: Dict[str, dict] = {}
+    prepared: List[PreparedPage] = []
+    for url in urls:
+        text_content = texts[url]
+        if isinstance(text_content, Exception):
+            results[url] = {"status": "failed", "url": url, "error": str(text_content)[:300]}
+            continue
+        page = prepare_page(url, text_content)
+        if isinstance(page, dict):
+            results[url] = page
+        else:
+            prepared.append(page)
+    return results, prepared
+
+
+def record_results(crawl_task_id: Optional[str], results: List[dict]):
+    """record_result for every page of a batch; fetch failures count as failed embeddings"""
+    for result in results:
+        if result["status"] == "failed":
+            progress.incr(crawl_task_id, "embed_failed")
+        else:
+            record_result(crawl_task_id, result)
+
+
+def page_checkpoint_id(task_id: Optional[str], url: str) -> Optional[str]:
+    """Stage checkpoint id of one page within a batch task"""
+    if not task_id:
+        return None
+    return f"{task_id}:{hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]}"
+
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Async HTTP client shared by batch tasks on the worker loop (keeps connections alive)"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=30,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=settings.ingest_fetch_concurrency * 2)
+        )
+    return _http_client
+
+
+async def fetch_pages(urls: List[str], task_id: Optional[str] = None) -> Dict[str, object]:
+    """Fetch and extract pages concurrently; maps each URL to its text or the exception it raised"""
+    semaphore = asyncio.Semaphore(settings.ingest_fetch_concurrency)
+    client = get_http_client()
+    
+    async def load(url: str):
+        checkpoint_id = page_checkpoint_id(task_id, url)
+        html, text = checkpoints.load_stage(checkpoint_id)
+        if text is not None:
+            return text
         
-        logger.info(f"Updated {len(points)} embeddings", url=url)
-        return {
-            "status": "success",
-            "url": url,
-            "chunks_processed": len(chunks),
-            "content_hash": content_hash
-        }
+        if html is None:
+            async with semaphore:
+                with observe_stage("fetch"):
+                    response = await client.get(url)
+                    response.raise_for_status()
+            html = response.text
+            checkpoints.save_html(checkpoint_id, html)
         
-    except Exception as e:
-        logger.error("Failed to process URL", url=url, error=str(e))
-        raise
\ No newline at end of file
+        with observe_stage("extract"):
+            text = await extract_text_async(html)
+        checkpoints.save_text(checkpoint_id, text)
+        return text
+    
+    results = await asyncio.gather(*(load(url) for url in urls), return_exceptions=True)
+    for url, result in zip(urls, results):
+        if isinstance(result, Exception):
+            logger.error("Failed to fetch/extract text", url=url, error=str(result))
+    return dict(zip(urls, results))
@@ -0,0 +1,106 @@
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urlparse
+import structlog
+
+from config import settings, find_crawl_site
+
+logger = structlog.get_logger()
+
+# Second-level labels under country TLDs (e.g. ewha.ac.kr, naver.co.kr)
+_COUNTRY_SLDS = {"ac", "co", "go", "or", "ne", "re", "pe", "com", "edu", "gov", "net", "org"}
+
+
+@dataclass
+class WaitPolicy:
+    """How long to wait for a page before reading its links"""
+    wait_until: str = "domcontentloaded"  # domcontentloaded | load | networkidle
+    selector: Optional[str] = None  # wait until this selector is attached
+    timeout_ms: int = 20000
+    networkidle_cap_ms: int = 3000  # short cap so long-polling widgets do not block
+
+
+def default_wait_policy() -> WaitPolicy:
+    return WaitPolicy(
+        wait_until=settings.crawl_wait_until,
+        timeout_ms=settings.crawl_page_timeout_ms,
+        networkidle_cap_ms=settings.crawl_networkidle_cap_ms
+    )
+
+
+def get_site_wait_policy(url: str) -> WaitPolicy:
+    """
+    Wait policy for a URL, using the "wait" block of the matching site in
+    crawl_sites.json, e.g. {"until": "networkidle", "selector": "#board", "timeout_ms": 15000}
+    """
+    policy = default_wait_policy()
+    site = find_crawl_site(url)
+    wait = (site or {}).get("wait") or {}
+
+    if wait.get("until"):
+        policy.wait_until = wait["until"]
+    if wait.get("selector"):
+        policy.selector = wait["selector"]
+    if wait.get("timeout_ms"):
+        policy.timeout_ms = int(wait["timeout_ms"])
+    if wait.get("networkidle_cap_ms"):
+        policy.networkidle_cap_ms = int(wait["networkidle_cap_ms"])
+
+    return policy
+
+
+def site_domain(host: str) -> str:
+    """Registrable domain of a host (cse.ewha.ac.kr -> ewha.ac.kr)"""
+    host = host.split(":")[0].lower()
+    labels = host.split(".")
+    if len(labels) >= 3 and len(labels[-1]) == 2 and labels[-2] in _COUNTRY_SLDS:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+
+def make_request_filter(root_url: str):
+    """
+    Build a Playwright route handler that aborts resources the crawler does
+    not need: heavy resource types (images, fonts, media, ...) and, optionally,
+    any request to a host outside the site's registrable domain.
+    """
+    allowed_domain = site_domain(urlparse(root_url).netloc)
+    blocked_types = settings.crawl_blocked_resource_types_set
+    block_third_party = settings.crawl_block_third_party
+
+    async def handle(route):
+        request = route.request
+
+        if request.resource_type in blocked_types:
+            await route.abort()
+            return
+
+        if block_third_party and not (request.is_navigation_request() and request.frame.parent_frame is None):
+            host = urlparse(request.url).netloc
+            if host and site_domain(host) != allowed_domain:
+                await route.abort()
+                return
+
+        await route.continue_()
+
+    return handle
+
+
+async def navigate(page, url: str, policy: WaitPolicy):
+    """Open a URL and wait according to the policy"""
+    # networkidle is only waited for with a short cap after the DOM is ready
+    goto_until = "domcontentloaded" if policy.wait_until == "networkidle" else policy.wait_until
+    await page.goto(url, wait_until=goto_until, timeout=policy.timeout_ms)
+
+    if policy.selector:
+        try:
+            await page.wait_for_selector(policy.selector, state="attached", timeout=policy.timeout_ms)
+        except Exception as e:
+            logger.warning(f"Selector wait failed on {url}: {e}", selector=policy.selector)
+
+    if policy.wait_until == "networkidle":
+        try:
+            await page.wait_for_load_state("networkidle", timeout=policy.networkidle_cap_ms)
+        except Exception:
+            # Long-polling widgets never go idle; the DOM is ready, move on
+            pass
@@ -0,0 +1,166 @@
+"""
+Sparse vectors for collections and points written before hybrid search.
+
+Collections created before hybrid search have no sparse vector, so
+has_sparse_vectors keeps hybrid search off for them. Qdrant only updates
+the parameters of sparse vectors a collection already has, so when it
+refuses to add one, the points are copied, with their sparse vectors, into
+a new collection. That collection then takes the old name as an alias.
+Writes made to the old collection during the copy are lost, so run the
+migration while no crawl is running.
+
+Points of a collection that has the sparse vector but were written without
+it are filled in place. Processes notice the migrated collection within
+SPARSE_SUPPORT_TTL_SECONDS; running the task again fills the points they
+wrote meanwhile.
+"""
+from typing import Dict, Optional
+import time
+import structlog
+from qdrant_client.models import (
+    CreateAlias, CreateAliasOperation, DeleteAlias, DeleteAliasOperation, Filter,
+    HasVectorCondition, PointStruct, PointVectors, SparseVector
+)
+
+from celery_app import celery_app
+from config import settings
+from services.chunk_store import get_chunk_store
+from services.sparse import SPARSE_VECTOR_NAME, document_vector
+from services.vector_store import (
+    ensure_payload_indexes, forget_sparse_support, get_qdrant_client, has_sparse_vectors
+)
+from tasks.embeddings import ensure_collection_exists, sparse_vectors_config
+
+logger = structlog.get_logger()
+
+
+def point_texts(points) -> Dict:
+    """Chunk text of each point id, read from the chunk text store for points that only carry text_hash"""
+    hashes = {p.payload["text_hash"] for p in points if "text" not in p.payload and "text_hash" in p.payload}
+    store = get_chunk_store()
+    stored = store.get_many(hashes) if hashes and store else {}
+    return {p.id: p.payload.get("text") or stored.get(p.payload.get("text_hash")) for p in points}
+
+
+def sparse_vector(text: Optional[str]) -> Optional[SparseVector]:
+    if not text:
+        return None
+    vector = document_vector(text)
+    return vector if vector.indices else None
+
+
+def add_sparse_config(collection: str) -> bool:
+    """Add the sparse vector to the collection's config in place; False if Qdrant refuses"""
+    try:
+        get_qdrant_client().update_collection(collection, sparse_vectors_config=sparse_vectors_config())
+    except Exception as e:
+        logger.info(f"Qdrant cannot add the sparse vector in place: {e}", collection=collection)
+        return False
+    forget_sparse_support(collection)
+    return has_sparse_vectors(collection)
+
+
+def copy_with_sparse_vectors(collection: str, batch_size: int) -> int:
+    """Copy the collection into a new one with sparse vectors and move its name over as an alias"""
+    client = get_qdrant_client()
+    aliases = {a.alias_name: a.collection_name for a in client.get_aliases().aliases}
+    source = aliases.get(collection, collection)
+    target = f"{source}_hybrid_{int(time.time())}"
+
+    client.create_collection(
+        collection_name=target,
+        vectors_config=client.get_collection(collection).config.params.vectors,
+        sparse_vectors_config=sparse_vectors_config()
+    )
+    ensure_payload_indexes(target)
+
+    copied = 0
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True
+        )
+        texts = point_texts(points)
+        batch = []
+        for point in points:
+            dense = point.vector.get("") if isinstance(point.vector, dict) else point.vector
+            vector = {"": dense}
+            sparse = sparse_vector(texts.get(point.id))
+            if sparse is not None:
+                vector[SPARSE_VECTOR_NAME] = sparse
+            batch.append(PointStruct(id=point.id, vector=vector, payload=point.payload))
+        if batch:
+            client.upsert(collection_name=target, points=batch)
+            copied += len(batch)
+        if offset is None:
+            break
+
+    # An existing alias moves atomically; a collection must go before its name can become an alias
+    operations = [CreateAliasOperation(create_alias=CreateAlias(collection_name=target, alias_name=collection))]
+    if collection in aliases:
+        operations.insert(0, DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=collection)))
+        client.update_collection_aliases(change_aliases_operations=operations)
+        client.delete_collection(source)
+    else:
+        client.delete_collection(source)
+        client.update_collection_aliases(change_aliases_operations=operations)
+
+    forget_sparse_support(collection)
+    logger.info("Copied collection with sparse vectors", collection=collection, target=target, points=copied)
+    return copied
+
+
+def backfill_points(collection: str, batch_size: int) -> int:
+    """Add the sparse vector to points written without it"""
+    client = get_qdrant_client()
+    missing = Filter(must_not=[HasVectorCondition(has_vector=SPARSE_VECTOR_NAME)])
+
+    updated = 0
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection,
+            scroll_filter=missing,
+            limit=batch_size,
+            offset=offset,
+            with_payload=["text", "text_hash"]
+        )
+        texts = point_texts(points)
+        vectors = []
+        for point in points:
+            sparse = sparse_vector(texts.get(point.id))
+            if sparse is not None:
+                vectors.append(PointVectors(id=point.id, vector={SPARSE_VECTOR_NAME: sparse}))
+        if vectors:
+            client.update_vectors(collection_name=collection, points=vectors)
+            updated += len(vectors)
+        if offset is None:
+            break
+    return updated
+
+
+@celery_app.task(name="backfill_sparse_vectors", time_limit=6 * 3600, soft_time_limit=6 * 3600 - 300)
+def backfill_sparse_vectors(batch_size: int = 256):
+    """
+    Give the collection its sparse vector (in place, or by copying it) and
+    fill the points written without one
+    """
+    ensure_collection_exists()
+    collection = settings.qdrant_collection_name
+    forget_sparse_support(collection)
+
+    result = {"status": "completed", "migration": None, "points_copied": 0}
+    if not has_sparse_vectors(collection):
+        if add_sparse_config(collection):
+            result["migration"] = "in_place"
+        else:
+            result["migration"] = "copied"
+            result["points_copied"] = copy_with_sparse_vectors(collection, batch_size)
+
+    result["points_backfilled"] = backfill_points(collection, batch_size)
+    logger.info("Sparse vector backfill finished", **result)
+    return result
@@ -0,0 +1,160 @@
+"""
+Sweep of pages that disappeared from their site (see services.generations).
+
+Pages of a site that the last SWEEP_KEEP_GENERATIONS full crawls did not
+reach are removed from Qdrant, together with their recrawl schedule and
+near-duplicate fingerprint. With an external chunk text store, texts no
+point references anymore are removed as well. A dry run only reports what
+would be removed. The last report is kept in Redis and served by
+GET /crawl/sweep.
+"""
+from collections import defaultdict
+from typing import Dict, List, Optional
+import time
+import structlog
+from qdrant_client.models import FieldCondition, Filter, MatchValue
+
+from celery_app import celery_app
+from config import settings, site_id_for_url
+from services import generations
+from services.chunk_store import get_chunk_store
+from services.near_duplicates import forget_url
+from services.recrawl import forget_urls
+from services.vector_store import get_qdrant_client
+from tasks.embeddings import delete_urls_points
+
+logger = structlog.get_logger()
+
+SCROLL_LIMIT = 1000
+REPORT_SAMPLE_URLS = 20
+
+
+def stored_urls_by_site() -> Dict[str, List[str]]:
+    """Every URL in the collection, grouped by site (one point per page is read)"""
+    client = get_qdrant_client()
+    first_chunks = Filter(must=[FieldCondition(key="chunk_index", match=MatchValue(value=0))])
+
+    sites: Dict[str, set] = defaultdict(set)
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=settings.qdrant_collection_name,
+            scroll_filter=first_chunks,
+            limit=SCROLL_LIMIT,
+            offset=offset,
+            with_payload=["url", "site"]
+        )
+        for point in points:
+            url = point.payload.get("url")
+            if url:
+                sites[point.payload.get("site") or site_id_for_url(url)].add(url)
+        if offset is None:
+            break
+    return {site: sorted(urls) for site, urls in sites.items()}
+
+
+def sweep_site(site: str, urls: List[str], dry_run: bool) -> dict:
+    """Find and (unless dry_run) remove the stale pages of one site"""
+    generation = generations.get_generation(site)
+    report = {
+        "generation": int(generation.get("generation", 0)),
+        "pages": len(urls),
+        "stale": 0,
+        "removed": 0
+    }
+
+    stale = generations.stale_urls(site, urls, settings.sweep_keep_generations)
+    if stale is None:
+        report["status"] = "not_enough_generations"
+        return report
+
+    report["stale"] = len(stale)
+    report["stale_urls"] = stale[:REPORT_SAMPLE_URLS]
+    # A mass removal more likely means a broken crawl than a shrunken site
+    if len(stale) > len(urls) * settings.sweep_max_stale_ratio:
+        logger.warning("Too many stale pages, not sweeping site", site=site, stale=len(stale), pages=len(urls))
+        report["status"] = "refused_too_many_stale"
+        return report
+
+    if dry_run or not stale:
+        report["status"] = "dry_run" if dry_run else "clean"
+        return report
+
+    for start in range(0, len(stale), settings.upsert_batch_size):
+        group = stale[start:start + settings.upsert_batch_size]
+        delete_urls_points(group)
+        forget_urls(group)
+        generations.forget(site, group)
+        for url in group:
+            forget_url(url)
+    report["removed"] = len(stale)
+    report["status"] = "swept"
+    logger.info("Swept stale pages", site=site, removed=len(stale), generation=report["generation"])
+    return report
+
+
+def referenced_text_hashes() -> set:
+    """text_hash of every point in the collection"""
+    client = get_qdrant_client()
+    hashes = set()
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=settings.qdrant_collection_name,
+            limit=SCROLL_LIMIT,
+            offset=offset,
+            with_payload=["text_hash"]
+        )
+        hashes.update(p.payload["text_hash"] for p in points if p.payload.get("text_hash"))
+        if offset is None:
+            break
+    return hashes
+
+
+def sweep_chunk_texts(dry_run: bool) -> Optional[dict]:
+    """
+    Remove stored chunk texts that no point references. Texts written within
+    CHUNK_TEXT_GC_GRACE_HOURS are kept, since their points may not be written yet.
+    """
+    store = get_chunk_store()
+    if store is None:
+        return None
+
+    cutoff = time.time() - settings.chunk_text_gc_grace_hours * 3600
+    candidates = list(store.hashes_written_before(cutoff))
+    referenced = referenced_text_hashes() if candidates else set()
+    orphaned = [h for h in candidates if h not in referenced]
+
+    report = {"store": store.name, "orphaned": len(orphaned), "removed": 0}
+    if not dry_run:
+        # Texts written again since the candidates were listed are kept
+        for start in range(0, len(orphaned), SCROLL_LIMIT):
+            report["removed"] += store.delete_many(orphaned[start:start + SCROLL_LIMIT], written_before=cutoff)
+        logger.info("Removed unreferenced chunk texts", removed=report["removed"], store=store.name)
+    return report
+
+
+@celery_app.task(name="sweep_stale_pages")
+def sweep_stale_pages(dry_run: bool = True, sites: Optional[List[str]] = None):
+    """
+    Remove pages not reached by the last SWEEP_KEEP_GENERATIONS crawls of
+    their site, or only report them with dry_run
+    """
+    urls_by_site = stored_urls_by_site()
+    if sites:
+        urls_by_site = {site: urls for site, urls in urls_by_site.items() if site in sites}
+
+    site_reports = {site: sweep_site(site, urls, dry_run) for site, urls in sorted(urls_by_site.items())}
+    report = {
+        "dry_run": dry_run,
+        "keep_generations": settings.sweep_keep_generations,
+        "sites": site_reports,
+        "chunk_texts": sweep_chunk_texts(dry_run)
+    }
+    report["finished_at"] = time.time()
+    report["stale"] = sum(site["stale"] for site in report["sites"].values())
+    report["removed"] = sum(site["removed"] for site in report["sites"].values())
+
+    generations.save_report(report)
+    logger.info("Sweep finished", dry_run=dry_run, stale=report["stale"], removed=report["removed"])
+    return report
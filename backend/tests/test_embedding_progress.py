@@ -0,0 +1,69 @@
+"""Crawl progress accounting when embedding tasks give up"""
+import fakeredis
+import pytest
+
+from services import checkpoints, progress
+from tasks.embeddings import process_url_for_embedding_smart, process_urls_for_embedding_batch
+
+URLS = ["https://example.com/a", "https://example.com/b", "https://example.com/c"]
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(progress, "get_redis_client", lambda: client)
+    monkeypatch.setattr(checkpoints, "get_redis_client", lambda: client)
+    return client
+
+
+def start_embedding(crawl_task_id: str, queued: int):
+    progress.start_crawl(crawl_task_id)
+    progress.incr(crawl_task_id, "embed_queued", queued)
+    progress.finish_crawl(crawl_task_id)
+
+
+def test_failed_batch_counts_every_url(redis_client):
+    start_embedding("crawl-1", len(URLS))
+
+    process_urls_for_embedding_batch.on_failure(
+        RuntimeError("qdrant down"), "batch-1", (URLS,), {"crawl_task_id": "crawl-1"}, None
+    )
+
+    result = progress.get_progress("crawl-1")
+    assert result["embed_failed"] == len(URLS)
+    assert result["embed_remaining"] == 0
+    assert result["status"] == "completed"
+
+
+def test_failed_batch_with_keyword_urls(redis_client):
+    start_embedding("crawl-2", len(URLS))
+
+    process_urls_for_embedding_batch.on_failure(
+        RuntimeError("qdrant down"), "batch-2", (), {"urls": URLS, "crawl_task_id": "crawl-2"}, None
+    )
+
+    assert progress.get_progress("crawl-2")["status"] == "completed"
+
+
+def test_failed_single_url_counts_once(redis_client):
+    start_embedding("crawl-3", 2)
+
+    process_url_for_embedding_smart.on_failure(
+        RuntimeError("qdrant down"), "url-1", (URLS[0],), {"crawl_task_id": "crawl-3"}, None
+    )
+
+    result = progress.get_progress("crawl-3")
+    assert result["embed_failed"] == 1
+    assert result["status"] == "embedding"
+
+
+def test_recorded_batch_is_not_counted_again(redis_client, monkeypatch):
+    monkeypatch.setattr(checkpoints.settings, "checkpoint_enabled", True)
+    start_embedding("crawl-4", len(URLS))
+    checkpoints.mark_done("batch-4", {"status": "completed", "urls": len(URLS)})
+
+    process_urls_for_embedding_batch.on_failure(
+        RuntimeError("late failure"), "batch-4", (URLS,), {"crawl_task_id": "crawl-4"}, None
+    )
+
+    assert progress.get_progress("crawl-4")["embed_failed"] == 0
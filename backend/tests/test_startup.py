@@ -0,0 +1,11 @@
+"""API cold-start budget: importing the app stays fast and leaves heavy modules unloaded"""
+from benchmarks.startup import MAX_IMPORT_SECONDS, MAX_RSS_MB, measure_startup
+
+
+def test_startup_within_budget():
+    result = measure_startup(runs=3)
+
+    assert "skipped" not in result, result.get("skipped")
+    assert result["forbidden_loaded"] == []
+    assert result["import_seconds"] <= MAX_IMPORT_SECONDS
+    assert result["rss_mb"] <= MAX_RSS_MB